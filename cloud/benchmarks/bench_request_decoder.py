@@ -0,0 +1,111 @@
+# cloud/benchmarks/bench_request_decoder.py
+"""
+Micro-benchmark: per-request model input construction.
+
+Compares the previous DataFrame round trip of both handlers
+    pd.DataFrame([feature_values]) -> add missing columns one by one -> reindex
+with serving_common.request_decoder.RequestDecoder, and reports the time of the model
+call itself for scale. Uses the pipelines committed next to each main.py.
+
+Usage (from the repository root):
+    python cloud/benchmarks/bench_request_decoder.py [--repeat 2000]
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+_CLOUD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _CLOUD_DIR not in sys.path:
+    sys.path.append(_CLOUD_DIR)
+from serving_common.processor_family import get_procesador_tipo
+from serving_common.request_decoder import RequestDecoder
+
+LAPTOP_FEATURES = [
+    'procesador', 'procesador_frecuencia_turbo_max_ghz', 'procesador_numero_nucleos',
+    'grafica_tarjeta', 'disco_duro_capacidad_de_memoria_ssd_gb', 'ram_memoria_gb',
+    'ram_tipo', 'ram_frecuencia_de_la_memoria_mhz', 'sistema_operativo_sistema_operativo',
+    'comunicaciones_version_bluetooth', 'alimentacion_vatios_hora',
+    'camara_resolucion_pixeles', 'pantalla_tecnologia', 'pantalla_resolucion_pixeles'
+]
+LAPTOP_PREPROCESSOR_INPUT_FEATURES = LAPTOP_FEATURES + ['alimentacion_wattage_binned', 'procesador_tipo']
+
+SAMPLE_FEATURE_VALUES = {
+    "procesador": "Intel Core i7-13620H",
+    "procesador_frecuencia_turbo_max_ghz": 4.9,
+    "procesador_numero_nucleos": 10,
+    "grafica_tarjeta": "NVIDIA GeForce RTX 4060",
+    "disco_duro_capacidad_de_memoria_ssd_gb": 1000,
+    "ram_memoria_gb": 16,
+    "ram_tipo": "DDR5",
+    "ram_frecuencia_de_la_memoria_mhz": 5200,
+    "sistema_operativo_sistema_operativo": "Windows 11 Home",
+    "comunicaciones_version_bluetooth": 5.3,
+    "alimentacion_vatios_hora": 60,
+    "camara_resolucion_pixeles": "1280x720",
+    "pantalla_tecnologia": "IPS",
+    "pantalla_resolucion_pixeles": "1920x1080",
+}
+
+
+def previous_price_input(feature_values):
+    return pd.DataFrame([feature_values])[LAPTOP_FEATURES]
+
+
+def previous_knn_input(feature_values):
+    query_df_input = pd.DataFrame([feature_values])
+    query_df_input['procesador_tipo'] = query_df_input['procesador'].apply(get_procesador_tipo)
+    for col in LAPTOP_PREPROCESSOR_INPUT_FEATURES:
+        if col not in query_df_input.columns:
+            query_df_input[col] = np.nan
+    return query_df_input[LAPTOP_PREPROCESSOR_INPUT_FEATURES]
+
+
+def time_per_call(fn, repeat):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args(argv)
+    warnings.filterwarnings("ignore")
+
+    pipeline = joblib.load(os.path.join(_CLOUD_DIR, "get-price-prediction", "laptop_model_pipeline.joblib"))
+    preprocessor = joblib.load(os.path.join(_CLOUD_DIR, "get-k-similar-products", "preprocessor_laptop_knn.joblib"))
+    price_decoder = RequestDecoder.from_pipeline(pipeline, LAPTOP_FEATURES)
+    knn_decoder = RequestDecoder.from_pipeline(preprocessor, LAPTOP_PREPROCESSOR_INPUT_FEATURES)
+
+    # The kNN request leaves out a few optional fields, which the decoder fills with NaN.
+    knn_feature_values = {key: value for key, value in SAMPLE_FEATURE_VALUES.items()
+                          if key not in ("camara_resolucion_pixeles", "pantalla_tecnologia")}
+
+    def decoded_knn_input():
+        feature_values = {**knn_feature_values,
+                          'procesador_tipo': get_procesador_tipo(knn_feature_values['procesador'])}
+        return knn_decoder.decode(feature_values)
+
+    rows = [
+        ("price: previous input", lambda: previous_price_input(SAMPLE_FEATURE_VALUES)),
+        ("price: RequestDecoder", lambda: price_decoder.decode(SAMPLE_FEATURE_VALUES)),
+        ("price: pipeline.predict", lambda: pipeline.predict(price_decoder.decode(SAMPLE_FEATURE_VALUES))),
+        ("knn: previous input", lambda: previous_knn_input(knn_feature_values)),
+        ("knn: RequestDecoder", decoded_knn_input),
+        ("knn: preprocessor.transform", lambda: preprocessor.transform(decoded_knn_input())),
+    ]
+    print(f"{'step':<32}{'us/call':>12}")
+    for name, fn in rows:
+        print(f"{name:<32}{time_per_call(fn, args.repeat):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+# cloud/benchmarks/bench_services.py
+"""
+Offline benchmark for the price prediction and similar-products services.
+
+Both handlers run in-process behind real Flask request objects. The artifacts come from
+the committed files: *_model_pipeline.joblib, preprocessor_*_knn.joblib and
+X_train_original_for_knn_lookup_*.csv. They are staged in a temporary directory with
+the bucket's layout and served through STORAGE_BACKEND=local. nn_model_*.joblib is not
+committed, so the kNN service gets a similarity index and columnar lookup table built
+from the lookup CSV (--knn-artifacts index, the default). With --knn-artifacts legacy
+it gets a brute-force NearestNeighbors model and the raw CSV instead.
+
+Requests are drawn (with a fixed seed) from the rows of the lookup CSVs. The scenario
+mix is configurable:
+    price         single price prediction
+    price_batch   {"instances": [...]} with --batch-size rows of mixed device types
+    knn           similar products with k drawn from --k-values
+
+Reported: cold start (import and first model load with an empty artifact cache), and
+per scenario p50/p95/p99/mean latency and throughput, plus the process's peak RSS and
+the response cache statistics (RESPONSE_CACHE_ENABLED=false measures uncached handlers).
+Results are written as JSON. With --baseline a previous result file is compared, and
+the exit code is 1 if a latency percentile or throughput regressed by more than
+--tolerance.
+
+Usage (from the repository root):
+    python cloud/benchmarks/bench_services.py --requests 2000 --out bench_results.json
+    python cloud/benchmarks/bench_services.py --baseline bench_results.json --out new.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+_CLOUD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRICE_DIR = os.path.join(_CLOUD_DIR, "get-price-prediction")
+KNN_DIR = os.path.join(_CLOUD_DIR, "get-k-similar-products")
+DEVICE_TYPES = ("laptop", "desktop")
+
+# Lookup CSVs do not carry every price feature; these fill the gaps.
+PRICE_FEATURE_DEFAULTS = {"comunicaciones_version_bluetooth": 5.0}
+# Metrics compared against a baseline, and whether higher is better.
+COMPARED_METRICS = {"p50_ms": False, "p95_ms": False, "p99_ms": False, "throughput_rps": True}
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=_CLOUD_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_request(payload=None, method="POST", path="/"):
+    """A real flask.Request, as functions_framework hands to the handlers."""
+    from flask import Request
+    from werkzeug.test import EnvironBuilder
+
+    builder = EnvironBuilder(method=method, path=path, json=payload)
+    try:
+        return Request(builder.get_environ())
+    finally:
+        builder.close()
+
+
+def load_service(name, service_dir):
+    """Imports a service's main.py under its own module name (both files are called main.py)."""
+    if service_dir not in sys.path:
+        sys.path.insert(0, service_dir)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(service_dir, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _stage_file(source, bucket_dir, blob_name):
+    destination = os.path.join(bucket_dir, blob_name)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    shutil.copyfile(source, destination)
+
+
+def stage_artifacts(bucket_dir, price_service, knn_service, knn_artifacts):
+    """Lays the committed artifacts out under `bucket_dir` the way the GCS bucket holds them."""
+    import joblib
+    import pandas as pd
+    from lookup_table import write_table
+    from similarity_index import build_index, to_dense_float32
+
+    for device_type in DEVICE_TYPES:
+        _stage_file(os.path.join(PRICE_DIR, f"{device_type}_model_pipeline.joblib"), bucket_dir,
+                    price_service.MODEL_CACHE[device_type]["model_blob"])
+
+        device_cache = knn_service.MODEL_CACHE[device_type]
+        preprocessor_path = os.path.join(KNN_DIR, f"preprocessor_{device_type}_knn.joblib")
+        lookup_csv = os.path.join(KNN_DIR, f"X_train_original_for_knn_lookup_{device_type}.csv")
+        _stage_file(preprocessor_path, bucket_dir, device_cache["preprocessor_blob"])
+        _stage_file(lookup_csv, bucket_dir, device_cache["x_train_blob"])
+
+        preprocessor = joblib.load(preprocessor_path)
+        df_lookup = pd.read_csv(lookup_csv)
+        input_features = list(preprocessor.feature_names_in_)
+        vectors = to_dense_float32(preprocessor.transform(df_lookup.reindex(columns=input_features)))
+        if knn_artifacts == "index":
+            build_index(vectors, os.path.join(bucket_dir, device_cache["index_blob_prefix"]))
+            write_table(df_lookup, os.path.join(bucket_dir, device_cache["lookup_blob_prefix"]))
+        else:
+            from sklearn.neighbors import NearestNeighbors
+            nn_model = NearestNeighbors(algorithm="brute").fit(vectors)
+            nn_model_path = os.path.join(bucket_dir, device_cache["nn_model_blob"])
+            os.makedirs(os.path.dirname(nn_model_path), exist_ok=True)
+            joblib.dump(nn_model, nn_model_path)
+
+
+def _clean(value):
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def sample_rows():
+    """{device_type: [row dict, ...]} from the lookup CSVs."""
+    import pandas as pd
+    rows = {}
+    for device_type in DEVICE_TYPES:
+        df = pd.read_csv(os.path.join(KNN_DIR, f"X_train_original_for_knn_lookup_{device_type}.csv"))
+        rows[device_type] = [{key: _clean(value) for key, value in row.items()} for row in df.to_dict("records")]
+    return rows
+
+
+class RequestMix:
+    def __init__(self, rows, price_service, seed, batch_size, k_values):
+        self.rows = rows
+        self.price_features = {"laptop": price_service.LAPTOP_FEATURES, "desktop": price_service.DESKTOP_FEATURES}
+        self.random = np.random.default_rng(seed)
+        self.batch_size = batch_size
+        self.k_values = k_values
+
+    def _row(self):
+        device_type = DEVICE_TYPES[self.random.integers(len(DEVICE_TYPES))]
+        rows = self.rows[device_type]
+        return device_type, rows[self.random.integers(len(rows))]
+
+    def _price_instance(self):
+        device_type, row = self._row()
+        feature_values = {feature: row.get(feature, PRICE_FEATURE_DEFAULTS.get(feature))
+                          for feature in self.price_features[device_type]}
+        for feature, default in PRICE_FEATURE_DEFAULTS.items():
+            if feature in feature_values and feature_values[feature] is None:
+                feature_values[feature] = default
+        return {"device_type": device_type, "feature_values": feature_values}
+
+    def payload(self, scenario):
+        if scenario == "price":
+            return self._price_instance()
+        if scenario == "price_batch":
+            return {"instances": [self._price_instance() for _ in range(self.batch_size)]}
+        device_type, row = self._row()
+        feature_values = {key: value for key, value in row.items() if key != "procesador_tipo"}
+        k = int(self.k_values[self.random.integers(len(self.k_values))])
+        return {"device_type": device_type, "k": k, "feature_values": feature_values}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("price", "price_batch", "knn"):
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name!r}")
+        mix[name] = float(weight or 1)
+    total = sum(mix.values())
+    return {name: weight / total for name, weight in mix.items()}
+
+
+def summarize(latencies, errors, elapsed=None):
+    """Latency percentiles; throughput is count / elapsed wall time, or count / busy time if elapsed is None."""
+    busy = float(np.sum(latencies)) if elapsed is None else elapsed
+    latencies_ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99]) if len(latencies_ms) else (None, None, None)
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "p50_ms": None if p50 is None else round(float(p50), 3),
+        "p95_ms": None if p95 is None else round(float(p95), 3),
+        "p99_ms": None if p99 is None else round(float(p99), 3),
+        "mean_ms": round(float(latencies_ms.mean()), 3) if len(latencies_ms) else None,
+        "throughput_rps": round(len(latencies) / busy, 2) if busy > 0 else None,
+    }
+
+
+def run_scenarios(handlers, mix, request_mix, n_requests, concurrency, seed):
+    scenario_names = list(mix)
+    picks = np.random.default_rng(seed + 1).choice(len(scenario_names), size=n_requests, p=list(mix.values()))
+    # Payloads and request objects are prepared up front so only handler time is measured.
+    planned = [(scenario_names[i], make_request(request_mix.payload(scenario_names[i]))) for i in picks]
+
+    def call(item):
+        scenario, request = item
+        start = time.perf_counter()
+        response = handlers[scenario](request)
+        latency = time.perf_counter() - start
+        status = response[1] if isinstance(response, tuple) else 200
+        return scenario, latency, status
+
+    results = {name: ([], 0) for name in scenario_names}
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(call, planned))
+    else:
+        outcomes = [call(item) for item in planned]
+    elapsed = time.perf_counter() - start
+
+    for scenario, latency, status in outcomes:
+        latencies, errors = results[scenario]
+        latencies.append(latency)
+        results[scenario] = (latencies, errors + (status >= 400))
+    # Per scenario, throughput is what one worker sustains on that request type; "all" is wall-clock.
+    summary = {name: summarize(latencies, errors) for name, (latencies, errors) in results.items()}
+    summary["all"] = summarize([latency for _, latency, _ in outcomes],
+                               sum(status >= 400 for _, _, status in outcomes), elapsed)
+    return summary
+
+
+def compare(baseline, current, tolerance):
+    """Prints a comparison table; returns the list of regressions beyond `tolerance`."""
+    regressions = []
+    print(f"\n{'scenario':<14}{'metric':<16}{'baseline':>12}{'current':>12}{'change':>10}")
+    for scenario, metrics in current["scenarios"].items():
+        base_metrics = baseline.get("scenarios", {}).get(scenario)
+        if not base_metrics:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = base_metrics.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            regressed = change < -tolerance if higher_is_better else change > tolerance
+            marker = "  REGRESSION" if regressed else ""
+            print(f"{scenario:<14}{metric:<16}{old:>12.3f}{new:>12.3f}{change:>+10.1%}{marker}")
+            if regressed:
+                regressions.append((scenario, metric, old, new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the price and similar-products handlers in-process.")
+    parser.add_argument("--requests", type=int, default=1000, help="Number of measured requests.")
+    parser.add_argument("--warmup-requests", type=int, default=50)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("price=0.45,knn=0.45,price_batch=0.1"),
+                        help="Scenario weights, e.g. price=0.5,knn=0.5,price_batch=0.")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--k-values", type=lambda text: [int(k) for k in text.split(",")], default=[5, 10])
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--knn-artifacts", choices=("index", "legacy"), default="index")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression.")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="pcpp_bench_")
+    bucket_dir = os.path.join(work_dir, "bucket")
+    os.environ.update({
+        "STORAGE_BACKEND": "local",
+        "STORAGE_LOCAL_ROOT": bucket_dir,
+        "ARTIFACT_CACHE_DIR": os.path.join(work_dir, "artifact_cache"),
+        "WARMUP_ON_START": "false",
+    })
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    warnings.filterwarnings("ignore")
+    try:
+        start = time.perf_counter()
+        price_service = load_service("price_main", PRICE_DIR)
+        knn_service = load_service("knn_main", KNN_DIR)
+        import_seconds = time.perf_counter() - start
+
+        stage_artifacts(bucket_dir, price_service, knn_service, args.knn_artifacts)
+
+        # Cold start: first load of every model, with an empty artifact cache.
+        cold_start = {"import_seconds": round(import_seconds, 4)}
+        for device_type in DEVICE_TYPES:
+            start = time.perf_counter()
+            price_service.get_model_assets(device_type)
+            cold_start[f"price_{device_type}_seconds"] = round(time.perf_counter() - start, 4)
+            start = time.perf_counter()
+            knn_service.ensure_models_loaded(device_type)
+            cold_start[f"knn_{device_type}_seconds"] = round(time.perf_counter() - start, 4)
+
+        handlers = {
+            "price": price_service.get_price_prediction,
+            "price_batch": price_service.get_price_prediction,
+            "knn": knn_service.get_k_similar_products,
+        }
+        request_mix = RequestMix(sample_rows(), price_service, args.seed, args.batch_size, args.k_values)
+        if args.warmup_requests:
+            run_scenarios(handlers, args.mix, request_mix, args.warmup_requests, 1, args.seed)
+        scenarios = run_scenarios(handlers, args.mix, request_mix, args.requests, args.concurrency, args.seed)
+        response_cache = price_service.RESPONSE_CACHE.stats()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("out", "baseline")},
+        },
+        "cold_start": cold_start,
+        "scenarios": scenarios,
+        "response_cache": response_cache,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print("Cold start:", json.dumps(cold_start))
+    print(f"{'scenario':<14}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for name, summary in scenarios.items():
+        print(f"{name:<14}{summary['count']:>7}{summary['errors']:>8}{summary['p50_ms'] or 0:>10.2f}"
+              f"{summary['p95_ms'] or 0:>10.2f}{summary['p99_ms'] or 0:>10.2f}{summary['throughput_rps'] or 0:>10.1f}")
+    print(f"Peak RSS: {results['peak_rss_mb']} MB. Results written to {args.out}.")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+# cloud/benchmarks/startup_report.py
+"""
+Cold-start report for the price and similar-products entry points.
+
+Each service is started in a fresh interpreter (run with -X importtime) that goes through
+the phases of a new Cloud Functions instance one at a time:
+    framework       import functions_framework (flask, werkzeug)
+    import          import main.py
+    preflight       first OPTIONS request
+    rejected        first request that fails validation (unknown device type)
+    first_request   first valid request: artifact fetch, model load and scoring
+    warm_request    the same request again
+WARMUP_ON_START is off, so the model load is charged to first_request instead of running
+in the background from the import on.
+
+For every phase the report shows its wall time, the number of modules it imported, which
+heavy dependencies (numpy, pandas, joblib, scikit-learn, LightGBM, ...) it loaded, and the
+imports that cost the most, in the style of `python -X importtime` (self and cumulative
+microseconds, nested imports indented). The goal is that preflight and rejected load
+nothing heavy.
+
+Artifacts are staged from the committed files exactly as in bench_services.py and served
+through STORAGE_BACKEND=local with an empty artifact cache.
+
+Usage (from the repository root):
+    python cloud/benchmarks/startup_report.py
+    python cloud/benchmarks/startup_report.py --services price --price-model-format compiled --top 15
+    python cloud/benchmarks/startup_report.py --out startup_report.json
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+_CLOUD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICES = {
+    "price": (os.path.join(_CLOUD_DIR, "get-price-prediction"), "get_price_prediction"),
+    "knn": (os.path.join(_CLOUD_DIR, "get-k-similar-products"), "get_k_similar_products"),
+}
+PHASES = ["framework", "import", "preflight", "rejected", "first_request", "warm_request"]
+HEAVY_MODULES = ["numpy", "pandas", "joblib", "scipy", "sklearn", "lightgbm", "google.cloud.storage"]
+PHASE_MARKER = "startup_report:phase "
+
+
+# --- Child: one service, one fresh interpreter ---
+
+def _request(payload=None, method="POST"):
+    from flask import Request
+    from werkzeug.test import EnvironBuilder
+
+    builder = EnvironBuilder(method=method, path="/", json=payload)
+    try:
+        return Request(builder.get_environ())
+    finally:
+        builder.close()
+
+
+def run_child(service, payload_path):
+    """Runs the phases in this process; phase boundaries are marked on stderr for importtime."""
+    import importlib.util
+
+    service_dir, handler_name = SERVICES[service]
+    with open(payload_path, encoding="utf-8") as f:
+        valid_payload = json.load(f)
+    state = {}
+
+    def load_main():
+        sys.path.insert(0, service_dir)
+        spec = importlib.util.spec_from_file_location("main", os.path.join(service_dir, "main.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["main"] = module
+        spec.loader.exec_module(module)
+        state["handler"] = getattr(module, handler_name)
+
+    def call(payload=None, method="POST"):
+        response = state["handler"](_request(payload, method))
+        return response[1] if isinstance(response, tuple) else 200
+
+    steps = {
+        "framework": lambda: __import__("functions_framework"),
+        "import": load_main,
+        "preflight": lambda: call(method="OPTIONS"),
+        "rejected": lambda: call({**valid_payload, "device_type": "tablet"}),
+        "first_request": lambda: call(valid_payload),
+        "warm_request": lambda: call(valid_payload),
+    }
+    results = []
+    for phase in PHASES:
+        before = set(sys.modules)
+        sys.stderr.write(f"{PHASE_MARKER}{phase}\n")
+        sys.stderr.flush()
+        start = time.perf_counter()
+        status = steps[phase]()
+        seconds = time.perf_counter() - start
+        new_modules = set(sys.modules) - before
+        results.append({
+            "phase": phase,
+            "seconds": round(seconds, 4),
+            "status": status if isinstance(status, int) else None,
+            "new_modules": len(new_modules),
+            "heavy_modules": [name for name in HEAVY_MODULES if name in new_modules],
+        })
+    sys.stdout.write(json.dumps(results) + "\n")
+
+
+# --- Parent: staging, one child per service, report ---
+
+def parse_importtime(stderr):
+    """{phase: [(depth, self_us, cumulative_us, module), ...]} from -X importtime output."""
+    imports = {}
+    phase = None
+    for line in stderr.splitlines():
+        if line.startswith(PHASE_MARKER):
+            phase = line[len(PHASE_MARKER):].strip()
+            imports[phase] = []
+            continue
+        if phase is None or not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports[phase].append((depth, int(fields[0]), int(fields[1]), name.strip()))
+    return imports
+
+
+def top_imports(imports, top):
+    """The `top` most expensive imports of a phase, in import order, keeping their nesting depth."""
+    if not imports:
+        return []
+    base_depth = min(depth for depth, _, _, _ in imports)
+    ranked = sorted(range(len(imports)), key=lambda i: imports[i][2], reverse=True)[:top]
+    return [(imports[i][0] - base_depth, imports[i][1], imports[i][2], imports[i][3]) for i in sorted(ranked)]
+
+
+def valid_payload(service, price_service, rows):
+    device_type = "laptop"
+    row = rows[device_type][0]
+    if service == "price":
+        from bench_services import PRICE_FEATURE_DEFAULTS
+        feature_values = {feature: row.get(feature) for feature in price_service.LAPTOP_FEATURES}
+        for feature, default in PRICE_FEATURE_DEFAULTS.items():
+            if feature_values.get(feature) is None:
+                feature_values[feature] = default
+        return {"device_type": device_type, "feature_values": feature_values}
+    feature_values = {key: value for key, value in row.items() if key != "procesador_tipo"}
+    return {"device_type": device_type, "k": 5, "feature_values": feature_values}
+
+
+def stage_compiled_models(bucket_dir, price_service):
+    import joblib
+    from compiled_model import export_pipeline
+
+    for device_type, blobs in price_service.MODEL_CACHE.items():
+        pipeline = joblib.load(os.path.join(bucket_dir, blobs["model_blob"]))
+        export_pipeline(pipeline, os.path.join(bucket_dir, blobs["compiled_blob"]))
+
+
+def print_report(service, phases, imports, top):
+    print(f"\n== {service} ==")
+    print(f"{'phase':<15}{'seconds':>9}{'status':>8}{'modules':>9}  heavy modules loaded")
+    for result in phases:
+        print(f"{result['phase']:<15}{result['seconds']:>9.3f}{result['status'] or '':>8}"
+              f"{result['new_modules']:>9}  {', '.join(result['heavy_modules']) or '-'}")
+    for result in phases:
+        phase_imports = top_imports(imports.get(result["phase"], []), top)
+        if not phase_imports:
+            continue
+        print(f"\n{service}/{result['phase']}: top imports")
+        print(f"{'self [us]':>10} | {'cumulative':>10} | imported package")
+        for depth, self_us, cumulative_us, name in phase_imports:
+            print(f"{self_us:>10} | {cumulative_us:>10} | {'  ' * depth}{name}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-phase cold-start cost of the Cloud Function entry points.")
+    parser.add_argument("--services", type=lambda text: text.split(","), default=list(SERVICES),
+                        help="Comma-separated subset of: price,knn.")
+    parser.add_argument("--price-model-format", choices=("pipeline", "compiled"), default="pipeline",
+                        help="Model the price service loads (compiled exports the committed pipelines first).")
+    parser.add_argument("--top", type=int, default=10, help="Imports listed per phase.")
+    parser.add_argument("--out", help="Also write the report as JSON.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--payload", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args.child, args.payload)
+        return 0
+
+    import warnings
+
+    import bench_services
+
+    warnings.filterwarnings("ignore")
+    work_dir = tempfile.mkdtemp(prefix="pcpp_startup_")
+    bucket_dir = os.path.join(work_dir, "bucket")
+    env = {
+        **os.environ,
+        "STORAGE_BACKEND": "local",
+        "STORAGE_LOCAL_ROOT": bucket_dir,
+        "WARMUP_ON_START": "false",
+        "PRICE_MODEL_FORMAT": args.price_model_format,
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    }
+    report = {}
+    try:
+        os.environ.update({key: env[key] for key in ("STORAGE_BACKEND", "STORAGE_LOCAL_ROOT", "WARMUP_ON_START")})
+        price_service = bench_services.load_service("price_main", SERVICES["price"][0])
+        knn_service = bench_services.load_service("knn_main", SERVICES["knn"][0])
+        bench_services.stage_artifacts(bucket_dir, price_service, knn_service, "index")
+        if args.price_model_format == "compiled":
+            stage_compiled_models(bucket_dir, price_service)
+        rows = bench_services.sample_rows()
+
+        for service in args.services:
+            payload_path = os.path.join(work_dir, f"{service}_payload.json")
+            with open(payload_path, "w", encoding="utf-8") as f:
+                json.dump(valid_payload(service, price_service, rows), f)
+            child_env = {**env, "ARTIFACT_CACHE_DIR": os.path.join(work_dir, f"artifact_cache_{service}")}
+            completed = subprocess.run(
+                [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child", service, "--payload", payload_path],
+                env=child_env, capture_output=True, text=True)
+            if completed.returncode != 0:
+                sys.stderr.write(completed.stderr[-4000:])
+                return completed.returncode
+            phases = json.loads(completed.stdout.strip().splitlines()[-1])
+            imports = parse_importtime(completed.stderr)
+            print_report(service, phases, imports, args.top)
+            report[service] = {
+                "phases": phases,
+                "top_imports": {phase: [{"depth": depth, "self_us": self_us, "cumulative_us": cumulative_us, "module": name}
+                                        for depth, self_us, cumulative_us, name in top_imports(phase_imports, args.top)]
+                                for phase, phase_imports in imports.items()},
+            }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.out}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
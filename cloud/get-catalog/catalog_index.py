@@ -0,0 +1,302 @@
+# cloud/get-catalog/catalog_index.py
+"""
+In-memory catalog of the laptops in df_modified.csv, indexed for faceted search.
+
+CatalogTable holds the columns modify_csv.py selects, renamed to the frontend's Laptop
+fields (CATALOG_FIELDS): numeric fields as float64 (NaN = missing), the others
+dictionary-encoded as int32 codes (-1 = missing) over a sorted dictionary, so code order
+is alphabetical order. It has the table interface of serving_common.row_filters, whose
+RowFilterIndex answers the filters:
+  - categorical fields from one posting list of rows per value (an inverted index),
+  - numeric fields from the rows sorted by value (two binary searches per range).
+
+CatalogIndex.query evaluates a request into
+  - the matching rows in the requested order, of which only one page is materialized,
+  - facet counts per value of the FACET_FIELDS (or of the requested string fields, such as
+    "title"), disjunctive like a shop's sidebar: each field is counted over the rows
+    matching every *other* filter, so the alternatives to a selected brand keep their counts,
+  - the min / max of the RANGE_FIELDS over the rows matching every other filter,
+  - on request, histograms of numeric fields over the matching rows: counts per bucket of
+    a given width, so a distribution chart needs one request instead of one per bar.
+Other fields are indexed the first time they are filtered on. Sort orders are argsorts
+computed once per sort key and cached.
+"""
+import csv
+import math
+import threading
+
+import numpy as np
+
+from serving_common.row_filters import RowFilterIndex
+
+# df_modified.csv column -> Laptop field (frontend/src/services/laptopData.ts).
+CATALOG_FIELDS = {
+    'titulo': 'title',
+    'brand': 'brand',
+    'serie': 'series',
+    'pantalla_tamano_pulgadas': 'screenSize',
+    'precio_mean': 'price',
+    'tipo_de_producto': 'productType',
+    'ram_memoria_gb': 'ram',
+    'disco_duro_capacidad_de_memoria_ssd_gb': 'storage',
+    'procesador': 'cpu',
+    'procesador_frecuencia_turbo_max_ghz': 'clockSpeed',
+    'grafica_tarjeta': 'gpu',
+    'sistema_operativo_sistema_operativo': 'os',
+    'precio_min': 'priceMin',
+    'precio_max': 'priceMax',
+}
+NUMERIC_FIELDS = ['screenSize', 'price', 'ram', 'storage', 'clockSpeed', 'priceMin', 'priceMax']
+# Fields with facet counts and fields with min / max bounds in every response.
+FACET_FIELDS = ['brand', 'productType', 'cpu', 'gpu', 'os']
+RANGE_FIELDS = ['price', 'ram', 'storage', 'screenSize']
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+MAX_HISTOGRAM_BUCKETS = 1000
+
+
+def _parse_number(value):
+    try:
+        return float(value) if value else math.nan
+    except ValueError:
+        return math.nan
+
+
+class CatalogTable:
+    """Columnar catalog: {field: float64 values or int32 codes} plus the string dictionaries."""
+
+    def __init__(self, arrays, dictionaries, n_rows):
+        self._arrays = arrays
+        self._dictionaries = dictionaries
+        self._n_rows = n_rows
+        # Catalog ids as in laptop_data.json: 1-based row numbers.
+        self.ids = np.arange(1, n_rows + 1, dtype=np.int64)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Table from df_modified.csv row dicts; missing or unparsable numbers become NaN."""
+        rows = list(rows)
+        arrays, dictionaries = {}, {}
+        for csv_column, field in CATALOG_FIELDS.items():
+            raw = [row.get(csv_column) or '' for row in rows]
+            if field in NUMERIC_FIELDS:
+                arrays[field] = np.array([_parse_number(value) for value in raw], dtype=np.float64)
+                continue
+            dictionary = sorted(set(raw) - {''})
+            positions = {value: code for code, value in enumerate(dictionary)}
+            arrays[field] = np.array([positions.get(value, -1) for value in raw], dtype=np.int32)
+            dictionaries[field] = dictionary
+        return cls(arrays, dictionaries, len(rows))
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path, mode='r', encoding='utf-8', newline='') as csv_file:
+            csv_reader = csv.DictReader(csv_file)
+            missing = [column for column in CATALOG_FIELDS if column not in (csv_reader.fieldnames or [])]
+            if missing:
+                raise ValueError(f"Columns {missing} not found in {path}.")
+            return cls.from_rows(csv_reader)
+
+    def __len__(self):
+        return self._n_rows
+
+    @property
+    def columns(self):
+        return list(self._arrays)
+
+    def is_numeric(self, name):
+        return name in NUMERIC_FIELDS
+
+    def column(self, name):
+        """Full column: float64 values, or int32 codes for string fields."""
+        return self._arrays[name]
+
+    def dictionary(self, name):
+        """Distinct values of a string field, sorted and indexed by code."""
+        return self._dictionaries[name]
+
+    def records(self, row_indices):
+        """
+        {field: array} of the rows, in laptop_data.json form: "id" first, missing strings
+        as "" and missing numbers as 0 (see temp_helper_funcs/export_catalog.py).
+        """
+        row_indices = np.asarray(row_indices, dtype=np.int64)
+        result = {'id': self.ids[row_indices]}
+        for name, values in self._arrays.items():
+            values = values[row_indices]
+            if self.is_numeric(name):
+                result[name] = np.where(np.isnan(values), 0.0, values)
+            else:
+                # Append "" so the missing-value code -1 maps onto it.
+                lookup = np.array(self._dictionaries[name] + [''], dtype=object)
+                result[name] = lookup[values]
+        return result
+
+
+def _parse_sort(sort):
+    if sort is None or sort == '':
+        return None, False
+    if not isinstance(sort, str):
+        raise ValueError('"sort" must be a field name, prefixed with "-" for descending order.')
+    return (sort[1:], True) if sort.startswith('-') else (sort, False)
+
+
+def _parse_int(value, name, default, minimum, maximum):
+    if value is None:
+        return default
+    if (isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value)
+            or value != int(value)):
+        raise ValueError(f'"{name}" must be an integer.')
+    if not minimum <= value <= maximum:
+        raise ValueError(f'"{name}" must be between {minimum} and {maximum}.')
+    return int(value)
+
+
+class CatalogIndex:
+    """Filter, facet, sort and page queries over a CatalogTable."""
+
+    def __init__(self, table):
+        self.table = table
+        self.row_filters = RowFilterIndex(table, columns=FACET_FIELDS + RANGE_FIELDS)
+        self._lock = threading.Lock()
+        self._sort_orders = {}
+
+    def sort_order(self, field, descending=False):
+        """Row ids ordered by `field` (ties and missing values in catalog order, missing last)."""
+        key = (field, descending)
+        order = self._sort_orders.get(key)
+        if order is not None:
+            return order
+        if field not in self.table.columns:
+            raise ValueError(f'Cannot sort on unknown field "{field}".')
+        values = self.table.column(field)
+        if self.table.is_numeric(field):
+            sort_keys = -values if descending else values  # NaN stays NaN and sorts last
+        else:
+            # Codes follow the sorted dictionary, so they sort like the strings.
+            sort_keys = np.where(values < 0, np.iinfo(np.int64).max, -values if descending else values)
+        order = np.argsort(sort_keys, kind='stable')
+        with self._lock:
+            self._sort_orders[key] = order
+        return order
+
+    def _matching(self, masks, exclude=None):
+        matched = np.ones(len(self.table), dtype=bool)
+        for field, mask in masks.items():
+            if field != exclude:
+                matched &= mask
+        return matched
+
+    def facet_counts(self, masks, fields=FACET_FIELDS, limit=None):
+        """
+        {field: [{"value", "count"}, ...]} by descending count (ties alphabetical), over the
+        rows passing the other filters; at most `limit` values per field.
+        """
+        facets = {}
+        for field in fields:
+            codes = self.table.column(field)[self._matching(masks, exclude=field)]
+            counts = np.bincount(codes[codes >= 0], minlength=len(self.table.dictionary(field)))
+            present = np.flatnonzero(counts)
+            present = present[np.argsort(-counts[present], kind='stable')][:limit]
+            dictionary = self.table.dictionary(field)
+            facets[field] = [{'value': dictionary[code], 'count': int(counts[code])} for code in present.tolist()]
+        return facets
+
+    def value_ranges(self, masks):
+        """{field: {"min", "max"}} over the rows passing the other filters (null when none has a value)."""
+        ranges = {}
+        for field in RANGE_FIELDS:
+            values = self.table.column(field)[self._matching(masks, exclude=field)]
+            values = values[~np.isnan(values)]
+            ranges[field] = ({'min': float(values.min()), 'max': float(values.max())} if len(values)
+                             else {'min': None, 'max': None})
+        return ranges
+
+    def histograms(self, matched, bucket_widths):
+        """
+        {field: [{"min", "max", "count"}, ...]}: counts of the matched rows' values in
+        consecutive [min, max) buckets of the field's width, aligned to multiples of it and
+        spanning the smallest to the largest value (empty when no matched row has a value).
+        """
+        histograms = {}
+        for field, width in bucket_widths.items():
+            values = self.table.column(field)[matched]
+            values = values[~np.isnan(values)]
+            if not len(values):
+                histograms[field] = []
+                continue
+            first, last = math.floor(values.min() / width), math.floor(values.max() / width)
+            if last - first >= MAX_HISTOGRAM_BUCKETS:
+                raise ValueError(f'The "{field}" histogram would have more than {MAX_HISTOGRAM_BUCKETS} buckets; '
+                                 'use a wider bucket.')
+            edges = np.arange(first, last + 2) * width
+            counts, _ = np.histogram(values, bins=edges)
+            histograms[field] = [{'min': float(low), 'max': float(high), 'count': int(count)}
+                                 for low, high, count in zip(edges[:-1].tolist(), edges[1:].tolist(), counts.tolist())]
+        return histograms
+
+    def query(self, filters=None, sort=None, page=None, page_size=None, facets=True, facet_limit=None,
+              histograms=None):
+        """
+        Evaluates one catalog request. Returns a dict with "rows" (row ids of the page, in
+        order), "total", "page", "page_size", "pages" and, if `facets`, "facets" and
+        "ranges". `facets` is a bool (the FACET_FIELDS) or a list of string fields to count,
+        each cut to its `facet_limit` most frequent values. `histograms` maps numeric fields
+        to bucket widths and adds "histograms" over the matching rows. Raises ValueError for
+        unknown fields or malformed parameters.
+        """
+        if filters is not None and not isinstance(filters, dict):
+            raise ValueError('"filters" must be a dictionary of field predicates.')
+        sort_field, descending = _parse_sort(sort)
+        page = _parse_int(page, 'page', 1, 1, 1_000_000)
+        page_size = _parse_int(page_size, 'page_size', DEFAULT_PAGE_SIZE, 0, MAX_PAGE_SIZE)
+        facet_fields = self._parse_facets(facets)
+        facet_limit = _parse_int(facet_limit, 'facet_limit', None, 1, 1_000_000)
+        bucket_widths = self._parse_histograms(histograms)
+
+        masks = {field: self.row_filters.column_mask(field, spec) for field, spec in (filters or {}).items()}
+        matched = self._matching(masks)
+        if sort_field is None:
+            matching_rows = np.flatnonzero(matched)
+        else:
+            order = self.sort_order(sort_field, descending)
+            matching_rows = order[matched[order]]
+        total = len(matching_rows)
+        start = (page - 1) * page_size
+        result = {
+            'rows': matching_rows[start:start + page_size],
+            'total': total,
+            'page': page,
+            'page_size': page_size,
+            'pages': -(-total // page_size) if page_size else 0,
+        }
+        if facet_fields:
+            result['facets'] = self.facet_counts(masks, facet_fields, facet_limit)
+            result['ranges'] = self.value_ranges(masks)
+        if bucket_widths:
+            result['histograms'] = self.histograms(matched, bucket_widths)
+        return result
+
+    def _parse_facets(self, facets):
+        if isinstance(facets, bool):
+            return FACET_FIELDS if facets else []
+        if not isinstance(facets, list) or not all(isinstance(field, str) for field in facets):
+            raise ValueError('"facets" must be true, false or a list of field names.')
+        for field in facets:
+            if field not in self.table.columns or self.table.is_numeric(field):
+                raise ValueError(f'Cannot count facets of "{field}"; facets must be string fields.')
+        return facets
+
+    def _parse_histograms(self, histograms):
+        if histograms is None:
+            return {}
+        if not isinstance(histograms, dict):
+            raise ValueError('"histograms" must be a dictionary of numeric fields to bucket widths.')
+        for field, width in histograms.items():
+            if field not in self.table.columns or not self.table.is_numeric(field):
+                raise ValueError(f'Cannot build a histogram of "{field}"; histograms must be numeric fields.')
+            if (isinstance(width, bool) or not isinstance(width, (int, float)) or not math.isfinite(width)
+                    or width <= 0):
+                raise ValueError(f'The "{field}" bucket width must be a positive number.')
+        return histograms
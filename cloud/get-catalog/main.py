@@ -0,0 +1,174 @@
+# cloud/get-catalog/main.py
+import functions_framework
+import os
+import sys
+# numpy and catalog_index are imported where the catalog is loaded or queried, so CORS
+# preflights and rejected requests are answered without loading them.
+
+# Shared serving code lives in cloud/serving_common. Deployments copy that package next to
+# main.py; local runs import it from the parent directory.
+_CLOUD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _CLOUD_DIR not in sys.path:
+    sys.path.append(_CLOUD_DIR)
+from serving_common.artifact_cache import make_artifact_cache
+from serving_common.json_response import JSON_CONTENT_TYPE, dumps, records_json
+from serving_common.metrics import MODEL_LOAD_SECONDS, MODEL_WAIT_SECONDS, STAGE_SECONDS, instrument_handler
+from serving_common.model_registry import REGISTRY, Versioned
+from serving_common.structured_logging import begin_request, get_logger
+
+logger = get_logger("catalog")
+
+GCS_BUCKET_NAME = "df_engineered"
+
+# The catalog is df_modified.csv (temp_helper_funcs/modify_csv.py or build_data.py), loaded
+# into the shared model registry (serving_common.model_registry) under "catalog/<dataset>"
+# as a dict with keys "index" (catalog_index.CatalogIndex) and "version".
+CATALOG_CACHE = {
+    "laptop": {
+        "csv_blob": "data/catalog/df_modified.csv",
+    },
+}
+# Downloaded into a persistent local cache (serving_common.artifact_cache), so a restarted
+# instance only revalidates blob metadata instead of downloading it again.
+ARTIFACTS = make_artifact_cache(GCS_BUCKET_NAME)
+
+# With WARMUP_ON_START the catalog is loaded in the background from import time on; the
+# registry makes sure it is loaded once, and requests wait for a load still in flight.
+WARMUP_ON_START = os.environ.get("WARMUP_ON_START", "true").lower() in ("1", "true", "yes")
+CATALOG_LOAD_TIMEOUT_SECONDS = float(os.environ.get("CATALOG_LOAD_TIMEOUT_SECONDS", "120"))
+
+
+def load_catalog(dataset):
+    """Fetches the dataset's CSV through the artifact cache and builds its indexes."""
+    from catalog_index import CatalogIndex, CatalogTable
+
+    logger.info("Loading catalog %s", dataset)
+    with MODEL_LOAD_SECONDS.time(service="catalog", device=dataset):
+        local_path, fingerprint = ARTIFACTS.fetch(CATALOG_CACHE[dataset]["csv_blob"])
+        index = CatalogIndex(CatalogTable.from_csv(local_path))
+    logger.info("Loaded catalog %s: %d rows (version %s)", dataset, len(index.table), fingerprint)
+    return Versioned({"index": index, "version": fingerprint}, fingerprint)
+
+
+def registry_key(dataset):
+    return f"catalog/{dataset}"
+
+
+def warm_up(datasets=None):
+    """Starts loading every catalog in the background without waiting for completion."""
+    for dataset in datasets or list(CATALOG_CACHE):
+        REGISTRY.prefetch(registry_key(dataset), lambda dataset=dataset: load_catalog(dataset))
+
+
+def reload_catalog(dataset):
+    """Loads a fresh catalog and swaps it in while the old one keeps serving."""
+    return REGISTRY.reload(registry_key(dataset), lambda: load_catalog(dataset),
+                           timeout=CATALOG_LOAD_TIMEOUT_SECONDS)
+
+
+def ensure_catalog_loaded(dataset):
+    """Returns the loaded catalog, waiting for (or starting) its load if needed."""
+    catalog = REGISTRY.peek(registry_key(dataset))
+    if catalog is not None:
+        return catalog
+    with MODEL_WAIT_SECONDS.time(service="catalog", device=dataset):
+        return REGISTRY.get(registry_key(dataset), lambda: load_catalog(dataset),
+                            timeout=CATALOG_LOAD_TIMEOUT_SECONDS)
+
+
+if WARMUP_ON_START:
+    warm_up()
+
+
+@functions_framework.http
+@instrument_handler("catalog")
+def get_catalog(request):
+    """
+    HTTP Cloud Function answering filter / sort / page queries over the laptop catalog,
+    so the frontend only downloads the page it shows.
+
+    Expected JSON request body (every key is optional; an empty body returns the first page):
+    {
+        "filters": {                                   // Laptop fields (catalog_index.CATALOG_FIELDS)
+            "brand": ["Apple", "ASUS"],                // string: one value or a list of values
+            "cpu": "Apple M3",
+            "price": {"min": 500, "max": 1500},        // numeric: inclusive "min" and/or "max"
+            "ram": {"min": 16}
+        },
+        "sort": "-price",        // a field, "-" for descending; default: catalog order
+        "page": 1,               // 1-based
+        "page_size": 24,         // 0 to MAX_PAGE_SIZE; 0 returns only counts and facets
+        "facets": true,          // include "facets" and "ranges"; or a list of string
+                                 // fields to count instead of the defaults, e.g. ["title"]
+        "facet_limit": 20,       // at most this many values per facet, most frequent first
+        "histograms": {"price": 500}   // counts of the matching rows per bucket of this width
+    }
+
+    Successful JSON response (200 OK):
+    {
+        "items": [{"id": 1, "title": "...", "brand": "Apple", "price": 1656.85, ...}, ...],
+        "total": 312, "page": 1, "page_size": 24, "pages": 13,
+        "facets": {"brand": [{"value": "ASUS", "count": 120}, ...], "cpu": [...], ...},
+        "ranges": {"price": {"min": 299.0, "max": 4899.0}, "ram": {...}, ...},
+        "histograms": {"price": [{"min": 0.0, "max": 500.0, "count": 41}, ...]}
+    }
+    Items have the shape of frontend/public/laptop_data.json. Each facet counts the rows
+    passing every other filter, so a selected brand still lists the other brands' counts.
+
+    Error JSON response (400 Bad Request, 500 Internal Server Error):
+    {
+        "error": "Descriptive error message."
+    }
+
+    GET .../metrics returns the service's latency histograms and counters in OpenMetrics
+    text format (see serving_common.metrics).
+    """
+    begin_request()
+
+    # Set CORS headers for preflight requests
+    if request.method == 'OPTIONS':
+        headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Max-Age': '3600'
+        }
+        return ('', 204, headers)
+
+    # Set CORS headers for the main request
+    headers = {
+        'Access-Control-Allow-Origin': '*'
+    }
+
+    with STAGE_SECONDS.time(service="catalog", stage="parse"):
+        request_json = request.get_json(silent=True)
+    if request_json is None:
+        request_json = {}
+    if not isinstance(request_json, dict):
+        return ({'error': 'JSON payload must be an object.'}, 400, headers)
+
+    try:
+        catalog = ensure_catalog_loaded("laptop")
+    except FileNotFoundError as e:
+        logger.error("Catalog data file not found: %s", e)
+        return ({'error': f"Configuration error: missing catalog data file. {e}"}, 500, headers)
+    except Exception as e:
+        logger.error("Error loading the catalog: %s", e)
+        return ({'error': "Could not load the catalog."}, 500, headers)
+
+    index = catalog["index"]
+    try:
+        with STAGE_SECONDS.time(service="catalog", stage="query"):
+            result = index.query(filters=request_json.get('filters'), sort=request_json.get('sort'),
+                                 page=request_json.get('page'), page_size=request_json.get('page_size'),
+                                 facets=True if request_json.get('facets') is None else request_json['facets'],
+                                 facet_limit=request_json.get('facet_limit'),
+                                 histograms=request_json.get('histograms'))
+    except ValueError as e:
+        return ({'error': f'Invalid query: {e}'}, 400, headers)
+
+    # The page's records column by column, then the counts and facets appended to the same object.
+    with STAGE_SECONDS.time(service="catalog", stage="serialize"):
+        items = records_json(index.table.records(result.pop('rows')), "items", decimals=4)
+        response_body = items[:-1] + b"," + dumps(result)[1:]
+    return (response_body, 200, {**headers, 'Content-Type': JSON_CONTENT_TYPE})
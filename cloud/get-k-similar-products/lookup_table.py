@@ -0,0 +1,219 @@
+# cloud/get-k-similar-products/lookup_table.py
+"""
+Columnar, memory-mappable storage for the kNN lookup table.
+
+`export` converts X_train_original_for_knn_lookup_DEVICE.csv into a directory holding
+one .npy file per column plus a manifest:
+  - numeric columns are stored as-is (float64 / int64),
+  - string columns are dictionary-encoded: int32 codes (-1 = missing) and a JSON list
+    with the distinct values.
+
+The serving side opens the directory with `ColumnarLookupTable.load`, which memory-maps
+each column on first use, so only the columns that are actually returned are touched
+and `take` only materializes the rows of the neighbors being returned.
+
+Offline usage:
+    python lookup_table.py export --csv X_train_original_for_knn_lookup_laptop.csv --out knn_lookup_laptop
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+_CLOUD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _CLOUD_DIR not in sys.path:
+    sys.path.append(_CLOUD_DIR)
+from serving_common.processor_family import fill_procesador_tipo
+
+LOOKUP_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+
+def _save_npy_atomic(path, array):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _save_json_atomic(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _encode_strings(values, dictionary=None):
+    """Dictionary-encodes an iterable of strings/None. Extends `dictionary` in place."""
+    dictionary = [] if dictionary is None else dictionary
+    positions = {value: i for i, value in enumerate(dictionary)}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            codes[i] = -1
+            continue
+        value = str(value)
+        code = positions.get(value)
+        if code is None:
+            code = positions[value] = len(dictionary)
+            dictionary.append(value)
+        codes[i] = code
+    return codes, dictionary
+
+
+def _column_files(position):
+    return f"col_{position}.npy", f"col_{position}.dict.json"
+
+
+def write_table(df, out_dir):
+    """Writes a pandas DataFrame in the columnar lookup format."""
+    os.makedirs(out_dir, exist_ok=True)
+    columns = []
+    for position, name in enumerate(df.columns):
+        values_file, dict_file = _column_files(position)
+        series = df[name]
+        if series.dtype.kind in "biuf":
+            _save_npy_atomic(os.path.join(out_dir, values_file), series.to_numpy())
+            columns.append({"name": name, "kind": "numeric", "file": values_file})
+        else:
+            codes, dictionary = _encode_strings(series.tolist())
+            _save_npy_atomic(os.path.join(out_dir, values_file), codes)
+            _save_json_atomic(os.path.join(out_dir, dict_file), dictionary)
+            columns.append({"name": name, "kind": "string", "file": values_file, "dictionary": dict_file})
+    _save_json_atomic(os.path.join(out_dir, MANIFEST_FILE), {
+        "format_version": LOOKUP_FORMAT_VERSION,
+        "n_rows": int(len(df)),
+        "columns": columns,
+    })
+
+
+def export_lookup_table(csv_path, out_dir):
+    """Converts a lookup CSV into the columnar format, deriving missing procesador_tipo values."""
+    import pandas as pd
+    write_table(fill_procesador_tipo(pd.read_csv(csv_path)), out_dir)
+    return ColumnarLookupTable.load(out_dir)
+
+
+class ColumnarLookupTable:
+    """Read side of the columnar lookup format. Columns are loaded lazily."""
+
+    def __init__(self, table_dir, manifest, arrays=None, dictionaries=None):
+        self.table_dir = table_dir
+        self.manifest = manifest
+        self._specs = {spec["name"]: spec for spec in manifest["columns"]}
+        self._arrays = arrays or {}
+        self._dictionaries = dictionaries or {}
+
+    @classmethod
+    def load(cls, table_dir):
+        with open(os.path.join(table_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != LOOKUP_FORMAT_VERSION:
+            raise ValueError(f"Unsupported lookup table format: {manifest.get('format_version')}")
+        return cls(table_dir, manifest)
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """In-memory table with the same interface, used when only the CSV is available."""
+        columns, arrays, dictionaries = [], {}, {}
+        for name in df.columns:
+            series = df[name]
+            if series.dtype.kind in "biuf":
+                arrays[name] = series.to_numpy()
+                columns.append({"name": name, "kind": "numeric"})
+            else:
+                arrays[name], dictionaries[name] = _encode_strings(series.tolist())
+                columns.append({"name": name, "kind": "string"})
+        manifest = {"format_version": LOOKUP_FORMAT_VERSION, "n_rows": int(len(df)), "columns": columns}
+        return cls(None, manifest, arrays, dictionaries)
+
+    def __len__(self):
+        return self.manifest["n_rows"]
+
+    @property
+    def columns(self):
+        return list(self._specs)
+
+    def _values(self, name):
+        array = self._arrays.get(name)
+        if array is None:
+            spec = self._specs[name]
+            array = np.load(os.path.join(self.table_dir, spec["file"]), mmap_mode="r")
+            self._arrays[name] = array
+        return array
+
+    def _dictionary(self, name):
+        dictionary = self._dictionaries.get(name)
+        if dictionary is None:
+            with open(os.path.join(self.table_dir, self._specs[name]["dictionary"]), encoding="utf-8") as f:
+                dictionary = json.load(f)
+            self._dictionaries[name] = dictionary
+        return dictionary
+
+    def is_numeric(self, name):
+        return self._specs[name]["kind"] == "numeric"
+
+    def column(self, name):
+        """Full column: numeric values, or int32 codes for string columns."""
+        return self._values(name)
+
+    def dictionary(self, name):
+        """Distinct values of a string column, indexed by code."""
+        return self._dictionary(name)
+
+    def take(self, row_indices, columns):
+        """
+        Materializes `columns` for `row_indices` only.
+        Returns {column: numpy array}; string columns come back as object arrays with None
+        for missing values.
+        """
+        row_indices = np.asarray(row_indices, dtype=np.int64)
+        result = {}
+        for name in columns:
+            values = np.asarray(self._values(name)[row_indices])
+            if not self.is_numeric(name):
+                # Append None so the missing-value code -1 maps onto it.
+                lookup = np.array(self._dictionary(name) + [None], dtype=object)
+                values = lookup[values]
+            result[name] = values
+        return result
+
+    def append_rows(self, df):
+        """Appends rows (a DataFrame) to an on-disk table. Unknown columns are ignored."""
+        if self.table_dir is None:
+            raise ValueError("append_rows is only supported for on-disk tables.")
+        for spec in self.manifest["columns"]:
+            name = spec["name"]
+            existing = np.asarray(self._values(name))
+            if spec["kind"] == "numeric":
+                new_values = df[name].to_numpy(dtype=existing.dtype) if name in df.columns else np.full(len(df), np.nan)
+                combined = np.concatenate([existing, new_values.astype(existing.dtype, copy=False)])
+            else:
+                new_raw = df[name].tolist() if name in df.columns else [None] * len(df)
+                dictionary = list(self._dictionary(name))
+                new_codes, dictionary = _encode_strings(new_raw, dictionary)
+                _save_json_atomic(os.path.join(self.table_dir, spec["dictionary"]), dictionary)
+                combined = np.concatenate([existing, new_codes])
+            _save_npy_atomic(os.path.join(self.table_dir, spec["file"]), combined)
+        manifest = dict(self.manifest)
+        manifest["n_rows"] = int(self.manifest["n_rows"] + len(df))
+        _save_json_atomic(os.path.join(self.table_dir, MANIFEST_FILE), manifest)
+        return ColumnarLookupTable.load(self.table_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the kNN lookup table to the columnar format.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("--csv", required=True)
+    export_parser.add_argument("--out", required=True)
+    args = parser.parse_args(argv)
+
+    table = export_lookup_table(args.csv, args.out)
+    print(f"Exported {len(table)} rows x {len(table.columns)} columns to {args.out}.")
+
+
+if __name__ == "__main__":
+    main()
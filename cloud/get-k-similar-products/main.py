@@ -1,12 +1,30 @@
 # cloud/get-k-similar-products/main.py
 import functions_framework
-import pandas as pd
-import numpy as np
-import joblib
 import os
-from google.cloud import storage
-import io
-import re
+from concurrent.futures import ThreadPoolExecutor
+import json
+import sys
+# numpy, pandas, joblib, the artifact modules (similarity_index, lookup_table,
+# neighbor_table) and serving_common.row_filters are imported by the functions that
+# need them, so CORS preflights and rejected requests are answered without loading them
+# (see benchmarks/startup_report.py).
+
+# Shared serving code lives in cloud/serving_common. Deployments copy that package next to
+# main.py; local runs import it from the parent directory.
+_CLOUD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _CLOUD_DIR not in sys.path:
+    sys.path.append(_CLOUD_DIR)
+from serving_common.artifact_cache import make_artifact_cache
+from serving_common.json_response import JSON_CONTENT_TYPE, records_json
+from serving_common.metrics import MODEL_LOAD_SECONDS, MODEL_WAIT_SECONDS, STAGE_SECONDS, instrument_handler
+from serving_common.micro_batching import MICRO_BATCH_ENABLED, MicroBatcher
+from serving_common.model_registry import REGISTRY, Versioned
+from serving_common.processor_family import get_procesador_tipo
+from serving_common.request_decoder import RequestDecoder
+from serving_common.response_cache import RESPONSE_CACHE, response_cache_key
+from serving_common.structured_logging import get_logger
+
+logger = get_logger("knn")
 
 # --- Configuration ---
 # These should match the features used when X_train_original_for_knn_lookup_DEVICE.csv was saved
@@ -48,93 +66,391 @@ LAPTOP_RETURN_FEATURES = [
 
 GCS_BUCKET_NAME = "df_engineered" # Make sure this is defined in your script
 
+# Blob locations per device type. The loaded objects live in the shared model registry
+# (serving_common.model_registry) under "knn/<device_type>" as a dict with keys
+# "preprocessor", "similarity_index" (preferred), "nn_model" (fallback),
+# "x_train_original" (ColumnarLookupTable with the neighbor details), "row_filters"
+# (RowFilterIndex over it), "neighbor_table" (precomputed neighbors of catalog
+# products, optional) and "catalog_rows" (neighbor_table.CatalogRows, the lookup row of
+# each catalog configuration, for exclude_self).
 MODEL_CACHE = {
     "laptop": {
         "preprocessor_blob": "models/kNN/laptop/preprocessor_laptop_knn.joblib",
         "nn_model_blob": "models/kNN/laptop/nn_model_laptop.joblib",
         "x_train_blob": "models/kNN/laptop/X_train_original_for_knn_lookup_laptop.csv",
-        "preprocessor": None, # To store the loaded object
-        "nn_model": None,     # To store the loaded object
-        "x_train_original": None, # To store the loaded object
-        "loaded": False
+        "index_blob_prefix": "models/kNN/laptop/index/",
+        "lookup_blob_prefix": "models/kNN/laptop/lookup/",
+        "neighbor_table_blob_prefix": "models/kNN/laptop/neighbors/",
     },
     "desktop": {
         "preprocessor_blob": "models/kNN/desktop/preprocessor_desktop_knn.joblib",
         "nn_model_blob": "models/kNN/desktop/nn_model_desktop.joblib",
         "x_train_blob": "models/kNN/desktop/X_train_original_for_knn_lookup_desktop.csv",
-        "preprocessor": None,
-        "nn_model": None,
-        "x_train_original": None,
-        "loaded": False
+        "index_blob_prefix": "models/kNN/desktop/index/",
+        "lookup_blob_prefix": "models/kNN/desktop/lookup/",
+        "neighbor_table_blob_prefix": "models/kNN/desktop/neighbors/",
     }
     # Add other device types if you have them, following the same pattern
 }
-storage_client = None
-
-def load_from_gcs(bucket_name, blob_name, is_joblib=True):
-    """Loads a file from GCS. If is_joblib, loads as joblib, else as pandas CSV."""
-    global storage_client
-    if storage_client is None:
-        storage_client = storage.Client()
-    
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(blob_name)
-    
-    if not blob.exists():
-        raise FileNotFoundError(f"Blob {blob_name} not found in bucket {bucket_name}")
-
+# Artifacts are downloaded into a persistent local cache (serving_common.artifact_cache),
+# so a restarted instance only revalidates metadata instead of downloading them again.
+ARTIFACTS = make_artifact_cache(GCS_BUCKET_NAME)
+
+# --- Asset loading ---
+# All blobs for all device types are fetched concurrently on a shared pool. With
+# WARMUP_ON_START the downloads begin at import time; the registry makes sure each
+# device is loaded once, and requests wait for whatever is still in flight.
+ASSET_LOADER_WORKERS = int(os.environ.get("ASSET_LOADER_WORKERS", "8"))
+WARMUP_ON_START = os.environ.get("WARMUP_ON_START", "true").lower() in ("1", "true", "yes")
+ASSET_LOAD_TIMEOUT_SECONDS = float(os.environ.get("ASSET_LOAD_TIMEOUT_SECONDS", "120"))
+
+_asset_executor = ThreadPoolExecutor(max_workers=ASSET_LOADER_WORKERS, thread_name_prefix="asset-loader")
+
+def load_artifact(blob_name, is_joblib=True):
+    """Loads an artifact through the local cache. If is_joblib, loads as joblib, else as pandas CSV.
+    Returns (object, fingerprint)."""
+    local_path, fingerprint = ARTIFACTS.fetch(blob_name)
     if is_joblib:
-        with blob.open("rb") as f:
-            return joblib.load(f)
+        import joblib
+        return joblib.load(local_path), fingerprint
     else: # CSV
-        data_string = blob.download_as_text()
-        return pd.read_csv(io.StringIO(data_string))
+        import pandas as pd
+        return pd.read_csv(local_path), fingerprint
+
+
+def load_index_artifact(blob_prefix):
+    """Memory-maps the similarity index published under blob_prefix. Returns (None, None) if absent."""
+    from similarity_index import INDEX_FILES, SimilarityIndex
+    try:
+        index_dir, fingerprint = ARTIFACTS.fetch_directory(
+            blob_prefix, "meta.json", lambda _: [f for f in INDEX_FILES if f != "meta.json"])
+    except FileNotFoundError:
+        return None, None
+    return SimilarityIndex.load(index_dir, mmap=True), fingerprint
+
+
+def _lookup_table_files(manifest_path):
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    return [name for column in manifest["columns"] for name in (column["file"], column.get("dictionary")) if name]
+
+
+def load_lookup_table_artifact(blob_prefix):
+    """Memory-maps the columnar lookup table published under blob_prefix. Returns (None, None) if absent."""
+    from lookup_table import MANIFEST_FILE, ColumnarLookupTable
+    try:
+        table_dir, fingerprint = ARTIFACTS.fetch_directory(blob_prefix, MANIFEST_FILE, _lookup_table_files)
+    except FileNotFoundError:
+        return None, None
+    return ColumnarLookupTable.load(table_dir), fingerprint
+
+
+def load_neighbor_table_artifact(blob_prefix):
+    """Loads the precomputed neighbor table published under blob_prefix. Returns (None, None) if absent."""
+    from neighbor_table import NEIGHBOR_TABLE_FILES, NeighborTable
+    try:
+        table_dir, fingerprint = ARTIFACTS.fetch_directory(
+            blob_prefix, "meta.json", lambda _: [f for f in NEIGHBOR_TABLE_FILES if f != "meta.json"])
+    except FileNotFoundError:
+        return None, None
+    return NeighborTable.load(table_dir, mmap=True), fingerprint
+
+
+def load_device_assets(device_type):
+    """Fetches the preprocessor, similarity index, lookup and neighbor tables for one device concurrently."""
+    with MODEL_LOAD_SECONDS.time(service="knn", device=device_type):
+        return _load_device_assets(device_type)
+
+
+def _load_device_assets(device_type):
+    from lookup_table import ColumnarLookupTable
+    from neighbor_table import CatalogRows
+    from serving_common.row_filters import RowFilterIndex
+
+    device_cache = MODEL_CACHE[device_type]
+    logger.info("Loading models and data for %s", device_type)
+    preprocessor_future = _asset_executor.submit(load_artifact, device_cache["preprocessor_blob"], True)
+    index_future = _asset_executor.submit(load_index_artifact, device_cache["index_blob_prefix"])
+    lookup_future = _asset_executor.submit(load_lookup_table_artifact, device_cache["lookup_blob_prefix"])
+    neighbor_table_future = _asset_executor.submit(load_neighbor_table_artifact,
+                                                   device_cache["neighbor_table_blob_prefix"])
+
+    similarity_index, index_version = index_future.result()
+    nn_model = None
+    if similarity_index is None:
+        logger.warning("No similarity index found for %s; falling back to the pickled NN model.", device_type)
+        nn_model, index_version = load_artifact(device_cache["nn_model_blob"], is_joblib=True)
+    lookup_table, lookup_version = lookup_future.result()
+    if lookup_table is None:
+        logger.warning("No columnar lookup table found for %s; parsing the lookup CSV.", device_type)
+        df_lookup, lookup_version = load_artifact(device_cache["x_train_blob"], is_joblib=False)
+        lookup_table = ColumnarLookupTable.from_dataframe(df_lookup)
+    neighbor_table, neighbor_table_version = neighbor_table_future.result()
+    if neighbor_table is not None and len(neighbor_table) > len(lookup_table):
+        logger.warning("Neighbor table for %s covers more rows than the lookup table; ignoring it.", device_type)
+        neighbor_table = None
+    preprocessor, preprocessor_version = preprocessor_future.result()
+    input_features = DESKTOP_PREPROCESSOR_INPUT_FEATURES if device_type == 'desktop' else LAPTOP_PREPROCESSOR_INPUT_FEATURES
+
+    decoder = RequestDecoder.from_pipeline(preprocessor, input_features)
+
+    logger.info("Finished loading for %s", device_type)
+    assets = {
+        "preprocessor": preprocessor,
+        "similarity_index": similarity_index,
+        "nn_model": nn_model,
+        "x_train_original": lookup_table,
+        "row_filters": RowFilterIndex(lookup_table),
+        "neighbor_table": neighbor_table,
+        "catalog_rows": CatalogRows(lookup_table, decoder),
+        "decoder": decoder,
+        "version": "|".join([preprocessor_version, index_version, lookup_version,
+                             neighbor_table_version or "no-neighbor-table"]),
+    }
+    return Versioned(assets, assets["version"])
+
+
+def registry_key(device_type):
+    return f"knn/{device_type}"
+
+
+def warm_up(device_types=None):
+    """Starts loading every device type in parallel without waiting for completion."""
+    for device_type in device_types or list(MODEL_CACHE):
+        REGISTRY.prefetch(registry_key(device_type), lambda device_type=device_type: load_device_assets(device_type))
+
+
+def reload_models(device_type):
+    """Loads fresh assets for device_type and swaps them in while the old ones keep serving."""
+    return REGISTRY.reload(registry_key(device_type), lambda: load_device_assets(device_type),
+                           timeout=ASSET_LOAD_TIMEOUT_SECONDS)
 
 
 def ensure_models_loaded(device_type):
-    """Loads models and data for the given device_type if not already loaded."""
-    if not MODEL_CACHE[device_type]["loaded"]:
-        print(f"Loading models and data for {device_type} from GCS...")
-        MODEL_CACHE[device_type]["preprocessor"] = load_from_gcs(GCS_BUCKET_NAME, MODEL_CACHE[device_type]["preprocessor_blob"], is_joblib=True)
-        MODEL_CACHE[device_type]["nn_model"] = load_from_gcs(GCS_BUCKET_NAME, MODEL_CACHE[device_type]["nn_model_blob"], is_joblib=True)
-        MODEL_CACHE[device_type]["x_train_original"] = load_from_gcs(GCS_BUCKET_NAME, MODEL_CACHE[device_type]["x_train_blob"], is_joblib=False)
-        MODEL_CACHE[device_type]["loaded"] = True
-        print(f"Finished loading for {device_type}.")
-    return MODEL_CACHE[device_type]
-
-
-# --- Helper function to derive procesador_tipo ---
-def get_procesador_tipo(procesador_str):
-    if pd.isna(procesador_str) or not isinstance(procesador_str, str):
-        return np.nan
-
-    patterns_results = [
-        (r"Apple M\d*", "Apple M"),
-        (r"Core Ultra", "Core Ultra"),
-        (r"Core i(\d)", lambda m: f"Core i{m.group(1)}"),
-        (r"Intel N\d*", "Intel N"),
-        (r"Pentium", "Pentium"),
-        (r"Celeron", "Celeron"),
-        (r"Atom", "Atom"),
-        (r"Xeon", "Xeon"),
-        (r"Ryzen AI", "Ryzen AI"),
-        (r"Ryzen (\d)", lambda m: f"Ryzen {m.group(1)}"),
-        (r"Threadripper", "Threadripper"),
-        (r"EPYC", "EPYC"),
-        (r"Athlon", "Athlon")
-    ]
-
-    for pattern, result_val_or_func in patterns_results:
-        match = re.search(pattern, procesador_str, flags=re.IGNORECASE)
-        if match:
-            if callable(result_val_or_func):
-                return result_val_or_func(match)
-            return result_val_or_func
-    
-    return np.nan
+    """Returns the assets for device_type, waiting for (or starting) their load if needed."""
+    device_assets = REGISTRY.peek(registry_key(device_type))
+    if device_assets is not None:
+        return device_assets
+    # Not loaded yet (cold start): record how long this request waits for it.
+    with MODEL_WAIT_SECONDS.time(service="knn", device=device_type):
+        return REGISTRY.get(registry_key(device_type), lambda: load_device_assets(device_type),
+                            timeout=ASSET_LOAD_TIMEOUT_SECONDS)
+
+
+if WARMUP_ON_START:
+    warm_up()
+
+
+# Similarity index search: catalogs of up to KNN_EXACT_SEARCH_MAX_ITEMS products are
+# scanned exactly (every IVF list; well under a millisecond per query for the current
+# ~3,100-product catalogs), larger ones probe KNN_N_PROBE lists per query (default: the
+# index's default_n_probe). Recall of the probe against an exact scan, measured on 500
+# perturbed catalog rows per device with the staged indexes (55 / 56 lists), counting a
+# neighbor as found when it is no farther than the exact k-th one:
+#     n_probe   4      8      16     32
+#     k=5       0.97   0.99   0.998  1.0
+#     k=10      0.96   0.99   0.998  1.0
+KNN_EXACT_SEARCH_MAX_ITEMS = int(os.environ.get("KNN_EXACT_SEARCH_MAX_ITEMS", "50000"))
+KNN_N_PROBE = int(os.environ["KNN_N_PROBE"]) if os.environ.get("KNN_N_PROBE") else None
+
+# Upper bound on the number of query products accepted in one batch request.
+MAX_BATCH_QUERIES = 100
+
+
+def search_neighbors(device_assets, query_matrix, n_neighbors, allowed=None):
+    """
+    Neighbors of every row of `query_matrix`: (distances, indices), one row per query.
+    Rows may be padded with index -1 when the catalog (or the allowed subset) holds fewer
+    than n_neighbors items. `allowed` is a boolean mask over lookup rows (row_filters).
+    """
+    similarity_index = device_assets["similarity_index"]
+    if similarity_index is not None:
+        n_probe = similarity_index.n_lists if len(similarity_index) <= KNN_EXACT_SEARCH_MAX_ITEMS else KNN_N_PROBE
+        return similarity_index.search(query_matrix, n_neighbors, n_probe=n_probe, allowed=allowed)
+    nn_model = device_assets["nn_model"]
+    n_samples = nn_model.n_samples_fit_
+    if allowed is None:
+        return nn_model.kneighbors(query_matrix, n_neighbors=min(n_neighbors, n_samples))
+
+    # The pickled model cannot filter during the search: over-fetch until enough neighbors pass.
+    import numpy as np
+    n_fetch = min(n_samples, n_neighbors * 4)
+    while True:
+        distances, indices = nn_model.kneighbors(query_matrix, n_neighbors=n_fetch)
+        passing = allowed[indices]
+        if n_fetch >= n_samples or passing.sum(axis=1).min() >= n_neighbors:
+            break
+        n_fetch = min(n_samples, n_fetch * 4)
+    filtered_distances = np.full((len(indices), n_neighbors), np.inf)
+    filtered_indices = np.full((len(indices), n_neighbors), -1, dtype=np.int64)
+    for row in range(len(indices)):
+        columns = np.flatnonzero(passing[row])[:n_neighbors]
+        filtered_distances[row, :len(columns)] = distances[row, columns]
+        filtered_indices[row, :len(columns)] = indices[row, columns]
+    return filtered_distances, filtered_indices
+
+
+def check_finite_queries(query_matrix):
+    """
+    Raises ValueError when a preprocessed query still holds NaN / inf: the preprocessor
+    does not impute every numeric column, so a missing numeric feature comes through as
+    NaN, and its distances (and neighbors) would be meaningless.
+    """
+    import numpy as np
+    values = query_matrix.data if hasattr(query_matrix, "toarray") else np.asarray(query_matrix, dtype=float)
+    if not np.isfinite(values).all():
+        raise ValueError("missing or non-numeric values for numeric features; "
+                         "send every feature of the device type in 'feature_values'.")
+    return query_matrix
+
+
+def transform_queries(device_assets, queries):
+    """Preprocessed query matrix for a list of feature_values dicts (one decode, one transform)."""
+    with STAGE_SECONDS.time(service="knn", stage="decode"):
+        query_df = device_assets["decoder"].decode_many(queries)
+    with STAGE_SECONDS.time(service="knn", stage="transform"):
+        return check_finite_queries(device_assets["preprocessor"].transform(query_df))
+
+
+class QueryPreprocessingError(ValueError):
+    """A query's feature values could not be decoded or transformed."""
+
+
+def search_micro_batch(key, items):
+    """
+    MicroBatcher runner: items are (device_assets, feature_values, k, allowed) with the same
+    device type, asset version and filters, searched with one transform and one neighbor
+    search. Returns (distances, indices) per item, without padding; a query that cannot be
+    preprocessed gets a QueryPreprocessingError and does not fail the others.
+    """
+    device_assets, allowed = items[0][0], items[0][3]
+    try:
+        query_matrix = transform_queries(device_assets, [feature_values for _, feature_values, _, _ in items])
+    except Exception as e:
+        if len(items) == 1:
+            return [QueryPreprocessingError(str(e))]
+        return [search_micro_batch(key, [item])[0] for item in items]
+    n_fetch = max(k for _, _, k, _ in items)
+    with STAGE_SECONDS.time(service="knn", stage="search"):
+        distances, indices = search_neighbors(device_assets, query_matrix, n_fetch, allowed=allowed)
+    results = []
+    for (_, _, k, _), query_distances, query_indices in zip(items, distances, indices):
+        found = query_indices >= 0
+        results.append((query_distances[found][:k], query_indices[found][:k]))
+    return results
+
+
+# Optional (MICRO_BATCH_ENABLED): concurrent single-product searches are held for a few
+# milliseconds and run as one transform and one neighbor search (serving_common.micro_batching).
+KNN_BATCHER = MicroBatcher("knn", search_micro_batch) if MICRO_BATCH_ENABLED else None
+
+
+def lookup_known_neighbors(device_assets, feature_values, n_neighbors, allowed=None):
+    """
+    (distances, indices) from the precomputed neighbor table when feature_values is a
+    catalog product, else None (no table, novel configuration, or more neighbors than stored).
+    """
+    neighbor_table = device_assets.get("neighbor_table")
+    if neighbor_table is None:
+        return None
+    with STAGE_SECONDS.time(service="knn", stage="table_lookup"):
+        return neighbor_table.lookup(feature_values, n_neighbors, allowed=allowed)
+
+
+def select_batch_neighbors(distances, indices, k, self_rows=None, dedupe=False):
+    """
+    Picks up to k neighbors per query from oversampled search results.
+    self_rows (exclude_self) holds each query's own lookup rows (every listing of its
+    configuration, none for a product not in the catalog); they are dropped. dedupe skips
+    rows already returned for an earlier query. Returns a list of (distances, indices).
+    """
+    import numpy as np
+    seen = set()
+    selected = []
+    for position, (query_distances, query_indices) in enumerate(zip(distances, indices)):
+        keep = query_indices >= 0
+        if self_rows is not None and len(self_rows[position]):
+            keep &= ~np.isin(query_indices, self_rows[position])
+        query_distances, query_indices = query_distances[keep], query_indices[keep]
+        if dedupe:
+            keep = np.fromiter((index not in seen for index in query_indices.tolist()), dtype=bool,
+                               count=len(query_indices))
+            query_distances, query_indices = query_distances[keep], query_indices[keep]
+        query_distances, query_indices = query_distances[:k], query_indices[:k]
+        if dedupe:
+            seen.update(query_indices.tolist())
+        selected.append((query_distances, query_indices))
+    return selected
+
+
+def get_batch_similar_products(queries, k_neighbors, device_assets, return_features_list, headers,
+                               exclude_self=False, dedupe=False, allowed=None):
+    """
+    Neighbors for a list of query products with one transform and one search over the
+    stacked query matrix. Returns the handler response: {"results": [{"similar_products": [...]}, ...]}.
+    """
+    import numpy as np
+    queries = [{**feature_values, 'procesador_tipo': get_procesador_tipo(feature_values['procesador'])}
+               if 'procesador' in feature_values else feature_values for feature_values in queries]
+    lookup_table = device_assets["x_train_original"]
+    # The query's own product is found by identity: distances of identical configurations
+    # are not reliably zero (e.g. the stored procesador_tipo differs from the derived one).
+    self_rows = [device_assets["catalog_rows"].find_rows(feature_values) for feature_values in queries] if exclude_self else None
+    # Oversample so that k neighbors remain after dropping self-matches and repeats.
+    n_fetch = (k_neighbors + (max(len(rows) for rows in self_rows) if exclude_self else 0)
+               + (k_neighbors * (len(queries) - 1) if dedupe else 0))
+    n_fetch = min(n_fetch, len(lookup_table))
+    distances = np.full((len(queries), n_fetch), np.inf)
+    indices = np.full((len(queries), n_fetch), -1, dtype=np.int64)
+
+    # Catalog products come from the neighbor table; only the novel ones are searched.
+    novel = []
+    for position, feature_values in enumerate(queries):
+        known = lookup_known_neighbors(device_assets, feature_values, n_fetch, allowed=allowed)
+        if known is None:
+            novel.append(position)
+        else:
+            distances[position, :len(known[1])], indices[position, :len(known[1])] = known
+
+    if novel:
+        try:
+            query_matrix = transform_queries(device_assets, [queries[position] for position in novel])
+        except Exception as e:
+            logger.warning("Error preprocessing batch queries: %s", e)
+            return ({'error': f"Error during preprocessing of input features: {e}"}, 400, headers)
+        try:
+            with STAGE_SECONDS.time(service="knn", stage="search"):
+                novel_distances, novel_indices = search_neighbors(device_assets, query_matrix, n_fetch, allowed=allowed)
+        except Exception as e:
+            logger.error("Error during batch kneighbors search: %s", e)
+            return ({'error': "Failed to find similar items."}, 500, headers)
+        width = novel_indices.shape[1]
+        distances[novel, :width], indices[novel, :width] = novel_distances, novel_indices
+    selected = select_batch_neighbors(distances, indices, k_neighbors, self_rows=self_rows, dedupe=dedupe)
+
+    # One retrieval for every query's neighbors, then split back per query.
+    actual_return_features = [col for col in return_features_list if col in lookup_table.columns]
+    counts = [len(query_indices) for _, query_indices in selected]
+    all_indices = np.concatenate([query_indices for _, query_indices in selected])
+    try:
+        with STAGE_SECONDS.time(service="knn", stage="retrieve"):
+            all_columns = {'similarity_distance': np.concatenate([query_distances for query_distances, _ in selected])}
+            all_columns.update(lookup_table.take(all_indices, actual_return_features))
+    except Exception as e:
+        logger.error("Error retrieving neighbor details: %s", e)
+        return ({'error': "Error retrieving neighbor details."}, 500, headers)
+
+    with STAGE_SECONDS.time(service="knn", stage="serialize"):
+        offsets = np.cumsum([0] + counts)
+        bodies = [records_json({name: values[start:end] for name, values in all_columns.items()},
+                               "similar_products", decimals=4)
+                  for start, end in zip(offsets[:-1], offsets[1:])]
+        response_body = b'{"results":[' + b",".join(bodies) + b"]}"
+    return (response_body, 200, {**headers, 'Content-Type': JSON_CONTENT_TYPE})
 
 
 @functions_framework.http
+@instrument_handler("knn")
 def get_k_similar_products(request):
     """
     HTTP Cloud Function to find and return K most similar products based on input features.
@@ -178,10 +494,36 @@ def get_k_similar_products(request):
         ]
     }
 
+    Batch requests replace "feature_values" with a list of query products (at most
+    MAX_BATCH_QUERIES), answered with one preprocessing pass and one neighbor search:
+    {
+        "device_type": "laptop",
+        "k": 5,
+        "queries": [{...feature_values...}, {...}],
+        "exclude_self": false,   // Optional. Drop the query product itself (the catalog rows with these feature values).
+        "dedupe": false          // Optional. Never return a product already listed for an earlier query.
+    }
+    Response: {"results": [{"similar_products": [...]}, ...]}, one entry per query, in order.
+
+    Both forms accept optional "filters" on lookup table columns (see
+    serving_common/row_filters.py); only matching products are returned, still the k
+    nearest among them. Example for "laptop":
+        "filters": {
+            "ram_memoria_gb": {"min": 16},                         // numeric: inclusive "min" / "max"
+            "procesador_tipo": ["Intel Core i7", "AMD Ryzen 7"],   // string: a value or a list of values
+            "pantalla_tecnologia": "Full HD"
+        }
+    String values are matched exactly as stored ("Core i7" / "Ryzen 7" for "desktop").
+    The lookup tables have no price column, so price (precio_mean) filters are rejected
+    with 400 Bad Request.
+
     Error JSON response (e.g., 400 Bad Request, 500 Internal Server Error):
     {
         "error": "Descriptive error message."
     }
+
+    GET .../metrics returns the service's latency histograms and counters in OpenMetrics
+    text format (see serving_common.metrics).
     """
     # Set CORS headers for preflight requests
     if request.method == 'OPTIONS':
@@ -198,13 +540,16 @@ def get_k_similar_products(request):
         'Access-Control-Allow-Origin': '*'
     }
 
-    request_json = request.get_json(silent=True)
+    with STAGE_SECONDS.time(service="knn", stage="parse"):
+        request_json = request.get_json(silent=True)
 
     if not request_json:
         return ({'error': 'No JSON payload received.'}, 400, headers)
 
     device_type = request_json.get('device_type')
     feature_values = request_json.get('feature_values')
+    queries = request_json.get('queries')
+    filters = request_json.get('filters')
     k_neighbors_requested = request_json.get('k', 5)  # Default to 5 neighbors
 
     if not device_type:
@@ -213,8 +558,18 @@ def get_k_similar_products(request):
     if device_type not in ['desktop', 'laptop']:
         return ({'error': 'Invalid "device_type". Must be "desktop" or "laptop".'}, 400, headers)
     
-    if not feature_values or not isinstance(feature_values, dict):
+    if queries is not None:
+        if not isinstance(queries, list) or not queries:
+            return ({'error': '"queries" must be a non-empty list.'}, 400, headers)
+        if len(queries) > MAX_BATCH_QUERIES:
+            return ({'error': f'Too many queries: {len(queries)}. Maximum is {MAX_BATCH_QUERIES}.'}, 400, headers)
+        invalid = [i for i, query in enumerate(queries) if not query or not isinstance(query, dict)]
+        if invalid:
+            return ({'error': f'Invalid "queries" entries at positions {invalid}. Each must be a dictionary.'}, 400, headers)
+    elif not feature_values or not isinstance(feature_values, dict):
         return ({'error': 'Missing or invalid "feature_values". Must be a dictionary.'}, 400, headers)
+    if filters is not None and not isinstance(filters, dict):
+        return ({'error': '"filters" must be a dictionary of column predicates.'}, 400, headers)
     
     try:
         k_neighbors = int(k_neighbors_requested)
@@ -228,87 +583,107 @@ def get_k_similar_products(request):
     try:
         device_assets = ensure_models_loaded(device_type)
         preprocessor = device_assets["preprocessor"]
-        nn_model = device_assets["nn_model"]
-        df_X_train_original = device_assets["x_train_original"]
+        lookup_table = device_assets["x_train_original"]
+        decoder = device_assets["decoder"]
     except FileNotFoundError as e:
-        print(f"Error: A required model or data file was not found in GCS: {e}")
+        logger.error("A required model or data file was not found: %s", e)
         return ({'error': f"Configuration error: missing model/data file for {device_type}. {e}"}, 500, headers)
     except Exception as e:
-        print(f"Error loading models/data for {device_type}: {e}")
+        logger.error("Error loading models/data for %s: %s", device_type, e)
         return ({'error': f"Could not load necessary assets for {device_type}." }, 500, headers)
 
 
-    # Determine the correct feature list for preprocessing
+    # Determine the features returned for each neighbor
     if device_type == 'desktop':
-        preprocessor_input_features = DESKTOP_PREPROCESSOR_INPUT_FEATURES
         return_features_list = DESKTOP_RETURN_FEATURES
     else: # laptop
-        preprocessor_input_features = LAPTOP_PREPROCESSOR_INPUT_FEATURES
         return_features_list = LAPTOP_RETURN_FEATURES
-    
-    # Create DataFrame for the query item, ensuring correct column order for preprocessor
-    try:
-        query_df_input = pd.DataFrame([feature_values])
 
-        # Derive 'procesador_tipo' if 'procesador' is present
-        if 'procesador' in query_df_input.columns:
-            query_df_input['procesador_tipo'] = query_df_input['procesador'].apply(get_procesador_tipo)
-        else:
-            # If 'procesador' isn't even in the input, 'procesador_tipo' will also be missing
-            # The loop below will add it as NaN if it's in preprocessor_input_features
-            pass 
-
-        # Ensure all expected columns for preprocessor are present, fill missing with NaN
-        for col in preprocessor_input_features:
-            if col not in query_df_input.columns:
-                query_df_input[col] = np.nan 
-        query_df_for_preprocessing = query_df_input[preprocessor_input_features] # Enforce order
-    except Exception as e:
-        return ({'error': f'Error creating DataFrame from input features: {e}'}, 400, headers)
-
-    # Preprocess the query item
+    # Filters become a mask over the lookup rows, applied inside the neighbor search
     try:
-        query_item_processed = preprocessor.transform(query_df_for_preprocessing)
-    except Exception as e:
-        print(f"Error preprocessing input query: {e}")
-        # This can happen if input features have unexpected values/types not handled by imputer/OHE
-        return ({'error': f"Error during preprocessing of input features: {e}"}, 400, headers)
-
-    # Find neighbors 
-    actual_k_for_nn = k_neighbors 
-    
+        with STAGE_SECONDS.time(service="knn", stage="filter"):
+            allowed = device_assets["row_filters"].allowed_rows(filters)
+    except ValueError as e:
+        return ({'error': f'Invalid "filters": {e}'}, 400, headers)
+
+    if queries is not None:
+        return get_batch_similar_products(queries, k_neighbors, device_assets, return_features_list, headers,
+                                          exclude_self=bool(request_json.get('exclude_self', False)),
+                                          dedupe=bool(request_json.get('dedupe', False)), allowed=allowed)
+
+    # Derive 'procesador_tipo' if 'procesador' is present
+    if 'procesador' in feature_values:
+        feature_values = {**feature_values, 'procesador_tipo': get_procesador_tipo(feature_values['procesador'])}
+
+    # Popular configurations are answered from the response cache (keyed on the asset versions).
+    cache_key = response_cache_key("knn", device_type, device_assets["version"], feature_values, decoder, k=k_neighbors,
+                                   options={"filters": filters} if filters else None)
+    cached_response = RESPONSE_CACHE.get(cache_key, service="knn")
+    if cached_response is not None:
+        return (cached_response, 200, {**headers, 'Content-Type': JSON_CONTENT_TYPE})
+
+    # Products already in the catalog are answered from the precomputed neighbor table
+    known_neighbors = lookup_known_neighbors(device_assets, feature_values, k_neighbors, allowed=allowed)
+    if known_neighbors is not None:
+        distances, indices_in_X_train = known_neighbors
+    elif KNN_BATCHER is not None:
+        # Searched together with the concurrent requests for the same assets and filters.
+        batch_key = (device_type, device_assets["version"], json.dumps(filters, sort_keys=True) if filters else None)
+        try:
+            distances, indices_in_X_train = KNN_BATCHER.submit(batch_key, (device_assets, feature_values, k_neighbors,
+                                                                           allowed))
+        except QueryPreprocessingError as e:
+            logger.warning("Error preprocessing input query: %s", e)
+            return ({'error': f"Error during preprocessing of input features: {e}"}, 400, headers)
+        except Exception as e:
+            logger.error("Error during kneighbors search: %s", e)
+            return ({'error': "Failed to find similar items."}, 500, headers)
+    else:
+        # Build the preprocessor input in one step: columns in preprocessor order, missing ones as NaN
+        try:
+            with STAGE_SECONDS.time(service="knn", stage="decode"):
+                query_df_for_preprocessing = decoder.decode(feature_values)
+        except Exception as e:
+            return ({'error': f'Error creating DataFrame from input features: {e}'}, 400, headers)
+
+        # Preprocess the query item
+        try:
+            with STAGE_SECONDS.time(service="knn", stage="transform"):
+                query_item_processed = check_finite_queries(preprocessor.transform(query_df_for_preprocessing))
+        except Exception as e:
+            logger.warning("Error preprocessing input query: %s", e)
+            # This can happen if input features have unexpected values/types not handled by imputer/OHE
+            return ({'error': f"Error during preprocessing of input features: {e}"}, 400, headers)
+
+        # Find neighbors 
+        actual_k_for_nn = k_neighbors 
+        
+        try:
+            with STAGE_SECONDS.time(service="knn", stage="search"):
+                distances, indices_in_X_train = search_neighbors(device_assets, query_item_processed, actual_k_for_nn, allowed=allowed)
+                found = indices_in_X_train >= 0 # Padding when the catalog holds fewer than k items
+                distances, indices_in_X_train = distances[found], indices_in_X_train[found]
+        except Exception as e:
+            logger.error("Error during kneighbors search: %s", e)
+            return ({'error': "Failed to find similar items."}, 500, headers)
+
+    # Select the return features and retrieve them only for the neighbor rows
+    actual_return_features = [col for col in return_features_list if col in lookup_table.columns]
     try:
-        distances, indices_in_X_train = nn_model.kneighbors(query_item_processed, n_neighbors=actual_k_for_nn)
-    except Exception as e:
-        print(f"Error during kneighbors search: {e}")
-        return ({'error': "Failed to find similar items."}, 500, headers)
-
-    # Retrieve neighbors from the original X_train data
-    try:
-        valid_indices = indices_in_X_train.flatten()[:min(len(indices_in_X_train.flatten()), len(df_X_train_original))]
-        neighbors_df = df_X_train_original.iloc[valid_indices].copy()
-        neighbors_df['similarity_distance'] = distances.flatten()[:len(valid_indices)]
+        valid_indices = indices_in_X_train.flatten()[:min(len(indices_in_X_train.flatten()), len(lookup_table))]
+        neighbor_columns = {'similarity_distance': distances.flatten()[:len(valid_indices)]}
+        with STAGE_SECONDS.time(service="knn", stage="retrieve"):
+            neighbor_columns.update(lookup_table.take(valid_indices, actual_return_features))
     except IndexError:
-        print(f"IndexError: Indices from kNN out of bounds for df_X_train_original.")
+        logger.error("Indices from kNN out of bounds for the lookup table.")
         return ({'error': "Error retrieving neighbor details due to index mismatch or too few items in training data."}, 500, headers)
     except Exception as e:
-        print(f"Error retrieving neighbor details: {e}")
+        logger.error("Error retrieving neighbor details: %s", e)
         return ({'error': "Error retrieving neighbor details."}, 500, headers)
 
-    # Select and format the return features
-    actual_return_features = [col for col in return_features_list if col in neighbors_df.columns]
-    if 'similarity_distance' not in actual_return_features : 
-        actual_return_features = ['similarity_distance'] + actual_return_features
-    else: 
-        actual_return_features.insert(0, actual_return_features.pop(actual_return_features.index('similarity_distance')))
+    # Numbers rounded to 4 decimals and NaN / missing values as null, column by column.
+    with STAGE_SECONDS.time(service="knn", stage="serialize"):
+        response_body = records_json(neighbor_columns, "similar_products", decimals=4)
 
-    similar_products_data = neighbors_df[actual_return_features].to_dict(orient='records')
-    
-    for product_dict in similar_products_data:
-        for key, value in product_dict.items():
-            if isinstance(value, (np.float32, np.float64, float)):
-                product_dict[key] = round(value, 4) 
-            elif pd.isna(value): 
-                product_dict[key] = None
-
-    return ({"similar_products": similar_products_data}, 200, headers)
+    RESPONSE_CACHE.put(cache_key, response_body, namespace=registry_key(device_type))
+    return (response_body, 200, {**headers, 'Content-Type': JSON_CONTENT_TYPE})
@@ -0,0 +1,289 @@
+# cloud/get-k-similar-products/neighbor_table.py
+"""
+Precomputed top-K neighbors for every catalog row.
+
+Most similarity lookups are for products that are already in the catalog, i.e. rows of
+X_train_original_for_knn_lookup_DEVICE.csv. `build` prepares every catalog row the way the
+service prepares a request carrying it (procesador_tipo derived from procesador, decoded
+with the request schema, transformed by the kNN preprocessor), queries the fitted
+NearestNeighbors model for all of them in chunks on a process pool, and writes a compact
+table:
+  - neighbors.npy   int32 (n_rows x K) lookup-table row positions, -1 padded
+  - distances.npy   float32 (n_rows x K), ascending per row
+  - row_keys.npy    uint64 (n_rows) hash of each row's canonical feature vector
+  - meta.json       K, the key columns and which of them are numeric (written last)
+
+The service maps row keys to rows once when the table is loaded, so a request for a known
+product is a hash lookup plus a slice; only novel configurations run the live search.
+Products appended to the index later are not in the table (they fall back to the live
+search), and they do not show up in the precomputed lists of existing products until the
+table is rebuilt.
+
+Offline usage:
+    python neighbor_table.py build --preprocessor preprocessor_laptop_knn.joblib \
+        --nn-model nn_model_laptop.joblib --lookup X_train_original_for_knn_lookup_laptop.csv \
+        --device-type laptop --out knn_neighbors_laptop --k 50 --workers 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+_CLOUD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _CLOUD_DIR not in sys.path:
+    sys.path.append(_CLOUD_DIR)
+from serving_common.processor_family import get_procesador_tipo, procesador_tipo_series
+from serving_common.request_decoder import RequestDecoder
+
+NEIGHBOR_TABLE_FORMAT_VERSION = 1
+DEFAULT_K = 50
+DEFAULT_CHUNK_SIZE = 1024
+
+# meta.json is written last so a reader never sees a half-written table.
+NEIGHBOR_TABLE_FILES = ["neighbors.npy", "distances.npy", "row_keys.npy", "meta.json"]
+
+
+def _save_npy_atomic(path, array):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _save_json_atomic(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def row_key(decoder, feature_values):
+    """64-bit hash of the canonical feature vector (RequestDecoder.canonical)."""
+    payload = json.dumps(decoder.canonical(feature_values), separators=(",", ":"), ensure_ascii=False, default=str)
+    return int.from_bytes(hashlib.blake2b(payload.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+# --- Offline build ---
+
+_worker_nn_model = None
+
+
+def _init_worker(nn_model_path):
+    # Each worker unpickles the model once and reuses it for all of its chunks.
+    global _worker_nn_model
+    import joblib
+    _worker_nn_model = joblib.load(nn_model_path)
+
+
+def _query_chunk(start, vectors, k):
+    distances, indices = _worker_nn_model.kneighbors(vectors, n_neighbors=k)
+    return start, distances.astype(np.float32), indices.astype(np.int32)
+
+
+def compute_neighbors(nn_model_path, vectors, k, chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    """
+    Top-k neighbors of every row of `vectors` under the pickled NearestNeighbors model.
+    Returns (distances float32, neighbors int32), both (n_rows x k).
+    """
+    n_rows = len(vectors)
+    distances = np.empty((n_rows, k), dtype=np.float32)
+    neighbors = np.empty((n_rows, k), dtype=np.int32)
+    chunks = [(start, vectors[start:start + chunk_size]) for start in range(0, n_rows, chunk_size)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(nn_model_path)
+        results = (_query_chunk(start, chunk, k) for start, chunk in chunks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(nn_model_path,))
+        results = executor.map(_query_chunk, *zip(*chunks), [k] * len(chunks))
+    try:
+        for start, chunk_distances, chunk_neighbors in results:
+            distances[start:start + len(chunk_distances)] = chunk_distances
+            neighbors[start:start + len(chunk_neighbors)] = chunk_neighbors
+    finally:
+        if workers != 1:
+            executor.shutdown()
+    return distances, neighbors
+
+
+def build_neighbor_table(df_lookup, preprocessor, nn_model_path, out_dir, key_columns, k=DEFAULT_K,
+                         chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    """
+    Precomputes the k nearest catalog rows of every row of `df_lookup` and writes the table
+    to `out_dir`. `key_columns` are the request features identifying a product (the
+    service's *_PREPROCESSOR_INPUT_FEATURES).
+    """
+    import joblib
+
+    from similarity_index import to_dense_float32
+
+    n_samples = joblib.load(nn_model_path).n_samples_fit_
+    if n_samples != len(df_lookup):
+        raise ValueError(f"The NN model was fitted on {n_samples} rows but the lookup table holds {len(df_lookup)}; "
+                         "neighbor positions would not line up with the lookup rows.")
+    k = min(k, n_samples)
+    decoder = RequestDecoder.from_pipeline(preprocessor, key_columns)
+    # Requests get procesador_tipo derived from procesador, so the rows do too; this keeps
+    # keys and neighbors identical to what the live search sees for the same request.
+    key_frame = df_lookup.reindex(columns=decoder.columns)
+    if "procesador" in df_lookup.columns and "procesador_tipo" in key_frame.columns:
+        key_frame["procesador_tipo"] = procesador_tipo_series(df_lookup["procesador"])
+    rows = key_frame.to_dict("records")
+
+    vectors = to_dense_float32(preprocessor.transform(decoder.decode_many(rows)))
+    distances, neighbors = compute_neighbors(nn_model_path, vectors, k, chunk_size=chunk_size, workers=workers)
+    row_keys = np.fromiter((row_key(decoder, row) for row in rows), dtype=np.uint64, count=len(rows))
+
+    os.makedirs(out_dir, exist_ok=True)
+    _save_npy_atomic(os.path.join(out_dir, "neighbors.npy"), neighbors)
+    _save_npy_atomic(os.path.join(out_dir, "distances.npy"), distances)
+    _save_npy_atomic(os.path.join(out_dir, "row_keys.npy"), row_keys)
+    _save_json_atomic(os.path.join(out_dir, "meta.json"), {
+        "format_version": NEIGHBOR_TABLE_FORMAT_VERSION,
+        "metric": "euclidean",
+        "k": int(k),
+        "n_rows": int(len(df_lookup)),
+        "key_columns": decoder.columns,
+        "numeric_columns": sorted(decoder.numeric_columns),
+    })
+    return NeighborTable.load(out_dir)
+
+
+# --- Serving ---
+
+_NO_ROWS = np.zeros(0, dtype=np.int64)
+
+
+class CatalogRows:
+    """
+    Lookup-table rows of every catalog configuration, keyed like the neighbor table (row_key
+    over the request features, procesador_tipo derived from procesador), so a request can
+    be matched to the product it describes by identity rather than by distance. A
+    configuration listed several times maps to all of its rows. Built on first use.
+    """
+
+    def __init__(self, lookup_table, decoder):
+        self.lookup_table = lookup_table
+        self.decoder = decoder
+        self._lock = threading.Lock()
+        self._rows = None
+
+    def _build(self):
+        columns = [column for column in self.decoder.columns if column in self.lookup_table.columns]
+        values = {name: array.tolist() for name, array in
+                  self.lookup_table.take(np.arange(len(self.lookup_table)), columns).items()}
+        rows = {}
+        for row in range(len(self.lookup_table)):
+            feature_values = {name: values[name][row] for name in columns}
+            if "procesador" in feature_values and "procesador_tipo" in self.decoder.columns:
+                feature_values["procesador_tipo"] = get_procesador_tipo(feature_values["procesador"])
+            rows.setdefault(row_key(self.decoder, feature_values), []).append(row)
+        return {key: np.array(key_rows, dtype=np.int64) for key, key_rows in rows.items()}
+
+    def find_rows(self, feature_values):
+        """Rows of the catalog products with exactly these (request-form) feature values (possibly none)."""
+        if self._rows is None:
+            with self._lock:
+                if self._rows is None:
+                    self._rows = self._build()
+        return self._rows.get(row_key(self.decoder, feature_values), _NO_ROWS)
+
+
+class NeighborTable:
+    """Read side of the neighbor table: O(1) neighbors for products already in the catalog."""
+
+    def __init__(self, table_dir, meta, neighbors, distances, row_keys):
+        self.table_dir = table_dir
+        self.meta = meta
+        self.neighbors = neighbors
+        self.distances = distances
+        self.decoder = RequestDecoder(meta["key_columns"], meta["numeric_columns"])
+        # Identical configurations share one key; their neighbor lists are the same.
+        self._rows = {}
+        for row, key in enumerate(row_keys.tolist()):
+            self._rows.setdefault(key, row)
+
+    @classmethod
+    def load(cls, table_dir, mmap=True):
+        with open(os.path.join(table_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != NEIGHBOR_TABLE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported neighbor table format: {meta.get('format_version')}")
+        mmap_mode = "r" if mmap else None
+        return cls(table_dir, meta,
+                   np.load(os.path.join(table_dir, "neighbors.npy"), mmap_mode=mmap_mode),
+                   np.load(os.path.join(table_dir, "distances.npy"), mmap_mode=mmap_mode),
+                   np.load(os.path.join(table_dir, "row_keys.npy")))
+
+    def __len__(self):
+        return self.meta["n_rows"]
+
+    @property
+    def k(self):
+        return self.meta["k"]
+
+    def find_row(self, feature_values):
+        """Catalog row holding exactly this configuration, or None."""
+        return self._rows.get(row_key(self.decoder, feature_values))
+
+    def lookup(self, feature_values, k, allowed=None):
+        """
+        (distances, indices) of the k nearest catalog rows for a known product, or None when
+        the configuration is not in the catalog or more neighbors are asked for than stored.
+        With `allowed` (boolean mask over lookup rows) the stored list is filtered; None is
+        also returned when fewer than k stored neighbors pass and the list may continue.
+        """
+        if k > self.k:
+            return None
+        row = self.find_row(feature_values)
+        if row is None:
+            return None
+        stored = self.k if allowed is not None else k
+        indices = np.asarray(self.neighbors[row, :stored], dtype=np.int64)
+        distances = np.asarray(self.distances[row, :stored], dtype=np.float64)
+        found = indices >= 0
+        if allowed is not None:
+            complete = not found.all()  # padded: the list already covers the whole catalog
+            found &= allowed[np.maximum(indices, 0)]
+            if np.count_nonzero(found) < k and not complete:
+                return None
+        return distances[found][:k], indices[found][:k]
+
+
+def main(argv=None):
+    import joblib
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Precompute the neighbor table for every catalog row.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build")
+    build_parser.add_argument("--preprocessor", required=True)
+    build_parser.add_argument("--nn-model", required=True, help="Pickled NearestNeighbors fitted on the lookup rows.")
+    build_parser.add_argument("--lookup", required=True, help="X_train_original_for_knn_lookup_*.csv")
+    build_parser.add_argument("--device-type", choices=["laptop", "desktop"], required=True,
+                              help="Selects the request features that identify a product.")
+    build_parser.add_argument("--out", required=True)
+    build_parser.add_argument("--k", type=int, default=DEFAULT_K)
+    build_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    build_parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    args = parser.parse_args(argv)
+
+    # The feature lists live in main.py; importing it must not start the model warm-up.
+    os.environ["WARMUP_ON_START"] = "false"
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main as knn_main
+    key_columns = (knn_main.DESKTOP_PREPROCESSOR_INPUT_FEATURES if args.device_type == "desktop"
+                   else knn_main.LAPTOP_PREPROCESSOR_INPUT_FEATURES)
+
+    table = build_neighbor_table(pd.read_csv(args.lookup), joblib.load(args.preprocessor), args.nn_model, args.out, key_columns,
+                                 k=args.k, chunk_size=args.chunk_size, workers=args.workers)
+    print(f"Precomputed {table.k} neighbors for {len(table)} rows at {args.out}.")
+
+
+if __name__ == "__main__":
+    main()
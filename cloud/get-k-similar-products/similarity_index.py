@@ -0,0 +1,407 @@
+# cloud/get-k-similar-products/similarity_index.py
+"""
+Persisted similarity index over the preprocessed kNN vectors.
+
+The index is an inverted-file (IVF) layout: vectors are clustered offline around
+`n_lists` centroids and stored contiguously per cluster as float32. A query only
+scans the `n_probe` clusters whose centroids are closest, so lookup cost grows with
+roughly sqrt(catalog size) instead of linearly. Every array is a plain .npy file,
+which lets the serving side memory-map the index instead of unpickling it.
+
+Searches can be restricted to a subset of the catalog (a boolean mask over lookup rows,
+see serving_common/row_filters.py). The mask is applied inside the list scan, with the
+probe widened by the filter's selectivity; when the subset is smaller than what that
+probe would scan, the allowed vectors are scanned exactly instead.
+
+The service scans every list (an exact search) for catalogs below its
+KNN_EXACT_SEARCH_MAX_ITEMS and uses the probe only for larger ones; see main.py for the
+measured recall per n_probe. Scans rank the stored vectors with the float32 expansion
+|v|^2 - 2 v.q + |q|^2, which cancels badly for near-identical vectors; the distances of the
+candidates it selects are recomputed exactly in float64, so identical configurations come
+back at 0.0 like NearestNeighbors, and ties are ordered by id, so results do not depend on
+the list layout.
+
+Products added after the build go into a small "delta" segment (assigned to their
+nearest centroid, never re-clustered) so the catalog can grow without a rebuild;
+`build` can be re-run at any time to fold the delta back into the main lists.
+
+Offline usage:
+    python similarity_index.py build --preprocessor preprocessor_laptop_knn.joblib \
+        --lookup X_train_original_for_knn_lookup_laptop.csv --out knn_index_laptop
+    python similarity_index.py append --index knn_index_laptop \
+        --preprocessor preprocessor_laptop_knn.joblib \
+        --lookup knn_lookup_laptop --rows new_products.csv
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+_CLOUD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _CLOUD_DIR not in sys.path:
+    sys.path.append(_CLOUD_DIR)
+from serving_common.processor_family import fill_procesador_tipo
+
+INDEX_FORMAT_VERSION = 1
+DEFAULT_N_PROBE = 8
+
+# Files making up an index directory. Each file is replaced atomically and meta.json is
+# written last, so an index built into a new directory is complete once meta.json exists.
+# A rebuild or append in place replaces the arrays before meta.json: a process loading
+# the directory meanwhile can pair new arrays with the old meta.json. Publish to a fresh
+# directory instead of rewriting one that is being served.
+INDEX_FILES = [
+    "centroids.npy", "vectors.npy", "norms.npy", "ids.npy", "list_offsets.npy",
+    "delta_vectors.npy", "delta_norms.npy", "delta_ids.npy", "delta_lists.npy",
+    "meta.json",
+]
+
+
+def _save_npy_atomic(path, array):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _save_json_atomic(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def to_dense_float32(matrix):
+    """Preprocessor output (dense or scipy sparse) as a C-contiguous float32 array."""
+    if hasattr(matrix, "toarray"):
+        matrix = matrix.toarray()
+    return np.ascontiguousarray(matrix, dtype=np.float32)
+
+
+def _kmeans(vectors, n_lists, seed=42, n_iter=25):
+    """Plain Lloyd's k-means; only used offline while building the index."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _nearest_centroid(vectors, centroids)
+        for list_id in range(n_lists):
+            members = vectors[assignments == list_id]
+            if len(members):
+                centroids[list_id] = members.mean(axis=0)
+            else:
+                # Re-seed empty clusters so every list stays usable.
+                centroids[list_id] = vectors[rng.integers(len(vectors))]
+    return centroids
+
+
+def _nearest_centroid(vectors, centroids):
+    distances = (
+        np.einsum("ij,ij->i", centroids, centroids)[None, :]
+        - 2.0 * vectors @ centroids.T
+    )
+    return np.argmin(distances, axis=1)
+
+
+def build_index(vectors, out_dir, ids=None, n_lists=None, seed=42):
+    """
+    Builds an index over `vectors` (n_items x dim) and writes it to `out_dir`.
+    `ids` are the row positions in the lookup table (defaults to 0..n-1).
+    """
+    vectors = to_dense_float32(vectors)
+    n_items = len(vectors)
+    if n_items == 0:
+        raise ValueError("Cannot build a similarity index over zero vectors.")
+    ids = np.arange(n_items, dtype=np.int32) if ids is None else np.asarray(ids, dtype=np.int32)
+    if n_lists is None:
+        n_lists = max(1, int(np.sqrt(n_items)))
+    n_lists = min(n_lists, n_items)
+
+    centroids = _kmeans(vectors, n_lists, seed=seed)
+    assignments = _nearest_centroid(vectors, centroids)
+    order = np.argsort(assignments, kind="stable")
+    counts = np.bincount(assignments, minlength=n_lists)
+    list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    sorted_vectors = vectors[order]
+    dim = vectors.shape[1]
+    os.makedirs(out_dir, exist_ok=True)
+    _save_npy_atomic(os.path.join(out_dir, "centroids.npy"), centroids.astype(np.float32))
+    _save_npy_atomic(os.path.join(out_dir, "vectors.npy"), sorted_vectors)
+    _save_npy_atomic(os.path.join(out_dir, "norms.npy"), np.einsum("ij,ij->i", sorted_vectors, sorted_vectors))
+    _save_npy_atomic(os.path.join(out_dir, "ids.npy"), ids[order])
+    _save_npy_atomic(os.path.join(out_dir, "list_offsets.npy"), list_offsets)
+    _save_npy_atomic(os.path.join(out_dir, "delta_vectors.npy"), np.zeros((0, dim), dtype=np.float32))
+    _save_npy_atomic(os.path.join(out_dir, "delta_norms.npy"), np.zeros(0, dtype=np.float32))
+    _save_npy_atomic(os.path.join(out_dir, "delta_ids.npy"), np.zeros(0, dtype=np.int32))
+    _save_npy_atomic(os.path.join(out_dir, "delta_lists.npy"), np.zeros(0, dtype=np.int32))
+    _save_json_atomic(os.path.join(out_dir, "meta.json"), {
+        "format_version": INDEX_FORMAT_VERSION,
+        "metric": "euclidean",
+        "dim": int(dim),
+        "n_lists": int(n_lists),
+        "n_base": int(n_items),
+        "n_delta": 0,
+        "default_n_probe": int(min(DEFAULT_N_PROBE, n_lists)),
+    })
+    return SimilarityIndex.load(out_dir)
+
+
+class SimilarityIndex:
+    """Memory-mapped IVF index answering euclidean top-k queries."""
+
+    def __init__(self, index_dir, meta, arrays):
+        self.index_dir = index_dir
+        self.meta = meta
+        self.centroids = arrays["centroids"]
+        self.vectors = arrays["vectors"]
+        self.norms = arrays["norms"]
+        self.ids = arrays["ids"]
+        self.list_offsets = arrays["list_offsets"]
+        self.delta_vectors = arrays["delta_vectors"]
+        self.delta_norms = arrays["delta_norms"]
+        self.delta_ids = arrays["delta_ids"]
+        self.delta_lists = arrays["delta_lists"]
+        self._centroid_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self._max_norm = float(max(np.max(self.norms, initial=0.0), np.max(self.delta_norms, initial=0.0)))
+        self._positions = None
+
+    @classmethod
+    def load(cls, index_dir, mmap=True):
+        """Opens an index directory; the large arrays are memory-mapped when mmap=True."""
+        with open(os.path.join(index_dir, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("format_version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported similarity index format: {meta.get('format_version')}")
+        mmap_mode = "r" if mmap else None
+        arrays = {}
+        for file_name in INDEX_FILES:
+            if file_name.endswith(".npy"):
+                arrays[file_name[:-4]] = np.load(os.path.join(index_dir, file_name), mmap_mode=mmap_mode)
+        return cls(index_dir, meta, arrays)
+
+    def __len__(self):
+        return len(self.ids) + len(self.delta_ids)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def search(self, queries, k, n_probe=None, allowed=None):
+        """
+        Returns (distances, ids), both shaped (n_queries, k), sorted by distance (equal
+        distances by id). Slots beyond the number of indexed (or allowed) items are padded
+        with inf / -1. `allowed` is an optional boolean mask over lookup rows; only those ids
+        are returned. Raises ValueError for non-finite queries, like NearestNeighbors.
+        """
+        queries = to_dense_float32(queries)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        if not np.isfinite(queries).all():
+            raise ValueError("Query vectors contain NaN or infinite values.")
+        if n_probe is None:
+            n_probe = self.meta.get("default_n_probe", DEFAULT_N_PROBE)
+        n_probe = max(1, min(int(n_probe), self.n_lists))
+
+        all_distances = np.full((len(queries), k), np.inf, dtype=np.float64)
+        all_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        if allowed is not None:
+            allowed = np.asarray(allowed, dtype=bool)
+            n_allowed = int(np.count_nonzero(allowed))
+            # Probe proportionally more lists so about as many allowed items are scanned as an
+            # unfiltered search scans; a subset smaller than that is cheaper to scan exactly.
+            n_probe = min(self.n_lists, int(np.ceil(n_probe * len(self) / max(n_allowed, 1))))
+            if n_allowed <= len(self) * n_probe / self.n_lists:
+                return self._search_subset(queries, k, np.flatnonzero(allowed), all_distances, all_ids)
+        centroid_distances = (
+            self._centroid_norms[None, :] - 2.0 * queries @ self.centroids.T
+        )
+        list_order = np.argsort(centroid_distances, axis=1)
+
+        for row, query in enumerate(queries):
+            probe = n_probe
+            while True:
+                distances, ids, positions = self._scan_lists(query, list_order[row, :probe])
+                if allowed is not None:
+                    keep = allowed[ids]
+                    distances, ids, positions = distances[keep], ids[keep], positions[keep]
+                # Widen the probe if the nearest lists hold fewer than k items.
+                if len(ids) >= k or probe >= self.n_lists:
+                    break
+                probe = min(self.n_lists, probe * 2)
+            top = min(k, len(ids))
+            if top == 0:
+                continue
+            all_distances[row, :top], all_ids[row, :top] = self._exact_top_k(query, distances, ids, positions, top)
+        return all_distances, all_ids
+
+    def _vectors_at(self, positions):
+        """Stored vectors at positions of the concatenated (base, delta) storage."""
+        n_base = len(self.ids)
+        in_base = positions < n_base
+        vectors = np.empty((len(positions), self.vectors.shape[1]), dtype=np.float64)
+        vectors[in_base] = self.vectors[positions[in_base]]
+        vectors[~in_base] = self.delta_vectors[positions[~in_base] - n_base]
+        return vectors
+
+    def _exact_top_k(self, query, distances, ids, positions, top):
+        """
+        (distances, ids) of the `top` nearest scanned items, ordered by (distance, id).
+        `distances` are the squared float32-expansion distances of the scan; they only
+        preselect the candidates (with a margin for their rounding error), whose distances
+        are then recomputed exactly in float64. Equal vectors (identical configurations)
+        tie exactly; ordering them by id makes the result independent of the storage
+        order, so every probe width agrees on them.
+        """
+        if len(ids) > top:
+            kth = np.partition(distances, top - 1)[top - 1]
+            margin = 1e-4 * (self._max_norm + float(query @ query))
+            candidates = np.flatnonzero(distances <= kth + margin)
+        else:
+            candidates = np.arange(len(ids))
+        exact = np.linalg.norm(self._vectors_at(positions[candidates]) - query.astype(np.float64), axis=1)
+        best = np.lexsort((ids[candidates], exact))[:top]
+        return exact[best], ids[candidates[best]]
+
+    def _id_positions(self):
+        """Position of every id in the concatenated (base, delta) storage, -1 if not indexed."""
+        if self._positions is None:
+            all_ids = np.concatenate([self.ids, self.delta_ids]).astype(np.int64)
+            positions = np.full(int(all_ids.max()) + 1 if len(all_ids) else 0, -1, dtype=np.int64)
+            positions[all_ids] = np.arange(len(all_ids))
+            self._positions = positions
+        return self._positions
+
+    def _search_subset(self, queries, k, allowed_ids, all_distances, all_ids):
+        """Exact top-k over the given ids only."""
+        positions = self._id_positions()
+        allowed_ids = allowed_ids[allowed_ids < len(positions)]
+        positions = positions[allowed_ids]
+        positions = positions[positions >= 0]
+        n_base = len(self.ids)
+        base, delta = positions[positions < n_base], positions[positions >= n_base] - n_base
+        positions = np.concatenate([base, delta + n_base])
+        vectors = np.concatenate([self.vectors[base], self.delta_vectors[delta]])
+        norms = np.concatenate([self.norms[base], self.delta_norms[delta]])
+        ids = np.concatenate([self.ids[base], self.delta_ids[delta]]).astype(np.int64)
+        top = min(k, len(ids))
+        if top == 0:
+            return all_distances, all_ids
+        distances = norms[None, :] - 2.0 * (queries @ vectors.T) + np.einsum("ij,ij->i", queries, queries)[:, None]
+        for row, (query, query_distances) in enumerate(zip(queries, distances)):
+            all_distances[row, :top], all_ids[row, :top] = self._exact_top_k(query, query_distances, ids, positions, top)
+        return all_distances, all_ids
+
+    def _scan_lists(self, query, list_ids):
+        """
+        Squared (float32-expansion) distances, ids and storage positions (see _vectors_at)
+        of every item stored in the given lists.
+        """
+        query_norm = float(query @ query)
+        if len(list_ids) == self.n_lists:
+            base_slices = [slice(0, len(self.ids))]
+        else:
+            base_slices = [slice(self.list_offsets[i], self.list_offsets[i + 1]) for i in np.sort(list_ids)]
+        distance_parts, id_parts, position_parts = [], [], []
+        for sl in base_slices:
+            if sl.stop > sl.start:
+                distance_parts.append(self.norms[sl] - 2.0 * (self.vectors[sl] @ query) + query_norm)
+                id_parts.append(self.ids[sl])
+                position_parts.append(np.arange(sl.start, sl.stop))
+        if len(self.delta_ids):
+            delta_mask = np.isin(self.delta_lists, list_ids)
+            if delta_mask.any():
+                delta_vectors = self.delta_vectors[delta_mask]
+                distance_parts.append(self.delta_norms[delta_mask] - 2.0 * (delta_vectors @ query) + query_norm)
+                id_parts.append(self.delta_ids[delta_mask])
+                position_parts.append(len(self.ids) + np.flatnonzero(delta_mask))
+        if not id_parts:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return (np.concatenate(distance_parts), np.concatenate(id_parts).astype(np.int64),
+                np.concatenate(position_parts).astype(np.int64))
+
+
+def append_to_index(index_dir, vectors, ids):
+    """
+    Adds vectors to the delta segment of an existing index without re-clustering.
+    Returns the reloaded index.
+    """
+    index = SimilarityIndex.load(index_dir, mmap=False)
+    vectors = to_dense_float32(vectors)
+    ids = np.asarray(ids, dtype=np.int32)
+    if vectors.shape[1] != index.meta["dim"]:
+        raise ValueError(f"Vector dimension {vectors.shape[1]} does not match index dimension {index.meta['dim']}.")
+    if len(vectors) != len(ids):
+        raise ValueError("vectors and ids must have the same length.")
+
+    lists = _nearest_centroid(vectors, index.centroids).astype(np.int32)
+    _save_npy_atomic(os.path.join(index_dir, "delta_vectors.npy"), np.concatenate([index.delta_vectors, vectors]))
+    _save_npy_atomic(os.path.join(index_dir, "delta_norms.npy"),
+                     np.concatenate([index.delta_norms, np.einsum("ij,ij->i", vectors, vectors)]))
+    _save_npy_atomic(os.path.join(index_dir, "delta_ids.npy"), np.concatenate([index.delta_ids, ids]))
+    _save_npy_atomic(os.path.join(index_dir, "delta_lists.npy"), np.concatenate([index.delta_lists, lists]))
+    meta = dict(index.meta)
+    meta["n_delta"] = int(len(index.delta_ids) + len(ids))
+    _save_json_atomic(os.path.join(index_dir, "meta.json"), meta)
+    return SimilarityIndex.load(index_dir)
+
+
+def transform_rows(preprocessor, df):
+    input_features = list(preprocessor.feature_names_in_)
+    for col in input_features:
+        if col not in df.columns:
+            df[col] = np.nan
+    return to_dense_float32(preprocessor.transform(df[input_features]))
+
+
+def main(argv=None):
+    import joblib
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Build or extend the kNN similarity index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build an index from the full lookup table.")
+    build_parser.add_argument("--preprocessor", required=True)
+    build_parser.add_argument("--lookup", required=True, help="X_train_original_for_knn_lookup_*.csv")
+    build_parser.add_argument("--out", required=True)
+    build_parser.add_argument("--n-lists", type=int, default=None)
+
+    append_parser = subparsers.add_parser("append", help="Append new products to an existing index.")
+    append_parser.add_argument("--index", required=True)
+    append_parser.add_argument("--preprocessor", required=True)
+    append_parser.add_argument("--lookup", required=True,
+                               help="Lookup table the new rows are appended to: a CSV or a lookup_table.py directory.")
+    append_parser.add_argument("--rows", required=True, help="CSV with the new products.")
+
+    args = parser.parse_args(argv)
+    preprocessor = joblib.load(args.preprocessor)
+
+    if args.command == "build":
+        df_lookup = fill_procesador_tipo(pd.read_csv(args.lookup))
+        index = build_index(transform_rows(preprocessor, df_lookup), args.out, n_lists=args.n_lists)
+        print(f"Built index with {len(index)} items in {index.n_lists} lists at {args.out}.")
+    else:
+        # New products come straight from the scraper; derive procesador_tipo the same way
+        # the service does at query time.
+        df_new = fill_procesador_tipo(pd.read_csv(args.rows))
+        if os.path.isdir(args.lookup):
+            from lookup_table import ColumnarLookupTable
+            lookup_table = ColumnarLookupTable.load(args.lookup)
+            first_id = len(lookup_table)
+        else:
+            df_lookup = pd.read_csv(args.lookup)
+            first_id = len(df_lookup)
+        index = append_to_index(args.index, transform_rows(preprocessor, df_new.copy()),
+                                np.arange(first_id, first_id + len(df_new)))
+        # Keep the lookup table aligned with the ids stored in the index.
+        if os.path.isdir(args.lookup):
+            lookup_table.append_rows(df_new)
+        else:
+            df_new.reindex(columns=df_lookup.columns).to_csv(args.lookup, mode="a", header=False, index=False)
+        print(f"Appended {len(df_new)} items; index now holds {len(index)} items.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+# cloud/get-price-prediction/compiled_model.py
+"""
+Numpy-only runtime for the price pipelines.
+
+Scoring one row with the pickled sklearn Pipeline means importing pandas, scikit-learn and
+LightGBM and unpickling the whole pipeline, which dominates cold-start time and memory.
+`export` flattens a fitted pipeline (ColumnTransformer of SimpleImputer / StandardScaler /
+OneHotEncoder branches followed by an LGBMRegressor) into one .npz file:
+  - spec            JSON: input columns and, per ColumnTransformer branch, the imputation
+                    values, scaler statistics or one-hot categories
+  - tree arrays     every tree's nodes in flat arrays (split feature, threshold, children,
+                    default direction, missing type, leaf value) plus each tree's root
+  - feature_names_out / feature_importances, for the aggregated importances in responses
+
+CompiledPipeline.load reads it with numpy alone. `transform` builds the model matrix
+straight from feature_values dicts and `predict` walks all trees for all rows at once,
+one vectorized step per tree level. Leaves point to themselves, so rows that reach a leaf
+early just stay there.
+
+Offline usage:
+    python compiled_model.py export --pipeline laptop_model_pipeline.joblib --out laptop_model_compiled.npz
+    python compiled_model.py check --pipeline laptop_model_pipeline.joblib --compiled laptop_model_compiled.npz
+`check` scores random rows (known and unknown categories, missing values) with both and
+exits with status 1 if any raw prediction differs by more than --atol.
+cloud/tests/test_compiled_model.py runs the same comparison for the committed pipelines.
+"""
+import argparse
+import json
+import math
+import sys
+
+import numpy as np
+
+COMPILED_FORMAT_VERSION = 1
+
+# LightGBM missing value handling per split (dump_model "missing_type").
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+_MISSING_TYPES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+_ZERO_THRESHOLD = 1e-35  # LightGBM's kZeroThreshold
+
+_TREE_ARRAYS = ["split_feature", "threshold", "left_child", "right_child", "default_left", "missing_type",
+                "leaf_value", "roots"]
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+# --- Export (needs the pickled pipeline, i.e. scikit-learn and LightGBM) ---
+
+def _branch_spec(name, transformer, columns):
+    if transformer == "drop":
+        return None
+    if transformer == "passthrough":
+        return {"name": name, "kind": "passthrough", "columns": list(columns)}
+    steps = [step for _, step in getattr(transformer, "steps", [(name, transformer)])]
+    impute, mean, scale, categories = None, None, None, None
+    for step in steps:
+        step_type = type(step).__name__
+        if step_type == "SimpleImputer":
+            if not (isinstance(step.missing_values, float) and math.isnan(step.missing_values)):
+                raise ValueError(f"{name}: only SimpleImputer(missing_values=np.nan) is supported.")
+            impute = [value.item() if hasattr(value, "item") else value for value in step.statistics_]
+        elif step_type == "StandardScaler":
+            mean = step.mean_.tolist() if step.with_mean else [0.0] * len(columns)
+            scale = step.scale_.tolist() if step.with_std else [1.0] * len(columns)
+        elif step_type == "OneHotEncoder":
+            if step.drop is not None or getattr(step, "infrequent_categories_", None) is not None:
+                raise ValueError(f"{name}: OneHotEncoder with drop / infrequent categories is not supported.")
+            if step.handle_unknown != "ignore":
+                raise ValueError(f"{name}: only OneHotEncoder(handle_unknown='ignore') is supported.")
+            categories = [[value.item() if hasattr(value, "item") else value for value in column_categories]
+                          for column_categories in step.categories_]
+        else:
+            raise ValueError(f"{name}: unsupported step {step_type}.")
+    if categories is not None:
+        if mean is not None:
+            raise ValueError(f"{name}: scaling one-hot columns is not supported.")
+        return {"name": name, "kind": "onehot", "columns": list(columns), "impute": impute, "categories": categories}
+    return {"name": name, "kind": "numeric", "columns": list(columns), "impute": impute, "mean": mean, "scale": scale}
+
+
+def _flatten_trees(booster):
+    """All trees of a LightGBM booster as flat node arrays; leaves point to themselves."""
+    arrays = {name: [] for name in _TREE_ARRAYS}
+
+    def add_node(node):
+        position = len(arrays["split_feature"])
+        for name in _TREE_ARRAYS[:-1]:
+            arrays[name].append(0)
+        if "split_index" not in node:
+            arrays["split_feature"][position] = -1
+            arrays["left_child"][position] = arrays["right_child"][position] = position
+            arrays["leaf_value"][position] = node["leaf_value"]
+            arrays["threshold"][position] = 0.0
+            return position
+        if node["decision_type"] != "<=":
+            raise ValueError(f"Unsupported LightGBM decision type {node['decision_type']!r} (categorical split).")
+        arrays["split_feature"][position] = node["split_feature"]
+        arrays["threshold"][position] = node["threshold"]
+        arrays["default_left"][position] = bool(node["default_left"])
+        arrays["missing_type"][position] = _MISSING_TYPES[node["missing_type"]]
+        arrays["leaf_value"][position] = 0.0
+        arrays["left_child"][position] = add_node(node["left_child"])
+        arrays["right_child"][position] = add_node(node["right_child"])
+        return position
+
+    model = booster.dump_model()
+    if model.get("objective", "").split(" ")[0] not in ("regression", "regression_l1", "huber", "fair", "quantile"):
+        raise ValueError(f"Unsupported LightGBM objective {model.get('objective')!r}; only identity-link regression.")
+    for tree in model["tree_info"]:
+        arrays["roots"].append(add_node(tree["tree_structure"]))
+    dtypes = {"split_feature": np.int32, "threshold": np.float64, "left_child": np.int32, "right_child": np.int32,
+              "default_left": bool, "missing_type": np.int8, "leaf_value": np.float64, "roots": np.int32}
+    return {name: np.asarray(values, dtype=dtypes[name]) for name, values in arrays.items()}
+
+
+def export_pipeline(pipeline, out_path):
+    """Writes the numpy-only form of a fitted preprocessor + LGBMRegressor pipeline to out_path (.npz)."""
+    preprocessor = pipeline.named_steps["preprocessor"]
+    regressor = pipeline.named_steps["regressor"]
+    branches = [_branch_spec(name, transformer, columns) for name, transformer, columns in preprocessor.transformers_]
+    branches = [branch for branch in branches if branch is not None]
+    trees = _flatten_trees(regressor.booster_)
+    feature_names_out = [str(name) for name in preprocessor.get_feature_names_out()]
+    n_features = sum(len(branch["columns"]) if branch["kind"] != "onehot" else sum(map(len, branch["categories"]))
+                     for branch in branches)
+    if n_features != regressor.booster_.num_feature() or n_features != len(feature_names_out):
+        raise ValueError(f"Encoded width {n_features} does not match the model's {regressor.booster_.num_feature()} features.")
+    spec = {
+        "format_version": COMPILED_FORMAT_VERSION,
+        "input_columns": [str(column) for column in pipeline.feature_names_in_],
+        "branches": branches,
+        "n_features": n_features,
+    }
+    with open(out_path, "wb") as f:
+        np.savez(f, spec=np.array(json.dumps(spec, ensure_ascii=False)),
+                 feature_names_out=np.array(feature_names_out),
+                 feature_importances=np.asarray(regressor.feature_importances_, dtype=np.float64),
+                 **trees)
+    return CompiledPipeline.load(out_path)
+
+
+# --- Runtime (numpy only) ---
+
+class CompiledPipeline:
+    """Scores feature_values dicts with an exported pipeline."""
+
+    def __init__(self, spec, arrays):
+        if spec.get("format_version") != COMPILED_FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled model format: {spec.get('format_version')}")
+        self.spec = spec
+        self.input_columns = spec["input_columns"]
+        self.n_features = spec["n_features"]
+        self.feature_names_out = arrays["feature_names_out"].tolist()
+        self.feature_importances = arrays["feature_importances"]
+        for name in _TREE_ARRAYS:
+            setattr(self, name, arrays[name])
+        self._has_missing_rules = bool(np.any(self.missing_type != MISSING_NONE))
+        # _children[2 * node + went_left]: one gather picks the next node.
+        self._children = np.stack([self.right_child, self.left_child], axis=1).ravel()
+        self.depth = self._max_depth()
+        self._plan = []
+        offset = 0
+        for branch in spec["branches"]:
+            if branch["kind"] == "onehot":
+                positions = []
+                for categories in branch["categories"]:
+                    positions.append({category: offset + i for i, category in enumerate(categories)})
+                    offset += len(categories)
+                self._plan.append((branch, positions))
+            else:
+                self._plan.append((branch, offset))
+                offset += len(branch["columns"])
+
+    def _max_depth(self):
+        frontier, depth = self.roots, 0
+        while True:
+            frontier = frontier[self.split_feature[frontier] >= 0]
+            if not len(frontier):
+                return depth
+            frontier = np.concatenate([self.left_child[frontier], self.right_child[frontier]])
+            depth += 1
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        return cls(json.loads(str(arrays.pop("spec"))), arrays)
+
+    @property
+    def numeric_columns(self):
+        return [column for branch in self.spec["branches"] if branch["kind"] == "numeric" for column in branch["columns"]]
+
+    def transform(self, rows):
+        """Model matrix (n_rows x n_features, float64) for a list of feature_values dicts."""
+        X = np.zeros((len(rows), self.n_features), dtype=np.float64)
+        for branch, layout in self._plan:
+            columns = branch["columns"]
+            impute = branch.get("impute")
+            if branch["kind"] == "onehot":
+                for j, (column, positions) in enumerate(zip(columns, layout)):
+                    for i, row in enumerate(rows):
+                        value = row.get(column)
+                        if impute is not None and _is_missing(value):
+                            value = impute[j]
+                        position = positions.get(value) if not _is_missing(value) else None
+                        if position is not None:  # unknown categories encode as all zeros
+                            X[i, position] = 1.0
+                continue
+            block = np.array([[row.get(column, np.nan) for column in columns] for row in rows], dtype=np.float64)
+            if branch["kind"] == "numeric":
+                if impute is not None:
+                    block = np.where(np.isnan(block), np.asarray(impute, dtype=np.float64), block)
+                if branch.get("mean") is not None:
+                    block = (block - np.asarray(branch["mean"])) / np.asarray(branch["scale"])
+            X[:, layout:layout + len(columns)] = block
+        return X
+
+    def predict_matrix(self, X):
+        """Raw model output for an already transformed matrix."""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        n_rows = len(X)
+        nodes = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+        # Flat gathers are much cheaper than 2-D fancy indexing; leaves (feature -1) read
+        # an arbitrary cell and point back to themselves either way.
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_rows) * X.shape[1])[:, None]
+        for _ in range(self.depth):
+            values = flat_X[row_offsets + self.split_feature[nodes]]
+            thresholds = self.threshold[nodes]
+            go_left = values <= thresholds
+            if self._has_missing_rules or np.isnan(values).any():
+                missing_type = self.missing_type[nodes]
+                nan = np.isnan(values)
+                # Like LightGBM: NaN counts as 0 unless the split routes NaNs explicitly.
+                go_left = np.where(nan & (missing_type != MISSING_NAN), 0.0 <= thresholds, go_left)
+                missing = ((missing_type == MISSING_NAN) & nan) | (
+                    (missing_type == MISSING_ZERO) & (nan | (np.abs(values) <= _ZERO_THRESHOLD)))
+                go_left = np.where(missing, self.default_left[nodes], go_left)
+            nodes = self._children[2 * nodes + go_left]
+        return self.leaf_value[nodes].sum(axis=1)
+
+    def predict(self, rows):
+        """Raw model output (the regressor's scale) for a list of feature_values dicts."""
+        return self.predict_matrix(self.transform(rows))
+
+
+def _random_rows(model, n_rows, seed):
+    """Rows mixing known and unknown categories, unparsed numbers and missing values."""
+    rng = np.random.default_rng(seed)
+    rows = [{} for _ in range(n_rows)]
+    for branch in model.spec["branches"]:
+        for j, column in enumerate(branch["columns"]):
+            if branch["kind"] == "onehot":
+                categories = branch["categories"][j]
+                for row in rows:
+                    draw = rng.random()
+                    row[column] = (None if draw < 0.05 else "unseen-category" if draw < 0.1
+                                   else categories[rng.integers(len(categories))])
+            else:
+                center = branch["impute"][j] if branch.get("impute") else 1.0
+                for row in rows:
+                    draw = rng.random()
+                    value = float(center) * float(rng.lognormal(0.0, 0.7))
+                    row[column] = None if draw < 0.05 else str(value) if draw < 0.1 else value
+    return rows
+
+
+def main(argv=None):
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Export a price pipeline to the numpy-only runtime, or check parity.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("--pipeline", required=True)
+    export_parser.add_argument("--out", required=True)
+    check_parser = subparsers.add_parser("check")
+    check_parser.add_argument("--pipeline", required=True)
+    check_parser.add_argument("--compiled", required=True)
+    check_parser.add_argument("--rows", type=int, default=2000)
+    check_parser.add_argument("--seed", type=int, default=0)
+    check_parser.add_argument("--atol", type=float, default=1e-9, help="Allowed difference of raw predictions.")
+    args = parser.parse_args(argv)
+
+    pipeline = joblib.load(args.pipeline)
+    if args.command == "export":
+        model = export_pipeline(pipeline, args.out)
+        print(f"Exported {len(model.roots)} trees over {model.n_features} features to {args.out}.")
+        return 0
+
+    import os
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from serving_common.request_decoder import RequestDecoder
+
+    model = CompiledPipeline.load(args.compiled)
+    rows = _random_rows(model, args.rows, args.seed)
+    # The service feeds the pipeline through RequestDecoder, so the reference does too.
+    decoder = RequestDecoder.from_pipeline(pipeline, model.input_columns)
+    expected = pipeline.predict(decoder.decode_many(rows))
+    actual = model.predict(rows)
+    max_diff = float(np.max(np.abs(expected - actual)))
+    print(f"{len(rows)} rows: max |raw difference| = {max_diff:.3g} (atol {args.atol:g})")
+    return 0 if max_diff <= args.atol else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
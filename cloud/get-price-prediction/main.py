@@ -1,11 +1,25 @@
 import functions_framework
-import pandas as pd
-import numpy as np
-import joblib
+import math
 import os # To construct file paths for models
-import json # For pretty printing dictionaries
-from google.cloud import storage # Added
-import io # Added
+import sys
+# numpy, joblib and compiled_model are imported where the model is loaded or scored:
+# CORS preflights and rejected requests never pay for them (per-phase costs:
+# benchmarks/startup_report.py).
+
+# Shared serving code lives in cloud/serving_common. Deployments copy that package next to
+# main.py; local runs import it from the parent directory.
+_CLOUD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _CLOUD_DIR not in sys.path:
+    sys.path.append(_CLOUD_DIR)
+from serving_common.artifact_cache import make_artifact_cache
+from serving_common.metrics import MODEL_LOAD_SECONDS, MODEL_WAIT_SECONDS, STAGE_SECONDS, instrument_handler
+from serving_common.micro_batching import MICRO_BATCH_ENABLED, MicroBatcher
+from serving_common.model_registry import REGISTRY, Versioned
+from serving_common.request_decoder import RequestDecoder
+from serving_common.response_cache import RESPONSE_CACHE, response_cache_key
+from serving_common.structured_logging import LazyJSON, begin_request, get_logger, log_fields
+
+logger = get_logger("price")
 
 # Define the expected features for each device type
 # These must match the features the corresponding model was trained on.
@@ -26,122 +40,337 @@ LAPTOP_FEATURES = [
 # Assumption: Models were trained with log-transformed target. This should be consistent.
 MODEL_TRAINED_ON_LOG_TARGET = True
 
+# Upper bound on the number of configurations accepted in one batch request.
+MAX_BATCH_SIZE = 1000
+
 # --- GCS Configuration & Model Caching ---
 GCS_BUCKET_NAME = "df_engineered"  # Replace with your actual bucket name
 
+# Blob locations per device type. The loaded model and its precomputed feature
+# importances live in the shared model registry (serving_common.model_registry) under
+# "price/<device_type>". "compiled_blob" is the numpy-only export of the pipeline
+# (compiled_model.py); PRICE_MODEL_FORMAT picks which one is served:
+#   auto (default)  the compiled model when it is published, else the joblib pipeline
+#   compiled        only the compiled model
+#   pipeline        only the joblib pipeline
 MODEL_CACHE = {
     "desktop": {
         "model_blob": "models/price_prediction/desktop/desktop_model_pipeline.joblib", # Adjusted path
-        "pipeline": None,
-        "loaded": False
+        "compiled_blob": "models/price_prediction/desktop/desktop_model_compiled.npz",
     },
     "laptop": {
         "model_blob": "models/price_prediction/laptop/laptop_model_pipeline.joblib", # Adjusted path
-        "pipeline": None,
-        "loaded": False
+        "compiled_blob": "models/price_prediction/laptop/laptop_model_compiled.npz",
     }
 }
-storage_client = None
+PRICE_MODEL_FORMAT = os.environ.get("PRICE_MODEL_FORMAT", "auto").lower()
+# Models are downloaded into a persistent local cache (serving_common.artifact_cache), so a
+# restarted instance only revalidates blob metadata instead of downloading them again.
+ARTIFACTS = make_artifact_cache(GCS_BUCKET_NAME)
 
-def load_from_gcs_joblib(bucket_name, blob_name):
-    """Loads a joblib file from GCS."""
-    global storage_client
-    if storage_client is None:
-        storage_client = storage.Client()
-    
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(blob_name)
-    
-    if not blob.exists():
-        print(f"Error: Blob {blob_name} not found in bucket {bucket_name}")
-        raise FileNotFoundError(f"Blob {blob_name} not found in bucket {bucket_name}")
+# Models for all device types are downloaded in parallel background threads. With
+# WARMUP_ON_START this begins at import time; the registry makes sure each model is
+# loaded once, and requests wait for whatever is still in flight.
+WARMUP_ON_START = os.environ.get("WARMUP_ON_START", "true").lower() in ("1", "true", "yes")
+MODEL_LOAD_TIMEOUT_SECONDS = float(os.environ.get("MODEL_LOAD_TIMEOUT_SECONDS", "120"))
 
-    print(f"Attempting to download and load joblib: gs://{bucket_name}/{blob_name}")
+def load_joblib_artifact(blob_name):
+    """Loads a joblib file through the local artifact cache. Returns (object, fingerprint)."""
+    logger.debug("Fetching joblib %s", blob_name)
     try:
-        with blob.open("rb") as f:
-            model = joblib.load(f)
-        print(f"Successfully loaded joblib from gs://{bucket_name}/{blob_name}")
-        return model
+        local_path, fingerprint = ARTIFACTS.fetch(blob_name)
+    except FileNotFoundError as e:
+        logger.error("Artifact not found: %s", e)
+        raise
+    try:
+        import joblib
+        model = joblib.load(local_path)
+        logger.info("Loaded joblib %s (version %s)", blob_name, fingerprint)
+        return model, fingerprint
     except Exception as e:
-        print(f"Error loading joblib from GCS (gs://{bucket_name}/{blob_name}): {e}")
+        logger.error("Error loading joblib %s from %s: %s", blob_name, local_path, e)
         raise
 
+def load_compiled_artifact(blob_name):
+    """Loads a compiled model through the local artifact cache. Returns (CompiledPipeline, fingerprint)."""
+    from compiled_model import CompiledPipeline
+    local_path, fingerprint = ARTIFACTS.fetch(blob_name)
+    model = CompiledPipeline.load(local_path)
+    logger.info("Loaded compiled model %s (version %s)", blob_name, fingerprint)
+    return model, fingerprint
+
+def load_model_assets(device_type):
+    """Loads the model for device_type and precomputes its feature importances and input decoder."""
+    logger.info("Loading model for %s", device_type)
+    with MODEL_LOAD_SECONDS.time(service="price", device=device_type):
+        required_features = DESKTOP_FEATURES if device_type == 'desktop' else LAPTOP_FEATURES
+        compiled = None
+        if PRICE_MODEL_FORMAT in ("auto", "compiled"):
+            try:
+                compiled, fingerprint = load_compiled_artifact(MODEL_CACHE[device_type]["compiled_blob"])
+            except FileNotFoundError:
+                if PRICE_MODEL_FORMAT == "compiled":
+                    raise
+                logger.info("No compiled model for %s; loading the joblib pipeline.", device_type)
+        if compiled is not None:
+            pipeline = None
+            feature_importances = aggregate_feature_importances(
+                compiled.feature_importances, compiled.feature_names_out, required_features)
+            decoder = RequestDecoder(required_features, [c for c in compiled.numeric_columns if c in required_features])
+        else:
+            pipeline, fingerprint = load_joblib_artifact(MODEL_CACHE[device_type]["model_blob"])
+            feature_importances = get_aggregated_feature_importances(pipeline, required_features)
+            decoder = RequestDecoder.from_pipeline(pipeline, required_features)
+    logger.debug("Model for %s: %r", device_type, compiled or pipeline)
+    logger.debug("Aggregated feature importances for %s: %s", device_type, LazyJSON(feature_importances))
+    return Versioned({
+        "pipeline": pipeline,
+        "compiled": compiled,
+        "feature_importances": feature_importances,
+        "decoder": decoder,
+        "version": fingerprint,
+    }, fingerprint)
+
+def registry_key(device_type):
+    return f"price/{device_type}"
+
+def warm_up(device_types=None):
+    """Starts loading every device model in parallel without waiting for completion."""
+    for device_type in device_types or list(MODEL_CACHE):
+        REGISTRY.prefetch(registry_key(device_type), lambda device_type=device_type: load_model_assets(device_type))
+
+def reload_model(device_type):
+    """Loads a fresh model for device_type and swaps it in while the old one keeps serving."""
+    return REGISTRY.reload(registry_key(device_type), lambda: load_model_assets(device_type),
+                           timeout=MODEL_LOAD_TIMEOUT_SECONDS)
+
+def get_model_assets(device_type):
+    """
+    Returns {"pipeline", "compiled", "feature_importances", "decoder", "version"} for
+    device_type, loading them once if needed. Exactly one of pipeline / compiled is set.
+    """
+    model_assets = REGISTRY.peek(registry_key(device_type))
+    if model_assets is not None:
+        return model_assets
+    # Not loaded yet (cold start): record how long this request waits for it.
+    with MODEL_WAIT_SECONDS.time(service="price", device=device_type):
+        return REGISTRY.get(registry_key(device_type), lambda: load_model_assets(device_type),
+                            timeout=MODEL_LOAD_TIMEOUT_SECONDS)
+
 def ensure_model_loaded(device_type):
-    """Loads the model for the given device_type from GCS if not already loaded."""
-    if not MODEL_CACHE[device_type]["loaded"]:
-        print(f"Loading model for {device_type} from GCS...")
+    """Returns the model for device_type (compiled or pipeline), waiting for (or starting) its load if needed."""
+    model_assets = get_model_assets(device_type)
+    return model_assets["compiled"] or model_assets["pipeline"]
+
+class FeatureDecodingError(ValueError):
+    """A request's feature_values could not be turned into model input."""
+
+def decode_rows(model_assets, rows):
+    """
+    Model input for a list of feature_values dicts: the compiled model's matrix, or the
+    decoder's DataFrame for the pipeline. Raises FeatureDecodingError for malformed values.
+    """
+    try:
+        with STAGE_SECONDS.time(service="price", stage="decode"):
+            if model_assets["compiled"] is not None:
+                return model_assets["compiled"].transform(rows)
+            return model_assets["decoder"].decode_many(rows)
+    except Exception as e:
+        raise FeatureDecodingError(str(e)) from e
+
+def predict_decoded(model_assets, model_input):
+    """Raw (transformed-scale) predictions for the output of decode_rows."""
+    with STAGE_SECONDS.time(service="price", stage="predict"):
+        if model_assets["compiled"] is not None:
+            return model_assets["compiled"].predict_matrix(model_input)
+        return model_assets["pipeline"].predict(model_input)
+
+def predict_rows(model_assets, rows):
+    """
+    Raw predictions for a list of feature_values dicts with one decode and one predict call.
+    A single malformed value can break the whole group; then the rows are retried one by
+    one and each failing row gets its Exception in place of a prediction (a
+    FeatureDecodingError if its values could not be decoded).
+    """
+    try:
+        return list(predict_decoded(model_assets, decode_rows(model_assets, rows)))
+    except Exception as e:
+        if len(rows) == 1:
+            return [e]
+        logger.warning("Batch predict failed (%s); falling back to per-row prediction.", e)
+    raw_predictions = []
+    for feature_values in rows:
         try:
-            MODEL_CACHE[device_type]["pipeline"] = load_from_gcs_joblib(
-                GCS_BUCKET_NAME, 
-                MODEL_CACHE[device_type]["model_blob"]
-            )
-            MODEL_CACHE[device_type]["loaded"] = True
-            print(f"Finished loading model for {device_type}.")
-        except Exception as e:
-            # Log the error and re-raise to be caught by the main handler
-            print(f"Failed to load model for {device_type} from GCS. Error: {e}")
-            raise  # Re-raise the exception to be handled by the main endpoint
-    return MODEL_CACHE[device_type]["pipeline"]
+            raw_predictions.append(predict_decoded(model_assets, decode_rows(model_assets, [feature_values]))[0])
+        except Exception as row_error:
+            raw_predictions.append(row_error)
+    return raw_predictions
+
+def predict_micro_batch(key, items):
+    """MicroBatcher runner: items are (model_assets, feature_values) of one device type and model version."""
+    return predict_rows(items[0][0], [feature_values for _, feature_values in items])
+
+# Optional (MICRO_BATCH_ENABLED): concurrent single-row requests are held for a few
+# milliseconds and scored together in one predict call (serving_common.micro_batching).
+PRICE_BATCHER = MicroBatcher("price", predict_micro_batch) if MICRO_BATCH_ENABLED else None
+
+def map_to_original_features(transformed_feature_names, original_feature_names):
+    """
+    Maps each transformed feature name (e.g. 'cat__procesador_Intel Core i7') to the
+    original feature it was derived from (e.g. 'procesador').
+    Original names are held in a set, so each transformed name is resolved by probing
+    its '_'-separated prefixes instead of scanning the whole feature list.
+    """
+    original_lookup = set(original_feature_names)
+    base_names = []
+    for transformed_name in transformed_feature_names:
+        parts = transformed_name.split('__', 1)
+        # Without a '__' prefix it might be a passthrough feature or a numerical one not needing prefix.
+        component_name = parts[1] if len(parts) == 2 else transformed_name
+        base_name = component_name
+        if component_name not in original_lookup:
+            # One-hot columns look like '<feature>_<category>'; take the longest matching prefix.
+            cut = component_name.rfind('_')
+            while cut > 0:
+                if component_name[:cut] in original_lookup:
+                    base_name = component_name[:cut]
+                    break
+                cut = component_name.rfind('_', 0, cut)
+        base_names.append(base_name)
+    return base_names
 
 def get_aggregated_feature_importances(pipeline, original_feature_names):
     """
     Extracts feature importances from the pipeline and aggregates them
     for one-hot encoded features back to their original feature names.
+    Only depends on the fitted pipeline, so it is computed once per loaded model
+    (see ensure_model_loaded) rather than per request.
     """
-    print("Attempting to get aggregated feature importances...")
     try:
         lgbm_regressor = pipeline.named_steps['regressor']
         preprocessor = pipeline.named_steps['preprocessor']
-        print("  Preprocessor and regressor steps found in pipeline.")
     except KeyError as e:
-        print(f"  Error: Model pipeline missing 'preprocessor' or 'regressor' step: {e}")
+        logger.error("Model pipeline missing 'preprocessor' or 'regressor' step: %s", e)
         return {}
     if not hasattr(lgbm_regressor, 'feature_importances_'):
-        print("  Error: Regressor does not have 'feature_importances_'.")
+        logger.error("Regressor does not have 'feature_importances_'.")
         return {}
     
-    importances = lgbm_regressor.feature_importances_
-    print(f"  Raw feature importances from LGBM: {importances}")
-    
+    importances = list(lgbm_regressor.feature_importances_)
+
     try:
         transformed_feature_names = preprocessor.get_feature_names_out()
-        print(f"  Transformed feature names from preprocessor: {transformed_feature_names}")
     except Exception as e:
-        print(f"  Warning: Could not get transformed feature names automatically using get_feature_names_out(): {e}.")
+        logger.warning("Could not get transformed feature names using get_feature_names_out(): %s", e)
         # Basic fallback - this might not be accurate if one-hot encoding changes feature count significantly
         if len(importances) == len(original_feature_names):
-             print("  Fallback: Using original feature names directly due to matching length (might be inaccurate).")
-             return dict(sorted(zip(original_feature_names, importances), key=lambda item: item[1], reverse=True))
-        print("  Error: Cannot reliably map feature importances without transformed names or matching length.")
+             logger.warning("Using original feature names directly due to matching length (might be inaccurate).")
+             return dict(sorted(zip(original_feature_names, map(float, importances)), key=lambda item: item[1], reverse=True))
+        logger.error("Cannot reliably map feature importances without transformed names or matching length.")
         return {}
 
-    aggregated_importances = {}
-    for i, transformed_name in enumerate(transformed_feature_names):
-        parts = transformed_name.split('__', 1)
-        base_name = transformed_name # Default to transformed_name if parsing fails
-        if len(parts) == 2:
-            original_component_name = parts[1]
-            base_name = original_component_name # Start with this
-            # Try to map back to the very original feature name (before one-hot encoding category was appended)
-            for orig_feat in original_feature_names:
-                if original_component_name.startswith(orig_feat + "_") or original_component_name == orig_feat:
-                    base_name = orig_feat
-                    break
-        else: # If no '__' was found, it might be a passthrough feature or a numerical one not needing prefix.
-            # Check if it directly matches an original feature name
-            if transformed_name in original_feature_names:
-                base_name = transformed_name
+    return aggregate_feature_importances(importances, transformed_feature_names, original_feature_names)
+
+def aggregate_feature_importances(importances, transformed_feature_names, original_feature_names):
+    """Sums importances of transformed features per original feature, sorted descending."""
+    import numpy as np
+    importances = np.asarray(importances, dtype=float)
+    base_names = map_to_original_features(transformed_feature_names, original_feature_names)
+    group_names, group_index = np.unique(np.asarray(base_names, dtype=object), return_inverse=True)
+    totals = np.bincount(group_index, weights=importances, minlength=len(group_names))
+
+    # Ensure values are Python floats for JSON serialization
+    aggregated_importances = dict(zip(group_names.tolist(), totals.tolist()))
+    return dict(sorted(aggregated_importances.items(), key=lambda item: item[1], reverse=True))
+
+def get_feature_importances(model_assets):
+    """
+    Returns the aggregated feature importances precomputed when the model was loaded.
+    Read from the same model_assets as the predictions, so a reload in between cannot
+    pair one model version's prices with another's importances.
+    """
+    return model_assets["feature_importances"]
+
+
+def to_price(prediction_transformed):
+    """Converts a raw model output back to a (non-negative) price."""
+    predicted_price = prediction_transformed
+    if MODEL_TRAINED_ON_LOG_TARGET:
+        predicted_price = math.expm1(prediction_transformed)
+    return max(0, float(predicted_price))
+
+def validate_batch_item(item):
+    """
+    Validates one entry of a batch request.
+    Returns (device_type, feature_values, None) on success or (None, None, error_message).
+    """
+    if not isinstance(item, dict):
+        return None, None, 'Each instance must be an object with "device_type" and "feature_values".'
+    device_type = item.get('device_type')
+    feature_values = item.get('feature_values')
+    if not device_type or not isinstance(device_type, str):
+        return None, None, 'Missing "device_type".'
+    device_type = device_type.lower()
+    if device_type not in ['desktop', 'laptop']:
+        return None, None, 'Invalid "device_type". Must be "desktop" or "laptop".'
+    if not feature_values or not isinstance(feature_values, dict):
+        return None, None, 'Missing or invalid "feature_values". Must be a dictionary.'
+    required_features = DESKTOP_FEATURES if device_type == 'desktop' else LAPTOP_FEATURES
+    missing_features = [col for col in required_features if col not in feature_values]
+    if missing_features:
+        return None, None, (f"Missing required keys in 'feature_values' for device type "
+                            f"'{device_type}': {missing_features}.")
+    return device_type, feature_values, None
+
+def predict_batch(instances):
+    """
+    Scores a list of {"device_type", "feature_values"} entries.
+    Rows are grouped by device type so each model runs a single vectorized predict call.
+    Returns (predictions, feature_importances) where predictions is aligned with instances
+    and holds either a price or a per-row error.
+    """
+    predictions = [None] * len(instances)
+    rows_by_device = {}
+    for i, item in enumerate(instances):
+        device_type, feature_values, error_msg = validate_batch_item(item)
+        if error_msg:
+            predictions[i] = {'error': error_msg}
+            continue
+        rows_by_device.setdefault(device_type, []).append((i, feature_values))
+
+    feature_importances = {}
+    for device_type, rows in rows_by_device.items():
+        positions = [i for i, _ in rows]
+        try:
+            model_assets = get_model_assets(device_type)
+        except Exception as e:
+            logger.error("Error loading model for %s during batch prediction: %s", device_type, e)
+            for i in positions:
+                predictions[i] = {'error': f"Could not load model for {device_type}."}
+            continue
+
+        raw_predictions = predict_rows(model_assets, [feature_values for _, feature_values in rows])
+        for i, raw_prediction in zip(positions, raw_predictions):
+            if isinstance(raw_prediction, FeatureDecodingError):
+                predictions[i] = {'error': f'Error building model input from "feature_values": {raw_prediction}'}
+            elif isinstance(raw_prediction, Exception):
+                predictions[i] = {'error': f"Error during prediction: {raw_prediction}"}
+            else:
+                predictions[i] = {
+                    "model_type_used": device_type,
+                    "predicted_price": round(to_price(raw_prediction), 2)
+                }
+        feature_importances[device_type] = get_feature_importances(model_assets)
+
+    return predictions, feature_importances
 
-        # Ensure values are Python floats for JSON serialization
-        aggregated_importances[base_name] = aggregated_importances.get(base_name, 0.0) + float(importances[i])
-        # print(f"    Mapping: '{transformed_name}' (importance: {importances[i]}) to base_name: '{base_name}'")
-            
-    sorted_importances = dict(sorted(aggregated_importances.items(), key=lambda item: item[1], reverse=True))
-    print(f"  Aggregated and sorted feature importances: {json.dumps(sorted_importances, indent=2)}")
-    return sorted_importances
+
+if WARMUP_ON_START:
+    warm_up()
 
 
 @functions_framework.http
+@instrument_handler("price")
 def get_price_prediction(request):
     """
     HTTP Cloud Function to predict price based on input feature values.
@@ -167,22 +396,28 @@ def get_price_prediction(request):
         }
     }
     The keys in "feature_values" must match the features expected for the "device_type".
+
+    Batch mode: send {"instances": [{"device_type": ..., "feature_values": {...}}, ...]}
+    (device types may be mixed, up to MAX_BATCH_SIZE entries). The response is
+    {"predictions": [...], "feature_importances": {"desktop": {...}, "laptop": {...}}}
+    where each prediction is either {"model_type_used", "predicted_price"} or
+    {"error": "..."} for rows that failed validation or scoring.
+
+    GET .../metrics returns the service's latency histograms and counters in OpenMetrics
+    text format (see serving_common.metrics).
     """
 
-    print(f"---- New Request Received ----")
-    print(f"Request Method: {request.method}")
-    print(f"Request Headers: {request.headers}")
+    begin_request()
+    logger.debug("Request received: %s %s", request.method, LazyJSON(request.headers))
 
     # Set CORS headers for the preflight request
     if request.method == 'OPTIONS':
-        print("Handling OPTIONS preflight request...")
         headers = {
             'Access-Control-Allow-Origin': '*',
             'Access-Control-Allow-Methods': 'POST, GET, OPTIONS',
             'Access-Control-Allow-Headers': 'Content-Type',
             'Access-Control-Max-Age': '3600'
         }
-        print(f"Returning preflight headers: {json.dumps(headers, indent=2)}")
         return ('', 204, headers)
 
     # Set CORS headers for the main request
@@ -190,112 +425,121 @@ def get_price_prediction(request):
     cors_headers = {
         'Access-Control-Allow-Origin': '*' # Or 'http://localhost:8080'
     }
-    print(f"CORS headers for actual request: {json.dumps(cors_headers, indent=2)}")
 
-    request_json = request.get_json(silent=True)
-    print(f"Request JSON payload: {json.dumps(request_json, indent=2) if request_json else 'No JSON payload or failed to parse'}")
+    with STAGE_SECONDS.time(service="price", stage="parse"):
+        request_json = request.get_json(silent=True)
+    logger.debug("Request JSON payload: %s", LazyJSON(request_json))
 
     if not request_json:
-        print("Error: No JSON payload received.")
+        logger.warning("No JSON payload received.")
         return ({'error': 'No JSON payload received.'}, 400, cors_headers)
 
+    if 'instances' in request_json:
+        instances = request_json.get('instances')
+        if not isinstance(instances, list) or not instances:
+            return ({'error': '"instances" must be a non-empty list.'}, 400, cors_headers)
+        if len(instances) > MAX_BATCH_SIZE:
+            return ({'error': f'Too many instances: {len(instances)}. Maximum is {MAX_BATCH_SIZE}.'}, 400, cors_headers)
+        try:
+            predictions, feature_importances = predict_batch(instances)
+        except Exception as e:
+            error_msg = f"Error during batch prediction: {str(e)}"
+            logger.exception(error_msg)
+            return ({'error': error_msg}, 500, cors_headers)
+        logger.info("Processed batch request", **log_fields(batch_size=len(instances)))
+        return ({"predictions": predictions, "feature_importances": feature_importances}, 200, cors_headers)
+
     device_type = request_json.get('device_type')
     feature_values = request_json.get('feature_values')
-    print(f"Parsed device_type: {device_type}")
-    print(f"Parsed feature_values: {json.dumps(feature_values, indent=2) if isinstance(feature_values, dict) else feature_values}")
-
     if not device_type:
-        print("Error: Missing 'device_type' in JSON payload.")
+        logger.warning("Missing 'device_type' in JSON payload.")
         return ({'error': 'Missing "device_type" in JSON payload.'}, 400, cors_headers)
     if device_type.lower() not in ['desktop', 'laptop']:
-        print(f"Error: Invalid 'device_type': {device_type}")
+        logger.warning("Invalid 'device_type': %s", device_type)
         return ({'error': 'Invalid "device_type". Must be "desktop" or "laptop".'}, 400, cors_headers)
     if not feature_values or not isinstance(feature_values, dict):
-        print("Error: Missing or invalid 'feature_values' in JSON payload.")
+        logger.warning("Missing or invalid 'feature_values' in JSON payload.")
         return ({'error': 'Missing or invalid "feature_values" in JSON payload. Must be a dictionary.'}, 400, cors_headers)
 
     device_type = device_type.lower()
-    print(f"Normalized device_type: {device_type}")
     
-    # Create DataFrame from the input feature values (single row)
-    try:
-        df_input = pd.DataFrame([feature_values]) # Note: [feature_values] creates a DataFrame with 1 row
-        print(f"Successfully created DataFrame from input features. Shape: {df_input.shape}")
-    except Exception as e:
-        error_msg = f'Error creating DataFrame from "feature_values": {str(e)}'
-        print(f"Error: {error_msg}")
-        return ({'error': error_msg}, 400, cors_headers)
-
     if device_type == 'desktop':
         required_features = DESKTOP_FEATURES
     else: # laptop
         required_features = LAPTOP_FEATURES
-    print(f"Required features for {device_type}: {required_features}")
 
-    # Validate that all required features are in the input DataFrame (created from feature_values)
-    missing_features = [col for col in required_features if col not in df_input.columns]
+    # Validate that all required features are in the input feature values
+    missing_features = [col for col in required_features if col not in feature_values]
     if missing_features:
         error_msg = (f"Missing required keys in 'feature_values' for device type "
                      f"'{device_type}': {missing_features}. "
                      f"Expected: {required_features}")
-        print(f"Error: {error_msg}")
+        logger.warning(error_msg)
         return ({'error': error_msg}, 400, cors_headers)
 
-    # Ensure DataFrame has columns in the correct order expected by the model pipeline,
-    # if the pipeline is sensitive to column order (ColumnTransformer typically isn't for selection).
-    # Selecting only the required features also handles any extra features sent by the client.
     try:
-        X_predict = df_input[required_features]
-    except KeyError as e:
-        error_msg = f"A feature specified in {device_type.upper()}_FEATURES was not found in the input: {e}"
-        print(f"Error: {error_msg}")
-        return ({'error': error_msg, 'details': f"Ensure all features in {required_features} are provided in 'feature_values'."}, 400, cors_headers)
-
-
-    model_pipeline = None
-    try:
-        model_pipeline = ensure_model_loaded(device_type)
-        
-        print(f"Successfully ensured model is loaded for {device_type} via GCS.")
-        print(f"Model pipeline object: {model_pipeline}")
-
-    except FileNotFoundError as e_fnf: # Specific catch for model not found in GCS by load_from_gcs_joblib
+        model_assets = get_model_assets(device_type)
+    except FileNotFoundError as e_fnf: # Specific catch for model not found by load_joblib_artifact
         error_msg = f"Model file not found in GCS for {device_type}: {str(e_fnf)}"
-        print(f"Error: {error_msg}")
+        logger.error(error_msg)
         return ({'error': error_msg, 'details': 'Ensure model file exists in the configured GCS bucket and path.'}, 500, cors_headers)
     except EOFError as eof: # Common for corrupted or incomplete pickle files
         error_msg = f"EOFError loading model for {device_type} from GCS: {str(eof)}. File might be corrupted or truncated."
-        print(f"Error: {error_msg}")
+        logger.error(error_msg)
         return ({'error': error_msg}, 500, cors_headers)
     except (AttributeError, ModuleNotFoundError, ImportError) as e_dep: # Common for version/dependency issues
         error_msg = f"Dependency-related error loading model for {device_type} from GCS: {str(e_dep)}. Check library versions."
-        print(f"Error: {error_msg}")
+        logger.error(error_msg)
         return ({'error': error_msg}, 500, cors_headers)
     except Exception as e: # General catch-all for loading
         error_msg = f"Error loading model for {device_type} from GCS: {str(e)}"
-        print(f"Error: {error_msg}")
+        logger.error(error_msg)
         return ({'error': error_msg, 'details': 'Ensure model file is valid, dependencies are met, and GCS access is configured.'}, 500, cors_headers)
 
+    # Popular configurations are answered from the response cache (keyed on the model version).
+    cache_key = response_cache_key("price", device_type, model_assets["version"], feature_values, model_assets["decoder"])
+    cached_results = RESPONSE_CACHE.get(cache_key, service="price")
+    if cached_results is not None:
+        return (cached_results, 200, cors_headers)
+
+    if PRICE_BATCHER is not None:
+        # Scored in one predict call with the concurrent requests for the same model.
+        try:
+            predictions_transformed = [PRICE_BATCHER.submit((device_type, model_assets["version"]),
+                                                            (model_assets, feature_values))]
+        except FeatureDecodingError as e:
+            error_msg = f'Error building model input from "feature_values": {str(e)}'
+            logger.warning(error_msg)
+            return ({'error': error_msg}, 400, cors_headers)
+        except Exception as e:
+            error_msg = f"Error during prediction: {str(e)}"
+            logger.error(error_msg)
+            return ({'error': error_msg}, 500, cors_headers)
+    else:
+        # Build the model input (columns in the order of required_features, extra keys ignored)
+        # directly from the feature values.
+        try:
+            X_predict = decode_rows(model_assets, [feature_values])
+        except Exception as e:
+            error_msg = f'Error building model input from "feature_values": {str(e)}'
+            logger.warning(error_msg)
+            return ({'error': error_msg}, 400, cors_headers)
+        predictions_transformed = None
+
     try:
-        print(f"Making prediction with {device_type} model...")
-        predictions_transformed = model_pipeline.predict(X_predict)
-        print(f"Raw prediction (transformed scale): {predictions_transformed}")
+        if predictions_transformed is None:
+            predictions_transformed = predict_decoded(model_assets, X_predict)
+        logger.debug("Raw prediction (transformed scale): %s", predictions_transformed)
         
         predicted_price_transformed = predictions_transformed[0] # We expect a single prediction
         
-        predicted_price = predicted_price_transformed
-        if MODEL_TRAINED_ON_LOG_TARGET:
-            print(f"Applying np.expm1 to prediction because MODEL_TRAINED_ON_LOG_TARGET is True.")
-            predicted_price = np.expm1(predicted_price_transformed)
-            print(f"Prediction after expm1: {predicted_price}")
-        
-        predicted_price = max(0, predicted_price) # Ensure price is not negative
+        predicted_price = to_price(predicted_price_transformed) # expm1 if log target, never negative
 
-        feature_importances_dict = get_aggregated_feature_importances(model_pipeline, required_features)
+        feature_importances_dict = get_feature_importances(model_assets)
 
     except Exception as e:
         error_msg = f"Error during prediction or feature importance extraction: {str(e)}"
-        print(f"Error: {error_msg}")
+        logger.error(error_msg)
         return ({'error': error_msg}, 500, cors_headers)
 
     results = {
@@ -303,6 +547,8 @@ def get_price_prediction(request):
         "predicted_price": round(predicted_price, 2),
         "feature_importances": feature_importances_dict
     }
-    print(f"Successfully processed request. Returning results: {json.dumps(results, indent=2)}")
-    
+    logger.info("Processed prediction request", **log_fields(device_type=device_type, predicted_price=results["predicted_price"]))
+    logger.debug("Returning results: %s", LazyJSON(results))
+    RESPONSE_CACHE.put(cache_key, results, namespace=registry_key(device_type))
+
     return (results, 200, cors_headers)
\ No newline at end of file
@@ -0,0 +1,10 @@
+"""
+Code shared by the Cloud Functions in cloud/.
+
+Each function is deployed from its own directory, so copy this package next to the
+function's main.py before deploying, e.g.:
+
+    cp -r cloud/serving_common cloud/get-price-prediction/
+
+When running locally, main.py falls back to importing it from the cloud/ directory.
+"""
@@ -0,0 +1,195 @@
+# cloud/serving_common/artifact_cache.py
+"""
+Persistent local cache for model and data artifacts read from a storage backend
+(GCS in production; see storage_backends.py).
+
+Entries are keyed by the artifact's fingerprint (GCS generation + md5), so a restart
+only needs a cheap metadata request to confirm that the cached copy is current; the
+download is skipped unless the blob changed. Files are written to a temporary name
+and moved into place with an atomic rename, which lets several processes on the same
+host share one cache directory safely.
+
+Multi-file artifacts (the kNN similarity index and columnar lookup table) are cached
+as whole directories, versioned by the fingerprint of their marker file (meta.json /
+manifest.json), which publishers upload last.
+
+Downloads are pinned to the fingerprint that was read, so an artifact overwritten in
+between is never cached under the previous version's key; the fetch starts over with
+the new fingerprint instead. Concurrent fetches of one artifact within a process share
+a single download.
+"""
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+from serving_common.metrics import ARTIFACT_CACHE_REQUESTS
+from serving_common.storage_backends import ArtifactChangedError, get_storage_backend
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_CACHE_DIR = os.environ.get("ARTIFACT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pcpp_artifact_cache"))
+# Number of fingerprints kept per artifact; older ones are pruned after a new download.
+ARTIFACT_CACHE_KEEP_VERSIONS = int(os.environ.get("ARTIFACT_CACHE_KEEP_VERSIONS", "2"))
+# Attempts at fetching an artifact that keeps changing while it is downloaded.
+ARTIFACT_DOWNLOAD_ATTEMPTS = 3
+
+
+def _safe_component(value):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", str(value)).strip("_") or "_"
+
+
+class ArtifactCache:
+    def __init__(self, backend, cache_dir=ARTIFACT_CACHE_DIR, keep_versions=ARTIFACT_CACHE_KEEP_VERSIONS):
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self.keep_versions = keep_versions
+        self._stats_lock = threading.Lock()
+        self._artifact_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _artifact_dir(self, name):
+        return os.path.join(self.cache_dir, _safe_component(name))
+
+    def _count(self, hit):
+        ARTIFACT_CACHE_REQUESTS.inc(result="hit" if hit else "miss")
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _current_fingerprint(self, name):
+        """
+        Asks the backend for the artifact's fingerprint. If it is unreachable (but
+        the artifact is not known to be missing), falls back to the newest cached copy.
+        """
+        try:
+            return self.backend.fingerprint(name)
+        except FileNotFoundError:
+            raise
+        except Exception as e:
+            cached = self._newest_cached(name)
+            if cached is None:
+                raise
+            logger.warning("Could not revalidate %s (%s); using cached version %s", name, e, cached)
+            return cached
+
+    def _newest_cached(self, name):
+        artifact_dir = self._artifact_dir(name)
+        try:
+            versions = [entry for entry in os.scandir(artifact_dir) if entry.is_dir() and not entry.name.startswith(".")]
+        except FileNotFoundError:
+            return None
+        if not versions:
+            return None
+        return max(versions, key=lambda entry: entry.stat().st_mtime_ns).name
+
+    def _prune(self, name, current):
+        artifact_dir = self._artifact_dir(name)
+        versions = [entry for entry in os.scandir(artifact_dir) if entry.is_dir() and not entry.name.startswith(".")]
+        versions.sort(key=lambda entry: entry.stat().st_mtime_ns, reverse=True)
+        for entry in versions[self.keep_versions:]:
+            if entry.name != current:
+                # Processes that still have these files open or memory-mapped keep working.
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def _artifact_lock(self, name):
+        with self._stats_lock:
+            return self._artifact_locks.setdefault(name, threading.Lock())
+
+    def _fetch_pinned(self, name, fetch_version):
+        """Runs fetch_version(fingerprint) for the current fingerprint, again if the artifact changes meanwhile."""
+        with self._artifact_lock(name):
+            for attempt in range(1, ARTIFACT_DOWNLOAD_ATTEMPTS + 1):
+                fingerprint = self._current_fingerprint(name)
+                try:
+                    return fetch_version(fingerprint), fingerprint
+                except ArtifactChangedError as e:
+                    if attempt == ARTIFACT_DOWNLOAD_ATTEMPTS:
+                        raise
+                    logger.info("%s; fetching the new version", e)
+
+    def fetch(self, name):
+        """Returns (local_path, fingerprint) for a single-file artifact."""
+        return self._fetch_pinned(name, lambda fingerprint: self._fetch_file(name, fingerprint))
+
+    def _fetch_file(self, name, fingerprint):
+        version_dir = os.path.join(self._artifact_dir(name), _safe_component(fingerprint))
+        local_path = os.path.join(version_dir, os.path.basename(name))
+        if os.path.exists(local_path):
+            self._count(hit=True)
+            return local_path
+
+        self._count(hit=False)
+        os.makedirs(version_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=version_dir, prefix=".download-")
+        os.close(fd)
+        try:
+            logger.info("Downloading %s into the artifact cache", self.backend.describe(name))
+            self.backend.download(name, tmp_path, fingerprint=fingerprint)
+            os.replace(tmp_path, local_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._prune(name, _safe_component(fingerprint))
+        return local_path
+
+    def fetch_directory(self, prefix, marker_name, list_files):
+        """
+        Returns (local_dir, fingerprint) for a multi-file artifact stored under `prefix`.
+        `marker_name` identifies the version; `list_files(marker_path)` returns the other
+        file names to download. Raises FileNotFoundError if the marker does not exist.
+        """
+        return self._fetch_pinned(
+            prefix + marker_name, lambda fingerprint: self._fetch_directory(prefix, marker_name, list_files, fingerprint))
+
+    def _fetch_directory(self, prefix, marker_name, list_files, fingerprint):
+        marker_blob = prefix + marker_name
+        version_dir = os.path.join(self._artifact_dir(prefix), _safe_component(fingerprint))
+        if os.path.exists(os.path.join(version_dir, marker_name)):
+            self._count(hit=True)
+            return version_dir
+
+        self._count(hit=False)
+        os.makedirs(self._artifact_dir(prefix), exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self._artifact_dir(prefix), prefix=".download-")
+        try:
+            self.backend.download(marker_blob, os.path.join(tmp_dir, marker_name), fingerprint=fingerprint)
+            for file_name in list_files(os.path.join(tmp_dir, marker_name)):
+                self.backend.download(prefix + file_name, os.path.join(tmp_dir, file_name))
+            try:
+                os.rename(tmp_dir, version_dir)
+            except OSError:
+                # Another process published the same version first; use theirs.
+                if not os.path.exists(os.path.join(version_dir, marker_name)):
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self._prune(prefix, _safe_component(fingerprint))
+        return version_dir
+
+    def stats(self):
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def make_artifact_cache(bucket_name):
+    """
+    ArtifactCache over the storage backend selected by configuration for `bucket_name`.
+    Services imported into the same process (cloud/unified_server) share one cache, and
+    so one storage client, per bucket.
+    """
+    key = (bucket_name, os.environ.get("STORAGE_BACKEND"), os.environ.get("STORAGE_LOCAL_ROOT"))
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = ArtifactCache(get_storage_backend(bucket_name))
+        return cache
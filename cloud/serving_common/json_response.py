@@ -0,0 +1,83 @@
+# cloud/serving_common/json_response.py
+"""
+Column-wise JSON serialization of tabular responses.
+
+records_json(columns, ...) turns {column name: numpy array} (as returned by
+ColumnarLookupTable.take) into the JSON bytes of a list of records, without a DataFrame
+and without per-row dicts: float columns are rounded with np.round and their NaN / inf
+mapped to null in one vectorized pass per column, and missing strings (None) become null.
+
+Each column is encoded into per-row JSON tokens on its own (numeric columns with a
+single dumps call, orjson when installed; strings with the C-accelerated stdlib
+encoder), and every record is then filled into one precompiled row template.
+"""
+import json
+import math
+from json.encoder import encode_basestring
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+JSON_CONTENT_TYPE = "application/json"
+
+
+def dumps(value):
+    """JSON bytes for plain Python values."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _column_values(values, decimals):
+    """
+    (Python list, numeric) for one column: floats rounded, NaN / inf and missing values as
+    None. `numeric` is True when the list holds only numbers, booleans and None.
+    """
+    import numpy as np
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        rounded = np.round(values.astype(np.float64, copy=False), decimals)
+        column = rounded.tolist()
+        for i in np.flatnonzero(~np.isfinite(rounded)):
+            column[i] = None
+        return column, True
+    return values.tolist(), values.dtype.kind in "iub"
+
+
+def _json_token(value):
+    if value is None:
+        return "null"
+    if isinstance(value, str):
+        return encode_basestring(value)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        # NaN / inf in an object column: null, as orjson writes them.
+        return repr(value) if math.isfinite(value) else "null"
+    if isinstance(value, int):
+        return repr(value)
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _column_tokens(column, numeric):
+    """JSON token of every value of a column from _column_values."""
+    if numeric:
+        # Numbers, booleans and null contain no commas, so one encoded list splits into its tokens.
+        return dumps(column).decode("utf-8")[1:-1].split(",") if column else []
+    if all(type(value) is str for value in column):
+        return list(map(encode_basestring, column))
+    return [_json_token(value) for value in column]
+
+
+def records_json(columns, key, decimals=4):
+    """
+    JSON bytes of {key: [record, ...]} where record i holds element i of every column.
+    `columns` is an ordered {name: array}; all arrays must have the same length.
+    """
+    names = list(columns)
+    tokens = [_column_tokens(*_column_values(columns[name], decimals)) for name in names]
+    row_template = "{" + ",".join([encode_basestring(name).replace("%", "%%") + ":%s" for name in names]) + "}"
+    rows = [row_template % row for row in zip(*tokens)]
+    return ("{" + encode_basestring(key) + ":[" + ",".join(rows) + "]}").encode("utf-8")
@@ -0,0 +1,256 @@
+# cloud/serving_common/metrics.py
+"""
+In-process metrics with OpenMetrics text exposition.
+
+Counters, gauges and fixed-bucket histograms, kept in plain dicts keyed by label values.
+Recording is a dict lookup, a bisect and an addition under a lock, which is cheap enough
+to leave on in production. `METRICS.render()` produces the OpenMetrics text served by
+`GET .../metrics` on every handler wrapped with `instrument_handler`.
+
+Shared series:
+    pcpp_request_seconds{service,status}        whole request
+    pcpp_request_stage_seconds{service,stage}   parse / decode / predict / transform / ...
+    pcpp_model_load_seconds{service,device}     loading a model (cold start or reload)
+    pcpp_model_wait_seconds{service,device}     time a request waited for a model to load
+    pcpp_artifact_cache_requests_total{result}  artifact cache hits / misses
+
+METRICS_ENABLED=false turns recording and the endpoint off.
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Seconds; from sub-millisecond stages up to multi-second cold starts.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self):
+        return [f"# TYPE {self.name} {self.kind}", f"# HELP {self.name} {_escape(self.documentation)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._series.get(self._key(labels), 0)
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, value in series:
+            lines.append(f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+    def value(self, **labels):
+        return self._series.get(self._key(labels))
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, value in series:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, n_buckets):
+        self.counts = [0] * n_buckets
+        self.total = 0.0
+        self.count = 0
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.buckets) + 1)
+            series.counts[position] += 1
+            series.total += value
+            series.count += 1
+
+    def time(self, **labels):
+        """Context manager observing the elapsed wall time of its block."""
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        series = self._series.get(self._key(labels))
+        return series.count if series is not None else 0
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            series = sorted((key, list(s.counts), s.total, s.count) for key, s in self._series.items())
+        bounds = list(self.buckets) + [float("inf")]
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, extra=(("le", _format_value(float(bound))),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels.")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """All metrics in OpenMetrics text format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+# Registry shared by every service imported into this process.
+METRICS = MetricsRegistry()
+
+REQUEST_SECONDS = METRICS.histogram(
+    "pcpp_request_seconds", "Request latency by service and HTTP status.", ("service", "status"))
+STAGE_SECONDS = METRICS.histogram(
+    "pcpp_request_stage_seconds", "Latency of individual request stages.", ("service", "stage"))
+MODEL_LOAD_SECONDS = METRICS.histogram(
+    "pcpp_model_load_seconds", "Time spent loading model assets.", ("service", "device"))
+MODEL_WAIT_SECONDS = METRICS.histogram(
+    "pcpp_model_wait_seconds", "Time requests waited for model assets that were not loaded yet.",
+    ("service", "device"))
+ARTIFACT_CACHE_REQUESTS = METRICS.counter(
+    "pcpp_artifact_cache_requests", "Artifact cache lookups by result (hit / miss).", ("result",))
+
+
+def is_metrics_request(request):
+    return request.method == "GET" and getattr(request, "path", "").rstrip("/").endswith("/metrics")
+
+
+def instrument_handler(service):
+    """
+    Decorator for an HTTP handler: serves `GET .../metrics` and records the request
+    latency by response status. Place it below @functions_framework.http.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(request):
+            if METRICS_ENABLED and is_metrics_request(request):
+                return (METRICS.render(), 200, {"Content-Type": OPENMETRICS_CONTENT_TYPE})
+            start = time.perf_counter()
+            status = 500
+            try:
+                response = handler(request)
+                if isinstance(response, tuple) and len(response) > 1:
+                    status = response[1]
+                else:
+                    status = 200
+                return response
+            finally:
+                REQUEST_SECONDS.observe(time.perf_counter() - start, service=service, status=status)
+        return wrapper
+    return decorator
@@ -0,0 +1,136 @@
+# cloud/serving_common/micro_batching.py
+"""
+Micro-batching of concurrent single-row requests.
+
+Clients send one configuration per request, but under load many of them are in flight
+at once, and scoring N rows in one model call costs little more than scoring one. A
+MicroBatcher holds the items submitted under the same key (device type and model
+version, plus whatever else must be equal within a batch) for up to
+MICRO_BATCH_MAX_WAIT_MS after the first one arrives, or until MICRO_BATCH_MAX_SIZE items
+are waiting, then runs them through one `run_batch(key, items)` call and hands each
+waiting request its own result.
+
+Each key has a lane: a queue and a worker thread, started on the first submit and
+stopped after MICRO_BATCH_IDLE_SECONDS without traffic (so lanes of replaced model
+versions go away). While a lane's batch runs, new items queue up for the next one.
+
+`run_batch` returns one result per item, in order. A result that is an Exception is
+raised in that item's request only; an exception raised by run_batch itself fails the
+whole batch.
+
+Configuration (the window trades latency of a lone request for throughput under load):
+    MICRO_BATCH_ENABLED         false (default) | true
+    MICRO_BATCH_MAX_SIZE        items per model call (default 32)
+    MICRO_BATCH_MAX_WAIT_MS     how long the first item waits for company (default 2); with
+                                0 a batch holds what queued up while the previous one ran,
+                                so a lone request is not delayed at all
+    MICRO_BATCH_IDLE_SECONDS    idle time after which a lane's thread exits (default 60)
+
+Series (see serving_common.metrics):
+    pcpp_micro_batch_size{service}                 items per model call
+    pcpp_micro_batch_queue_wait_seconds{service}   submit until the item's batch starts
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from serving_common.metrics import METRICS
+
+MICRO_BATCH_ENABLED = os.environ.get("MICRO_BATCH_ENABLED", "false").lower() in ("1", "true", "yes")
+MICRO_BATCH_MAX_SIZE = int(os.environ.get("MICRO_BATCH_MAX_SIZE", "32"))
+MICRO_BATCH_MAX_WAIT_MS = float(os.environ.get("MICRO_BATCH_MAX_WAIT_MS", "2"))
+MICRO_BATCH_IDLE_SECONDS = float(os.environ.get("MICRO_BATCH_IDLE_SECONDS", "60"))
+
+BATCH_SIZE = METRICS.histogram(
+    "pcpp_micro_batch_size", "Items scored per micro-batched model call.", ("service",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+QUEUE_WAIT_SECONDS = METRICS.histogram(
+    "pcpp_micro_batch_queue_wait_seconds", "Time an item waited for its micro-batch to start.", ("service",))
+
+
+class _Lane:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = deque()  # (enqueued_at, item, future)
+
+
+class MicroBatcher:
+    """Coalesces concurrent submit() calls with the same key into one run_batch(key, items) call."""
+
+    def __init__(self, service, run_batch, max_batch_size=None, max_wait_ms=None,
+                 idle_seconds=MICRO_BATCH_IDLE_SECONDS):
+        self.service = service
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size or MICRO_BATCH_MAX_SIZE)
+        self.max_wait = (MICRO_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._lanes = {}
+
+    def submit(self, key, item, timeout=None):
+        """Queues `item` under `key` and blocks until its batch has run. Returns its result or raises its error."""
+        future = Future()
+        with self._lock:
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = self._lanes[key] = _Lane()
+                threading.Thread(target=self._run_lane, args=(key, lane), daemon=True,
+                                 name=f"micro-batch-{self.service}").start()
+            # Appended under the batcher lock, so an idle lane cannot retire in between.
+            with lane.condition:
+                lane.pending.append((time.perf_counter(), item, future))
+                lane.condition.notify()
+        return future.result(timeout=timeout)
+
+    def lane_count(self):
+        with self._lock:
+            return len(self._lanes)
+
+    def _next_batch(self, key, lane):
+        """Waits for the lane's next batch; returns None once the lane has retired."""
+        with lane.condition:
+            while not lane.pending:
+                if not lane.condition.wait(self.idle_seconds) and not lane.pending:
+                    break
+            if lane.pending:
+                deadline = lane.pending[0][0] + self.max_wait
+                while len(lane.pending) < self.max_batch_size:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    lane.condition.wait(remaining)
+                return [lane.pending.popleft() for _ in range(min(len(lane.pending), self.max_batch_size))]
+        with self._lock, lane.condition:
+            if lane.pending:  # something arrived while the lock was free
+                return []
+            del self._lanes[key]
+            return None
+
+    def _run_lane(self, key, lane):
+        while True:
+            batch = self._next_batch(key, lane)
+            if batch is None:
+                return
+            if batch:
+                self._run(key, batch)
+
+    def _run(self, key, batch):
+        started = time.perf_counter()
+        for enqueued_at, _, _ in batch:
+            QUEUE_WAIT_SECONDS.observe(started - enqueued_at, service=self.service)
+        BATCH_SIZE.observe(len(batch), service=self.service)
+        try:
+            results = self.run_batch(key, [item for _, item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"run_batch returned {len(results)} results for {len(batch)} items.")
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,188 @@
+# cloud/serving_common/model_registry.py
+"""
+Process-wide registry of loaded models and data artifacts.
+
+- Single-flight loading: when several threads ask for the same key while it is not
+  loaded yet, only one of them runs the loader; the others wait for its result.
+- Versioned entries: every stored value carries a version (the artifact generation
+  when the loader provides one, otherwise a counter). `reload` loads a new value while
+  the old one keeps serving and then swaps it in atomically, so a running instance
+  can pick up a new model without a restart.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Versioned:
+    """Loader return value carrying an explicit version (e.g. a GCS generation)."""
+
+    __slots__ = ("value", "version")
+
+    def __init__(self, value, version):
+        self.value = value
+        self.version = version
+
+
+class RegistryEntry:
+    __slots__ = ("value", "version", "loaded_at")
+
+    def __init__(self, value, version, loaded_at):
+        self.value = value
+        self.version = version
+        self.loaded_at = loaded_at
+
+
+class _Flight:
+    """An in-progress load that other threads can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._flights = {}
+        self._listeners = []
+
+    def get(self, key, loader, timeout=None):
+        """
+        Returns the value stored under `key`, calling `loader()` to produce it if needed.
+        Concurrent callers for the same key share one loader call. A failed load is
+        raised to every waiter and retried by the next call.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry.value
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry.value
+            flight, leader = self._join_flight(key)
+        if leader:
+            self._run_flight(key, flight, loader)
+        return self._wait(key, flight, timeout)
+
+    def prefetch(self, key, loader):
+        """Starts loading `key` in a background thread unless it is loaded or already loading."""
+        with self._lock:
+            if key in self._entries or key in self._flights:
+                return
+            flight, _ = self._join_flight(key)
+        threading.Thread(
+            target=self._run_flight, args=(key, flight, loader), name=f"prefetch-{key}", daemon=True
+        ).start()
+
+    def wait_ready(self, key, timeout=None):
+        """Blocks until `key` is loaded (or its in-flight load fails). Returns True if loaded."""
+        with self._lock:
+            flight = self._flights.get(key)
+        if flight is not None:
+            flight.done.wait(timeout)
+        return key in self._entries
+
+    def reload(self, key, loader, timeout=None):
+        """
+        Loads a fresh value for `key` and swaps it in; the current value keeps being
+        served until then. Concurrent reloads of the same key share one loader call.
+        """
+        flight_key = (key, "reload")
+        with self._lock:
+            flight, leader = self._join_flight(flight_key)
+        if leader:
+            self._run_flight(flight_key, flight, loader, install_key=key)
+        return self._wait(key, flight, timeout)
+
+    def swap(self, key, value, version=None, expected_version=None):
+        """
+        Atomically replaces the value under `key`. With `expected_version`, the swap only
+        happens if the current version matches (compare-and-swap). Returns True if swapped.
+        """
+        with self._lock:
+            current = self._entries.get(key)
+            current_version = current.version if current is not None else None
+            if expected_version is not None and current_version != expected_version:
+                return False
+            if version is None:
+                version = current_version + 1 if isinstance(current_version, int) else 1
+            self._entries[key] = RegistryEntry(value, version, time.time())
+            listeners = list(self._listeners)
+        if current_version != version:
+            self._notify(listeners, key, current_version, version)
+        return True
+
+    def invalidate(self, key):
+        """Drops `key`; the next `get` loads it again."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            listeners = list(self._listeners)
+        if entry is not None:
+            self._notify(listeners, key, entry.version, None)
+
+    def peek(self, key):
+        """Returns the stored value or None, without loading."""
+        entry = self._entries.get(key)
+        return entry.value if entry is not None else None
+
+    def version(self, key):
+        entry = self._entries.get(key)
+        return entry.version if entry is not None else None
+
+    def snapshot(self):
+        """{key: version} for every loaded entry."""
+        return {key: entry.version for key, entry in list(self._entries.items())}
+
+    def add_listener(self, listener):
+        """Registers listener(key, old_version, new_version), called after every swap."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def _notify(self, listeners, key, old_version, new_version):
+        for listener in listeners:
+            try:
+                listener(key, old_version, new_version)
+            except Exception:
+                logger.exception("Registry listener failed for %s", key)
+
+    def _join_flight(self, flight_key):
+        # Caller holds self._lock.
+        flight = self._flights.get(flight_key)
+        if flight is not None:
+            return flight, False
+        flight = self._flights[flight_key] = _Flight()
+        return flight, True
+
+    def _run_flight(self, flight_key, flight, loader, install_key=None):
+        install_key = flight_key if install_key is None else install_key
+        try:
+            result = loader()
+            if isinstance(result, Versioned):
+                value, version = result.value, result.version
+            else:
+                value, version = result, None
+            self.swap(install_key, value, version)
+            flight.value = value
+        except BaseException as e:
+            logger.warning("Loading %s failed: %s", install_key, e)
+            flight.error = e
+        finally:
+            with self._lock:
+                self._flights.pop(flight_key, None)
+            flight.done.set()
+
+    def _wait(self, key, flight, timeout):
+        if not flight.done.wait(timeout):
+            raise TimeoutError(f"Timed out waiting for {key} to load.")
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+
+# Registry shared by every service imported into this process.
+REGISTRY = ModelRegistry()
@@ -0,0 +1,97 @@
+# cloud/serving_common/processor_family.py
+"""
+Derives `procesador_tipo` (processor family, e.g. "Core i7", "Ryzen 5") from the raw
+`procesador` string.
+
+All family patterns are compiled once into a single alternation. Each alternative is
+anchored as `^.*?<pattern>`, so the regex engine tries the families in priority order
+and the first family found anywhere in the string wins, exactly like testing the
+patterns one after another with re.search.
+
+- get_procesador_tipo: one string, memoized (the catalog has a few hundred distinct CPUs).
+- procesador_tipo_series: a whole pandas Series at once via .str.extract.
+- fill_procesador_tipo: offline helper that derives missing values in a DataFrame.
+"""
+import re
+from functools import lru_cache
+
+# (group name, regex, label). When the regex has a capture it is the named group and
+# the label is a template for the captured text; otherwise the whole match is the group.
+PROCESSOR_FAMILIES = [
+    ("apple_m", r"Apple M\d*", "Apple M"),
+    ("core_ultra", r"Core Ultra", "Core Ultra"),
+    ("core_i", r"Core i(\d)", "Core i{}"),
+    ("intel_n", r"Intel N\d*", "Intel N"),
+    ("pentium", r"Pentium", "Pentium"),
+    ("celeron", r"Celeron", "Celeron"),
+    ("atom", r"Atom", "Atom"),
+    ("xeon", r"Xeon", "Xeon"),
+    ("ryzen_ai", r"Ryzen AI", "Ryzen AI"),
+    ("ryzen", r"Ryzen (\d)", "Ryzen {}"),
+    ("threadripper", r"Threadripper", "Threadripper"),
+    ("epyc", r"EPYC", "EPYC"),
+    ("athlon", r"Athlon", "Athlon"),
+]
+
+
+def _alternative(name, regex):
+    if "(" in regex:
+        # Turn the single capture into the named group, e.g. Core i(?P<core_i>\d)
+        return ".*?" + regex.replace("(", f"(?P<{name}>", 1)
+    return f".*?(?P<{name}>{regex})"
+
+
+PROCESADOR_TIPO_PATTERN = re.compile(
+    "^(?:" + "|".join(_alternative(name, regex) for name, regex, _ in PROCESSOR_FAMILIES) + ")",
+    flags=re.IGNORECASE | re.DOTALL,
+)
+_LABELS = {name: label for name, _, label in PROCESSOR_FAMILIES}
+
+
+@lru_cache(maxsize=4096)
+def _classify(procesador_str):
+    match = PROCESADOR_TIPO_PATTERN.match(procesador_str)
+    if match is None:
+        return None
+    label = _LABELS[match.lastgroup]
+    return label.format(match.group(match.lastgroup)) if "{}" in label else label
+
+
+def get_procesador_tipo(procesador_str):
+    """Processor family for one raw processor string, or NaN if it is missing or unknown."""
+    if not isinstance(procesador_str, str):
+        return float("nan")
+    result = _classify(procesador_str)
+    return float("nan") if result is None else result
+
+
+def procesador_tipo_series(procesador_series):
+    """Vectorized get_procesador_tipo over a pandas Series (NaN where no family matches)."""
+    import numpy as np
+    import pandas as pd
+
+    extracted = procesador_series.str.extract(PROCESADOR_TIPO_PATTERN)
+    result = pd.Series(np.nan, index=procesador_series.index, dtype=object)
+    for name, _, label in PROCESSOR_FAMILIES:
+        captured = extracted[name]
+        matched = captured.notna()
+        if not matched.any():
+            continue
+        if "{}" in label:
+            prefix, suffix = label.split("{}")
+            result[matched] = prefix + captured[matched] + suffix
+        else:
+            result[matched] = label
+    return result
+
+
+def fill_procesador_tipo(df):
+    """Derives `procesador_tipo` from `procesador` where it is missing (adds the column if absent)."""
+    if "procesador" not in df.columns:
+        return df
+    derived = procesador_tipo_series(df["procesador"])
+    if "procesador_tipo" in df.columns:
+        df["procesador_tipo"] = df["procesador_tipo"].fillna(derived)
+    else:
+        df["procesador_tipo"] = derived
+    return df
@@ -0,0 +1,103 @@
+# cloud/serving_common/request_decoder.py
+"""
+Schema-driven decoding of JSON feature values into model input.
+
+Building `pd.DataFrame([feature_values])`, inserting missing columns one at a time and
+reindexing costs more than scoring a single row. A RequestDecoder knows the column order
+and which columns the fitted preprocessor treats as numeric, and builds the input frame
+in one construction from typed column arrays:
+  - numeric columns become float64 (None / missing -> NaN); a value that cannot be parsed
+    as a number is kept as-is, so the pipeline reports the same error as before,
+  - every other column is an object column holding the raw value,
+  - columns absent from the request are filled with NaN in the same step.
+
+Decoders are built once per loaded model (RequestDecoder.from_pipeline) and stored with
+it in the model registry. `canonical` gives the normalized feature vector used to key
+cached responses and precomputed neighbor lists. numpy and pandas are only imported when
+a frame is first built, so importing this module stays cheap for the handlers.
+"""
+import math
+
+
+def _find_column_transformer(pipeline):
+    if hasattr(pipeline, "transformers_"):
+        return pipeline
+    for _, step in getattr(pipeline, "steps", []):
+        found = _find_column_transformer(step)
+        if found is not None:
+            return found
+    return None
+
+
+def _is_categorical(transformer):
+    # Encoders (OneHotEncoder, OrdinalEncoder) expose the fitted categories_.
+    if hasattr(transformer, "categories_"):
+        return True
+    return any(_is_categorical(step) for _, step in getattr(transformer, "steps", []))
+
+
+def numeric_columns_of(pipeline):
+    """Columns the pipeline's fitted ColumnTransformer routes to a non-categorical branch."""
+    column_transformer = _find_column_transformer(pipeline)
+    if column_transformer is None:
+        return []
+    numeric = []
+    for _, transformer, columns in column_transformer.transformers_:
+        if isinstance(transformer, str) or not isinstance(columns, (list, tuple)):
+            continue  # "drop" / "passthrough" / positional selections keep their raw dtype
+        if not _is_categorical(transformer):
+            numeric.extend(columns)
+    return numeric
+
+
+def _normalize(value, numeric):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if numeric:
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return value
+        return None if math.isnan(number) else number
+    return value
+
+
+class RequestDecoder:
+    def __init__(self, columns, numeric_columns=()):
+        self.columns = list(columns)
+        self.numeric_columns = frozenset(numeric_columns)
+
+    @classmethod
+    def from_pipeline(cls, pipeline, columns):
+        """Decoder producing `columns` (in order) with dtypes taken from the fitted pipeline."""
+        return cls(columns, [column for column in numeric_columns_of(pipeline) if column in columns])
+
+    def _column(self, name, values):
+        import numpy as np
+        if name in self.numeric_columns:
+            try:
+                return np.array(values, dtype=np.float64)
+            except (TypeError, ValueError):
+                pass
+        column = np.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            column[i] = value  # element-wise, so list/dict values are not broadcast
+        return column
+
+    def decode_many(self, rows):
+        """DataFrame with one row per feature_values dict, in schema column order."""
+        import pandas as pd
+        # The dict is built in schema order, so no `columns=` reindexing pass is needed.
+        data = {name: self._column(name, [row.get(name, math.nan) for row in rows]) for name in self.columns}
+        return pd.DataFrame(data, copy=False)
+
+    def canonical(self, feature_values):
+        """
+        Feature values as a list in schema order: missing values as None and numeric columns
+        parsed to float the way decode does, so 16, 16.0 and "16" compare equal.
+        """
+        return [_normalize(feature_values.get(column), column in self.numeric_columns) for column in self.columns]
+
+    def decode(self, feature_values):
+        """Single-row DataFrame for one feature_values dict."""
+        return self.decode_many((feature_values,))
@@ -0,0 +1,226 @@
+# cloud/serving_common/response_cache.py
+"""
+Response cache for repeated configurations.
+
+The frontend keeps sending the same popular configurations, so successful responses are
+cached in a bounded in-process LRU with a TTL, optionally backed by a shared store so
+several instances share hits.
+
+Keys are a SHA-256 over (service, device type, model version, k, request options such
+as filters, normalized feature vector). The vector is RequestDecoder.canonical for the model's decoder: only the
+model's columns, in schema order, missing values as null, and numeric columns parsed
+to float the same way the decoder does (so 16, 16.0 and "16" share an entry). Because
+the model version is part of the key, a reloaded model never serves stale entries; a
+model registry listener also drops the local entries of the replaced version right away.
+
+Configuration:
+    RESPONSE_CACHE_ENABLED        true (default) | false
+    RESPONSE_CACHE_MAX_ENTRIES    local LRU size (default 4096)
+    RESPONSE_CACHE_TTL_SECONDS    entry lifetime (default 300)
+    RESPONSE_CACHE_SHARED         "" (default, local only) | redis | memory
+    RESPONSE_CACHE_REDIS_URL      redis://host:6379/0 (requires the optional `redis` package)
+`memory` is a process-local stand-in with the shared backend's interface.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from serving_common.metrics import METRICS
+from serving_common.model_registry import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "4096"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "300"))
+RESPONSE_CACHE_SHARED = os.environ.get("RESPONSE_CACHE_SHARED", "").lower()
+RESPONSE_CACHE_REDIS_URL = os.environ.get("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+RESPONSE_CACHE_REQUESTS = METRICS.counter(
+    "pcpp_response_cache_requests", "Response cache lookups by service and result (hit / shared_hit / miss).",
+    ("service", "result"))
+
+
+def response_cache_key(service, device_type, model_version, feature_values, decoder, k=None, options=None):
+    """
+    Canonical hash of a request, restricted to the columns of the model's decoder.
+    `options` holds any other JSON request parameters that change the response.
+    """
+    payload = json.dumps([service, device_type, model_version, k, options, decoder.canonical(feature_values)],
+                         separators=(",", ":"), ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _encode_shared(value):
+    # One marker byte keeps encoded bodies (b) and plain values (j) apart.
+    if isinstance(value, bytes):
+        return b"b" + value
+    return b"j" + json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _decode_shared(data):
+    if data[:1] == b"b":
+        return bytes(data[1:])
+    return json.loads(data[1:])
+
+
+class InMemorySharedBackend:
+    """Process-local stand-in for the shared store (same interface as RedisSharedBackend)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def get(self, key):
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                return None
+            expires_at, data = item
+            if expires_at <= time.monotonic():
+                del self._values[key]
+                return None
+            return data
+
+    def set(self, key, data, ttl_seconds):
+        with self._lock:
+            self._values[key] = (time.monotonic() + ttl_seconds, data)
+
+
+class RedisSharedBackend:
+    """Shared store on Redis; entries expire through Redis TTLs."""
+
+    def __init__(self, url, prefix="pcpp:response:"):
+        import redis  # optional dependency, only needed with RESPONSE_CACHE_SHARED=redis
+        self._client = redis.Redis.from_url(url, socket_timeout=0.05)
+        self._prefix = prefix
+
+    def get(self, key):
+        return self._client.get(self._prefix + key)
+
+    def set(self, key, data, ttl_seconds):
+        self._client.set(self._prefix + key, data, ex=max(1, int(ttl_seconds)))
+
+
+class ResponseCache:
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+                 shared=None, enabled=True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self.enabled = enabled and max_entries > 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, namespace, value)
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, service=""):
+        """Cached response for `key`, or None."""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    RESPONSE_CACHE_REQUESTS.inc(service=service, result="hit")
+                    return entry[2]
+                del self._entries[key]
+        value = self._shared_get(key)
+        with self._lock:
+            if value is not None:
+                self.shared_hits += 1
+            else:
+                self.misses += 1
+        RESPONSE_CACHE_REQUESTS.inc(service=service, result="shared_hit" if value is not None else "miss")
+        return value
+
+    def put(self, key, value, namespace=None):
+        """
+        Stores a response: a JSON-serializable value or an already encoded JSON body (bytes).
+        `namespace` is the model registry key it depends on.
+        """
+        if not self.enabled:
+            return
+        self._put_local(key, value, namespace)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, _encode_shared(value), self.ttl_seconds)
+            except Exception as e:
+                logger.warning("Shared response cache write failed: %s", e)
+
+    def _put_local(self, key, value, namespace):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, namespace, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _shared_get(self, key):
+        if self.shared is None:
+            return None
+        try:
+            data = self.shared.get(key)
+        except Exception as e:
+            logger.warning("Shared response cache read failed: %s", e)
+            return None
+        if data is None:
+            return None
+        value = _decode_shared(data)
+        # Promote into the local LRU; the namespace is unknown here, but the key embeds the version.
+        self._put_local(key, value, None)
+        return value
+
+    def invalidate(self, namespace=None):
+        """Drops local entries depending on `namespace` (a model registry key), or everything."""
+        with self._lock:
+            if namespace is None:
+                self._entries.clear()
+                return
+            for key in [key for key, entry in self._entries.items() if entry[1] == namespace]:
+                del self._entries[key]
+
+    def on_model_swapped(self, registry_key, old_version, new_version):
+        """Model registry listener: entries computed with the replaced model are now unreachable."""
+        if old_version is not None:
+            self.invalidate(registry_key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+            }
+
+
+def make_shared_backend(kind=RESPONSE_CACHE_SHARED):
+    if not kind:
+        return None
+    if kind == "memory":
+        return InMemorySharedBackend()
+    if kind == "redis":
+        try:
+            return RedisSharedBackend(RESPONSE_CACHE_REDIS_URL)
+        except ImportError:
+            logger.warning("RESPONSE_CACHE_SHARED=redis but the redis package is not installed; using the local cache only.")
+            return None
+    raise ValueError(f"Unknown RESPONSE_CACHE_SHARED: {kind!r}. Expected redis or memory.")
+
+
+# Cache shared by every service imported into this process.
+RESPONSE_CACHE = ResponseCache(shared=make_shared_backend(), enabled=RESPONSE_CACHE_ENABLED)
+REGISTRY.add_listener(RESPONSE_CACHE.on_model_swapped)
@@ -0,0 +1,135 @@
+# cloud/serving_common/row_filters.py
+"""
+Filter predicates over a columnar table, answered from per-column indexes.
+
+A request may restrict the neighbors it gets back with (laptop lookup table values)
+    "filters": {
+        "ram_memoria_gb": {"min": 16},                          // numeric: inclusive "min" and/or "max"
+        "procesador_tipo": ["Intel Core i7", "AMD Ryzen 7"],    // string: one value or a list of values
+        "pantalla_tecnologia": "Full HD"
+    }
+String values must match the lookup table exactly; the desktop table spells processor
+families without the vendor ("Core i7", "Ryzen 7"). Any column of the lookup table can be
+filtered on, an unknown column is rejected. Neither kNN lookup table has a price column
+(precio_mean) yet, so price filters are rejected until the tables are rebuilt with one.
+
+Each filtered column has an index over the lookup rows:
+  - numeric columns keep the row ids sorted by value, so a range is two binary searches
+    and a slice (rows with a missing value never match),
+  - string columns keep one posting list of row ids per dictionary code.
+The FILTER_COLUMNS (or the columns passed in) are indexed when the table is loaded, any
+other column the first time it is filtered on. The filters of a request are evaluated into
+one boolean mask over the rows (intersected across columns). The kNN service applies it
+inside the neighbor search (SimilarityIndex.search(allowed=...)); the catalog service
+keeps the per-column masks apart for its facet counts (column_mask).
+
+The table is anything with `columns`, `is_numeric(column)`, `column(column)` (float
+values, or int32 codes with -1 for missing), `dictionary(column)` and `len()`: the kNN
+ColumnarLookupTable and get-catalog's CatalogTable.
+"""
+import numbers
+import threading
+
+import numpy as np
+
+# Columns the frontend filters kNN results on; their indexes are built with the lookup table
+# (columns a table does not have, currently precio_mean, are skipped).
+FILTER_COLUMNS = ["precio_mean", "ram_memoria_gb", "procesador_tipo", "pantalla_tecnologia"]
+
+
+class _NumericIndex:
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        order = np.argsort(values, kind="stable")  # NaNs sort last and are left out
+        self.rows = order[:int(np.count_nonzero(~np.isnan(values)))]
+        self.sorted_values = values[self.rows]
+
+    def range_rows(self, low=None, high=None):
+        start = 0 if low is None else int(np.searchsorted(self.sorted_values, low, side="left"))
+        stop = len(self.sorted_values) if high is None else int(np.searchsorted(self.sorted_values, high, side="right"))
+        return self.rows[start:max(start, stop)]
+
+
+class _CategoryIndex:
+    def __init__(self, codes, dictionary):
+        codes = np.asarray(codes)
+        self.rows = np.argsort(codes, kind="stable")
+        # Row ids of code c are rows[offsets[c]:offsets[c + 1]]; missing values (-1) come first.
+        self.offsets = np.searchsorted(codes[self.rows], np.arange(len(dictionary) + 1), side="left")
+        self.codes = {value: code for code, value in enumerate(dictionary)}
+
+    def value_rows(self, values):
+        codes = [self.codes[value] for value in values if value in self.codes]
+        if not codes:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([self.rows[self.offsets[code]:self.offsets[code + 1]] for code in codes])
+
+
+class RowFilterIndex:
+    """Per-column indexes over a columnar table, evaluated into row masks."""
+
+    def __init__(self, lookup_table, columns=FILTER_COLUMNS):
+        self.lookup_table = lookup_table
+        self.n_rows = len(lookup_table)
+        self._lock = threading.Lock()
+        self._indexes = {}
+        for column in columns:
+            if column in lookup_table.columns:
+                self._index(column)
+
+    def _index(self, column):
+        index = self._indexes.get(column)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(column)
+                if index is None:
+                    if self.lookup_table.is_numeric(column):
+                        index = _NumericIndex(self.lookup_table.column(column))
+                    else:
+                        index = _CategoryIndex(self.lookup_table.column(column), self.lookup_table.dictionary(column))
+                    self._indexes[column] = index
+        return index
+
+    def _rows(self, column, spec):
+        if column not in self.lookup_table.columns:
+            raise ValueError(f'Cannot filter on unknown column "{column}".')
+        index = self._index(column)
+        if isinstance(index, _NumericIndex):
+            if isinstance(spec, dict):
+                unknown = set(spec) - {"min", "max"}
+                low, high = spec.get("min"), spec.get("max")
+                if unknown or not all(bound is None or _is_number(bound) for bound in (low, high)):
+                    raise ValueError(f'Filter on "{column}" must be {{"min": number, "max": number}}.')
+                return index.range_rows(low, high)
+            if _is_number(spec):
+                return index.range_rows(spec, spec)
+            raise ValueError(f'Filter on "{column}" must be {{"min": number, "max": number}}.')
+        values = spec if isinstance(spec, list) else [spec]
+        if not values or not all(isinstance(value, str) for value in values):
+            raise ValueError(f'Filter on "{column}" must be a string or a non-empty list of strings.')
+        return index.value_rows(values)
+
+    def column_mask(self, column, spec):
+        """Boolean mask over the rows matching one column's predicate. Raises ValueError if malformed."""
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self._rows(column, spec)] = True
+        return mask
+
+    def allowed_rows(self, filters):
+        """
+        Boolean mask over the lookup rows passing every filter, or None when there are no
+        filters. Raises ValueError for unknown columns or malformed predicates.
+        """
+        if not filters:
+            return None
+        if not isinstance(filters, dict):
+            raise ValueError('"filters" must be a dictionary of column predicates.')
+        allowed = None
+        for column, spec in filters.items():
+            mask = self.column_mask(column, spec)
+            allowed = mask if allowed is None else allowed & mask
+        return allowed
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
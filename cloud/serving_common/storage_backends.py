@@ -0,0 +1,202 @@
+# cloud/serving_common/storage_backends.py
+"""
+Storage backends the services load their artifacts from.
+
+The backend is picked by configuration (see get_storage_backend):
+    STORAGE_BACKEND=gcs     (default) the GCS bucket configured by the service
+    STORAGE_BACKEND=local   files under STORAGE_LOCAL_ROOT (blob name = relative path)
+    STORAGE_BACKEND=memory  the process-wide IN_MEMORY_STORE, filled by the caller
+
+With STORAGE_LOCAL_FLAT=true the local backend resolves blobs by file name only, which
+serves the copies committed next to each main.py (and under local_work/piplines)
+without recreating the bucket's directory layout.
+
+Every backend exposes the same small interface used by the artifact cache:
+fingerprint(name), download(name, dest_path, fingerprint=None), read_bytes(name) and
+describe(name). A download given a fingerprint writes exactly that version, or raises
+ArtifactChangedError if the artifact was replaced since; without one, it writes a single
+consistent version.
+"""
+import hashlib
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+
+
+class ArtifactChangedError(Exception):
+    """The artifact was replaced between reading its fingerprint and downloading it."""
+
+
+class StorageBackend(ABC):
+    @abstractmethod
+    def fingerprint(self, name):
+        """Cheap version identifier for `name`; raises FileNotFoundError if it does not exist."""
+
+    @abstractmethod
+    def download(self, name, dest_path, fingerprint=None):
+        """Writes `name` to dest_path (that version if `fingerprint` is given)."""
+
+    @abstractmethod
+    def read_bytes(self, name):
+        """Contents of `name`; raises FileNotFoundError if it does not exist."""
+
+    def describe(self, name):
+        return name
+
+
+class GCSBackend(StorageBackend):
+    """Reads artifacts from a GCS bucket."""
+
+    def __init__(self, bucket_name, client=None):
+        self.bucket_name = bucket_name
+        self._client = client
+        self._client_lock = threading.Lock()
+
+    def _bucket(self):
+        with self._client_lock:
+            if self._client is None:
+                from google.cloud import storage
+                self._client = storage.Client()
+        return self._client.bucket(self.bucket_name)
+
+    def _not_found(self, name):
+        return FileNotFoundError(f"Blob {name} not found in bucket {self.bucket_name}")
+
+    def fingerprint(self, name):
+        # Metadata-only request.
+        blob = self._bucket().get_blob(name)
+        if blob is None:
+            raise self._not_found(name)
+        return f"{blob.generation}-{blob.md5_hash}"
+
+    def download(self, name, dest_path, fingerprint=None):
+        from google.api_core.exceptions import NotFound
+        bucket = self._bucket()
+        if fingerprint is None:
+            # Downloaded through the blob object whose metadata was read, so the bytes
+            # are those of that generation even if the blob is overwritten meanwhile.
+            blob = bucket.get_blob(name)
+            if blob is None:
+                raise self._not_found(name)
+        else:
+            blob = bucket.blob(name, generation=int(fingerprint.split("-", 1)[0]))
+        try:
+            blob.download_to_filename(dest_path)
+        except NotFound:
+            # The pinned generation is gone: either the blob was deleted or overwritten.
+            if bucket.get_blob(name) is None:
+                raise self._not_found(name)
+            raise ArtifactChangedError(f"{self.describe(name)} changed during download")
+
+    def read_bytes(self, name):
+        from google.api_core.exceptions import NotFound
+        try:
+            return self._bucket().blob(name).download_as_bytes()
+        except NotFound:
+            raise self._not_found(name)
+
+    def describe(self, name):
+        return f"gs://{self.bucket_name}/{name}"
+
+
+class LocalFSBackend(StorageBackend):
+    """Reads artifacts from a local directory; stands in for GCS without credentials or network."""
+
+    def __init__(self, root, flat=False):
+        self.root = root
+        self.flat = flat
+
+    def _path(self, name):
+        if self.flat:
+            return os.path.join(self.root, os.path.basename(name))
+        return os.path.join(self.root, name)
+
+    def fingerprint(self, name):
+        try:
+            st = os.stat(self._path(name))
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Artifact {name} not found in {self.root}")
+        return f"{st.st_mtime_ns}-{st.st_size}"
+
+    def download(self, name, dest_path, fingerprint=None):
+        before = self.fingerprint(name)
+        try:
+            shutil.copyfile(self._path(name), dest_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Artifact {name} not found in {self.root}")
+        # A file rewritten during the copy (or since `fingerprint` was read) is not cached.
+        if self.fingerprint(name) != before or fingerprint not in (None, before):
+            raise ArtifactChangedError(f"{self._path(name)} changed during download")
+
+    def read_bytes(self, name):
+        try:
+            with open(self._path(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Artifact {name} not found in {self.root}")
+
+    def describe(self, name):
+        return self._path(name)
+
+
+class InMemoryBackend(StorageBackend):
+    """Dict-backed store; useful to exercise caching and prefetching deterministically."""
+
+    def __init__(self, objects=None):
+        self._lock = threading.Lock()
+        self._objects = {}
+        for name, data in (objects or {}).items():
+            self.put(name, data)
+
+    def put(self, name, data):
+        with self._lock:
+            self._objects[name] = bytes(data)
+
+    def put_file(self, name, path):
+        with open(path, "rb") as f:
+            self.put(name, f.read())
+
+    def delete(self, name):
+        with self._lock:
+            self._objects.pop(name, None)
+
+    def read_bytes(self, name):
+        with self._lock:
+            data = self._objects.get(name)
+        if data is None:
+            raise FileNotFoundError(f"Artifact {name} not found in the in-memory store")
+        return data
+
+    def fingerprint(self, name):
+        return hashlib.md5(self.read_bytes(name)).hexdigest()
+
+    def download(self, name, dest_path, fingerprint=None):
+        data = self.read_bytes(name)
+        if fingerprint is not None and hashlib.md5(data).hexdigest() != fingerprint:
+            raise ArtifactChangedError(f"memory://{name} changed during download")
+        with open(dest_path, "wb") as f:
+            f.write(data)
+
+    def describe(self, name):
+        return f"memory://{name}"
+
+
+# Shared store used when STORAGE_BACKEND=memory.
+IN_MEMORY_STORE = InMemoryBackend()
+
+
+def get_storage_backend(bucket_name):
+    """Backend selected by STORAGE_BACKEND (gcs | local | memory)."""
+    backend = os.environ.get("STORAGE_BACKEND", "gcs").lower()
+    if backend == "gcs":
+        return GCSBackend(bucket_name)
+    if backend == "local":
+        root = os.environ.get("STORAGE_LOCAL_ROOT")
+        if not root:
+            raise ValueError("STORAGE_BACKEND=local requires STORAGE_LOCAL_ROOT.")
+        flat = os.environ.get("STORAGE_LOCAL_FLAT", "false").lower() in ("1", "true", "yes")
+        return LocalFSBackend(root, flat=flat)
+    if backend == "memory":
+        return IN_MEMORY_STORE
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend!r}. Expected gcs, local or memory.")
@@ -0,0 +1,122 @@
+# cloud/serving_common/structured_logging.py
+"""
+Structured, level-gated logging for the services.
+
+configure_logging() installs one stdout handler that writes a JSON object per line,
+which Cloud Logging parses into severity + jsonPayload:
+    {"severity": "INFO", "message": "...", "logger": "price", "device_type": "laptop", ...}
+
+Verbose diagnostics are cheap unless enabled:
+  - LOG_LEVEL (default INFO) gates everything; DEBUG records are dropped before any
+    message formatting happens.
+  - Arguments are formatted lazily (logger.debug("payload: %s", LazyJSON(payload))), so
+    json.dumps / repr only run when the record is actually emitted.
+  - LOG_DEBUG_SAMPLE_RATE (default 1.0) emits DEBUG records for that fraction of requests
+    only. The decision is made once per request in begin_request(), so a sampled request
+    is logged completely.
+
+Structured fields are passed as extra={"fields": {...}} (see log_fields).
+LOG_FORMAT=text switches to plain lines for local runs.
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+
+_debug_sampled = contextvars.ContextVar("debug_sampled", default=True)
+
+
+class LazyJSON:
+    """Defers json.dumps until the log record is formatted."""
+
+    __slots__ = ("value", "indent")
+
+    def __init__(self, value, indent=None):
+        self.value = value
+        self.indent = indent
+
+    def __str__(self):
+        value = self.value
+        if hasattr(value, "items") and not isinstance(value, dict):
+            value = dict(value.items())  # e.g. request headers
+        try:
+            return json.dumps(value, indent=self.indent, default=str)
+        except (TypeError, ValueError):
+            return repr(self.value)
+
+
+def log_fields(**fields):
+    """`extra` argument attaching structured fields to a record: logger.info(msg, **log_fields(k=v))."""
+    return {"extra": {"fields": fields}}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "severity": record.levelname,
+            "message": record.getMessage(),
+            "logger": record.name,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class DebugSampler(logging.Filter):
+    """Drops DEBUG records of requests that were not selected by begin_request()."""
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or _debug_sampled.get()
+
+
+def begin_request():
+    """Decides whether this request's DEBUG records are emitted. Returns the decision."""
+    sampled = LOG_DEBUG_SAMPLE_RATE >= 1.0 or random.random() < LOG_DEBUG_SAMPLE_RATE
+    _debug_sampled.set(sampled)
+    return sampled
+
+
+_configured = False
+
+
+def configure_logging(level=None):
+    """Installs the structured stdout handler on the root logger (once per process)."""
+    global _configured
+    root = logging.getLogger()
+    root.setLevel(level or LOG_LEVEL)
+    if _configured:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+    handler.addFilter(DebugSampler())
+    root.addHandler(handler)
+    _configured = True
+
+
+def get_logger(name):
+    """Logger for a service module; configures the process-wide handler on first use."""
+    configure_logging()
+    return logging.getLogger(name)
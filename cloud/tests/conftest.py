@@ -0,0 +1,8 @@
+# cloud/tests/conftest.py
+import os
+import sys
+
+# The services import serving_common from cloud/ (see each main.py).
+_CLOUD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _CLOUD_DIR not in sys.path:
+    sys.path.append(_CLOUD_DIR)
@@ -0,0 +1,183 @@
+# cloud/tests/test_artifact_cache.py
+"""ArtifactCache against local stand-ins for the GCS bucket (serving_common.storage_backends)."""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from serving_common.artifact_cache import ArtifactCache
+from serving_common.storage_backends import (ArtifactChangedError, GCSBackend, InMemoryBackend, LocalFSBackend,
+                                             StorageBackend)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class CountingBackend(InMemoryBackend):
+    """In-memory store that counts downloads and can make them slow."""
+
+    def __init__(self, objects=None, delay=0.0):
+        super().__init__(objects)
+        self.delay = delay
+        self.downloads = []
+
+    def download(self, name, dest_path, fingerprint=None):
+        self.downloads.append(name)
+        time.sleep(self.delay)
+        super().download(name, dest_path, fingerprint=fingerprint)
+
+
+@pytest.fixture
+def bucket_dir(tmp_path):
+    root = tmp_path / "bucket"
+    _write(str(root / "models" / "model.joblib"), b"version 1")
+    return root
+
+
+def test_fetch_hits_cached_copy(bucket_dir, tmp_path):
+    cache = ArtifactCache(LocalFSBackend(str(bucket_dir)), cache_dir=str(tmp_path / "cache"))
+
+    first_path, first_fingerprint = cache.fetch("models/model.joblib")
+    second_path, second_fingerprint = cache.fetch("models/model.joblib")
+
+    assert (first_path, first_fingerprint) == (second_path, second_fingerprint)
+    assert _read(second_path) == b"version 1"
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_fetch_revalidates_after_content_change(bucket_dir, tmp_path):
+    cache = ArtifactCache(LocalFSBackend(str(bucket_dir)), cache_dir=str(tmp_path / "cache"))
+    old_path, old_fingerprint = cache.fetch("models/model.joblib")
+
+    blob_path = str(bucket_dir / "models" / "model.joblib")
+    _write(blob_path, b"version 2, longer")
+    os.utime(blob_path, ns=(time.time_ns() + 10**9,) * 2)
+    new_path, new_fingerprint = cache.fetch("models/model.joblib")
+
+    assert new_fingerprint != old_fingerprint
+    assert new_path != old_path
+    assert _read(new_path) == b"version 2, longer"
+    assert cache.stats() == {"hits": 0, "misses": 2}
+
+
+def test_fetch_directory_hit_and_revalidation(tmp_path):
+    backend = InMemoryBackend({"index/meta.json": b'{"v": 1}', "index/vectors.npy": b"v1 vectors"})
+    cache = ArtifactCache(backend, cache_dir=str(tmp_path / "cache"))
+
+    def list_files(marker_path):
+        return ["vectors.npy"]
+
+    first_dir, first_fingerprint = cache.fetch_directory("index/", "meta.json", list_files)
+    assert cache.fetch_directory("index/", "meta.json", list_files) == (first_dir, first_fingerprint)
+    assert _read(os.path.join(first_dir, "vectors.npy")) == b"v1 vectors"
+
+    # Publishers upload the files first and the marker last.
+    backend.put("index/vectors.npy", b"v2 vectors")
+    backend.put("index/meta.json", b'{"v": 2}')
+    second_dir, second_fingerprint = cache.fetch_directory("index/", "meta.json", list_files)
+
+    assert second_fingerprint != first_fingerprint
+    assert _read(os.path.join(second_dir, "vectors.npy")) == b"v2 vectors"
+    assert cache.stats() == {"hits": 1, "misses": 2}
+
+
+def test_fetch_directory_missing_marker(tmp_path):
+    cache = ArtifactCache(InMemoryBackend(), cache_dir=str(tmp_path / "cache"))
+    with pytest.raises(FileNotFoundError):
+        cache.fetch_directory("index/", "meta.json", lambda marker_path: [])
+
+
+def test_concurrent_fetches_share_one_entry(tmp_path):
+    backend = CountingBackend({"models/model.joblib": b"model bytes"}, delay=0.05)
+    cache = ArtifactCache(backend, cache_dir=str(tmp_path / "cache"))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: cache.fetch("models/model.joblib"), range(8)))
+
+    assert len(set(results)) == 1
+    assert backend.downloads == ["models/model.joblib"]
+    local_path, fingerprint = results[0]
+    assert _read(local_path) == b"model bytes"
+    assert os.listdir(os.path.dirname(os.path.dirname(local_path))) == [os.path.basename(os.path.dirname(local_path))]
+
+
+def test_artifact_replaced_during_download_is_not_cached_under_old_fingerprint(tmp_path):
+    class OverwrittenOnce(InMemoryBackend):
+        def download(self, name, dest_path, fingerprint=None):
+            if not getattr(self, "overwritten", False):
+                self.overwritten = True
+                self.put(name, b"version 2")  # lands between fingerprint() and the download
+            super().download(name, dest_path, fingerprint=fingerprint)
+
+    backend = OverwrittenOnce({"models/model.joblib": b"version 1"})
+    cache = ArtifactCache(backend, cache_dir=str(tmp_path / "cache"))
+
+    local_path, fingerprint = cache.fetch("models/model.joblib")
+
+    assert fingerprint == backend.fingerprint("models/model.joblib")
+    assert _read(local_path) == b"version 2"
+
+
+def test_gcs_download_is_pinned_to_the_fingerprinted_generation(tmp_path):
+    class FakeBlob:
+        def __init__(self, bucket, name, generation):
+            self.bucket, self.name, self.generation = bucket, name, generation
+            self.md5_hash = f"md5-of-{generation}"
+
+        def download_to_filename(self, dest_path):
+            data = self.bucket.generations.get(self.generation)
+            if data is None:
+                from google.api_core.exceptions import NotFound
+                raise NotFound(self.name)
+            _write(dest_path, data)
+
+    class FakeBucket:
+        def __init__(self):
+            self.generations = {1: b"generation 1"}
+            self.live = 1
+
+        def get_blob(self, name):
+            return FakeBlob(self, name, self.live)
+
+        def blob(self, name, generation=None):
+            return FakeBlob(self, name, self.live if generation is None else generation)
+
+    class FakeClient:
+        def __init__(self, bucket):
+            self._bucket = bucket
+
+        def bucket(self, name):
+            return self._bucket
+
+    pytest.importorskip("google.api_core")
+    bucket = FakeBucket()
+    backend = GCSBackend("test-bucket", client=FakeClient(bucket))
+    fingerprint = backend.fingerprint("model.joblib")
+
+    # Overwritten after the fingerprint was read; the old generation is still retained.
+    bucket.generations[2], bucket.live = b"generation 2", 2
+    backend.download("model.joblib", str(tmp_path / "pinned"), fingerprint=fingerprint)
+    assert _read(str(tmp_path / "pinned")) == b"generation 1"
+
+    # Once the old generation is gone, the download fails instead of returning newer bytes.
+    del bucket.generations[1]
+    with pytest.raises(ArtifactChangedError):
+        backend.download("model.joblib", str(tmp_path / "gone"), fingerprint=fingerprint)
+
+
+def test_incomplete_backend_fails_at_construction():
+    class FingerprintOnly(StorageBackend):
+        def fingerprint(self, name):
+            return "1"
+
+    with pytest.raises(TypeError):
+        FingerprintOnly()
@@ -0,0 +1,75 @@
+# cloud/tests/test_catalog_index.py
+"""Facet requests of the catalog service (cloud/get-catalog/catalog_index.py)."""
+import os
+import sys
+
+import pytest
+
+_CATALOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "get-catalog")
+if _CATALOG_DIR not in sys.path:
+    sys.path.append(_CATALOG_DIR)
+
+from catalog_index import FACET_FIELDS, CatalogIndex, CatalogTable  # noqa: E402
+
+
+@pytest.fixture
+def index():
+    rows = [
+        {"titulo": "Zenbook 14", "brand": "ASUS", "precio_mean": "900", "procesador": "Intel Core i7"},
+        {"titulo": "Zenbook 14", "brand": "ASUS", "precio_mean": "950", "procesador": "Intel Core i5"},
+        {"titulo": "MacBook Air", "brand": "Apple", "precio_mean": "1200", "procesador": "Apple M3"},
+        {"titulo": "IdeaPad 5", "brand": "Lenovo", "precio_mean": "600", "procesador": "Intel Core i5"},
+        {"titulo": "", "brand": "Lenovo", "precio_mean": "", "procesador": ""},
+    ]
+    return CatalogIndex(CatalogTable.from_rows(rows))
+
+
+def test_default_facets(index):
+    result = index.query(page_size=0)
+    assert list(result["facets"]) == FACET_FIELDS
+    assert result["facets"]["brand"] == [
+        {"value": "ASUS", "count": 2}, {"value": "Lenovo", "count": 2}, {"value": "Apple", "count": 1},
+    ]
+    assert result["ranges"]["price"] == {"min": 600.0, "max": 1200.0}
+
+
+def test_requested_facets_with_limit(index):
+    result = index.query(page_size=0, facets=["title"], facet_limit=2, filters={"price": {"min": 700}})
+    # Ties are ordered alphabetically; missing titles are not counted.
+    assert result["facets"] == {"title": [{"value": "Zenbook 14", "count": 2}, {"value": "MacBook Air", "count": 1}]}
+    assert result["total"] == 3
+
+
+def test_no_facets(index):
+    result = index.query(page_size=0, facets=False)
+    assert "facets" not in result and "ranges" not in result
+
+
+@pytest.mark.parametrize("facets, facet_limit", [
+    (["price"], None), (["nope"], None), ("brand", None), ([1], None), (["brand"], 0),
+])
+def test_invalid_facets(index, facets, facet_limit):
+    with pytest.raises(ValueError):
+        index.query(facets=facets, facet_limit=facet_limit)
+
+
+def test_histograms(index):
+    result = index.query(page_size=0, facets=False, histograms={"price": 500})
+    # Aligned to multiples of the width; the row without a price is not counted.
+    assert result["histograms"] == {"price": [
+        {"min": 500.0, "max": 1000.0, "count": 3}, {"min": 1000.0, "max": 1500.0, "count": 1},
+    ]}
+    # Over the matching rows, including the histogram field's own filter.
+    filtered = index.query(page_size=0, histograms={"price": 250}, filters={"brand": "ASUS", "price": {"min": 940}})
+    assert filtered["histograms"] == {"price": [{"min": 750.0, "max": 1000.0, "count": 1}]}
+    assert index.query(filters={"brand": "Dell"}, histograms={"price": 100})["histograms"] == {"price": []}
+    assert "histograms" not in index.query(page_size=0)
+
+
+@pytest.mark.parametrize("histograms", [
+    [500], {"brand": 10}, {"nope": 10}, {"price": 0}, {"price": -5}, {"price": True}, {"price": "500"},
+    {"price": float("inf")}, {"price": 0.01},
+])
+def test_invalid_histograms(index, histograms):
+    with pytest.raises(ValueError):
+        index.query(histograms=histograms)
@@ -0,0 +1,47 @@
+# cloud/tests/test_compiled_model.py
+"""The numpy-only CompiledPipeline must score exactly like the pickled pipeline it was exported from."""
+import math
+import os
+import sys
+
+import numpy as np
+import pytest
+
+_CLOUD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_PRICE_DIR = os.path.join(_CLOUD_DIR, "get-price-prediction")
+_KNN_DIR = os.path.join(_CLOUD_DIR, "get-k-similar-products")
+if _PRICE_DIR not in sys.path:
+    sys.path.append(_PRICE_DIR)
+
+joblib = pytest.importorskip("joblib")
+pd = pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+pytest.importorskip("lightgbm")
+
+from compiled_model import _random_rows, export_pipeline  # noqa: E402
+from serving_common.request_decoder import RequestDecoder  # noqa: E402
+
+ATOL = 1e-9
+
+
+def _lookup_rows(device_type, columns):
+    """The catalog configurations of the kNN lookup CSV, as feature_values dicts (missing values as None)."""
+    df = pd.read_csv(os.path.join(_KNN_DIR, f"X_train_original_for_knn_lookup_{device_type}.csv"))
+    df = df.reindex(columns=columns)
+    return [{column: (None if isinstance(value, float) and math.isnan(value) else value)
+             for column, value in row.items()} for row in df.to_dict("records")]
+
+
+@pytest.mark.parametrize("device_type", ["laptop", "desktop"])
+def test_compiled_pipeline_matches_pipeline(device_type, tmp_path):
+    pipeline = joblib.load(os.path.join(_PRICE_DIR, f"{device_type}_model_pipeline.joblib"))
+    compiled = export_pipeline(pipeline, str(tmp_path / f"{device_type}_model_compiled.npz"))
+
+    rows = _lookup_rows(device_type, compiled.input_columns) + _random_rows(compiled, 500, seed=0)
+    # The service feeds the pipeline through RequestDecoder, so the reference does too.
+    decoder = RequestDecoder.from_pipeline(pipeline, compiled.input_columns)
+    expected = pipeline.predict(decoder.decode_many(rows))
+    actual = compiled.predict(rows)
+
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=ATOL)
@@ -0,0 +1,38 @@
+# cloud/tests/test_json_response.py
+import json
+
+import numpy as np
+import pytest
+
+from serving_common import json_response
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def encoder(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(json_response, "orjson", None)
+    elif json_response.orjson is None:
+        pytest.skip("orjson is not installed")
+    return request.param
+
+
+def test_records_json_matches_records(encoder):
+    columns = {
+        "similarity_distance": np.array([0.123456, np.nan, np.inf]),
+        "id": np.array([1, 2, 3], dtype=np.int64),
+        "titulo": np.array(['Laptop "Pro" 14, 100%', None, "Ñandú"], dtype=object),
+        "mixed": np.array([1.5, float("-inf"), "x"], dtype=object),
+    }
+
+    body = json_response.records_json(columns, "similar_products", decimals=4)
+
+    assert json.loads(body) == {"similar_products": [
+        {"similarity_distance": 0.1235, "id": 1, "titulo": 'Laptop "Pro" 14, 100%', "mixed": 1.5},
+        {"similarity_distance": None, "id": 2, "titulo": None, "mixed": None},
+        {"similarity_distance": None, "id": 3, "titulo": "Ñandú", "mixed": "x"},
+    ]}
+
+
+def test_records_json_empty(encoder):
+    body = json_response.records_json({"id": np.array([], dtype=np.int64)}, "items")
+    assert json.loads(body) == {"items": []}
@@ -0,0 +1,91 @@
+# cloud/tests/test_knn_exclude_self.py
+"""Batch kNN requests with exclude_self never return the query product's own catalog rows."""
+import importlib.util
+import json
+import os
+import sys
+
+import pytest
+
+_CLOUD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_KNN_DIR = os.path.join(_CLOUD_DIR, "get-k-similar-products")
+if _KNN_DIR not in sys.path:
+    sys.path.append(_KNN_DIR)
+
+joblib = pytest.importorskip("joblib")
+pd = pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+
+from serving_common.processor_family import fill_procesador_tipo, get_procesador_tipo  # noqa: E402
+
+
+class _Request:
+    method = "POST"
+    path = "/"
+    headers = {}
+    args = {}
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def get_json(self, silent=False):
+        return self.payload
+
+
+@pytest.fixture(scope="module", params=["laptop", "desktop"])
+def knn(request, tmp_path_factory):
+    """The kNN service with assets built from the repo's lookup CSV and preprocessor."""
+    device_type = request.param
+    os.environ.setdefault("WARMUP_ON_START", "false")
+    spec = importlib.util.spec_from_file_location("knn_main_under_test", os.path.join(_KNN_DIR, "main.py"))
+    knn_main = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(knn_main)
+
+    from lookup_table import ColumnarLookupTable
+    from neighbor_table import CatalogRows
+    from serving_common.row_filters import RowFilterIndex
+    from similarity_index import build_index, transform_rows
+
+    df = pd.read_csv(os.path.join(_KNN_DIR, f"X_train_original_for_knn_lookup_{device_type}.csv"))
+    preprocessor = joblib.load(os.path.join(_KNN_DIR, f"preprocessor_{device_type}_knn.joblib"))
+    index = build_index(transform_rows(preprocessor, fill_procesador_tipo(df.copy())), str(tmp_path_factory.mktemp("index")))
+    # A unique title per row makes the returned rows identifiable.
+    lookup_table = ColumnarLookupTable.from_dataframe(df.assign(titulo=[f"row-{row}" for row in range(len(df))]))
+    input_features = (knn_main.LAPTOP_PREPROCESSOR_INPUT_FEATURES if device_type == "laptop"
+                      else knn_main.DESKTOP_PREPROCESSOR_INPUT_FEATURES)
+    decoder = knn_main.RequestDecoder.from_pipeline(preprocessor, input_features)
+    knn_main.REGISTRY.swap(knn_main.registry_key(device_type), {
+        "preprocessor": preprocessor, "similarity_index": index, "nn_model": None,
+        "x_train_original": lookup_table, "row_filters": RowFilterIndex(lookup_table), "neighbor_table": None,
+        "catalog_rows": CatalogRows(lookup_table, decoder), "decoder": decoder, "version": "test",
+    })
+    yield knn_main, device_type, df
+    knn_main.REGISTRY.invalidate(knn_main.registry_key(device_type))
+
+
+def _returned_rows(response):
+    body, status = response[0], response[1]
+    assert status == 200, body
+    return [[int(product["titulo"][4:]) for product in result["similar_products"]] for result in json.loads(body)["results"]]
+
+
+def test_exclude_self_drops_own_rows(knn):
+    knn_main, device_type, df = knn
+    rows = list(range(0, len(df), 97))
+    queries = [{name: (None if pd.isna(value) else value) for name, value in df.iloc[row].items()} for row in rows]
+    catalog_rows = knn_main.ensure_models_loaded(device_type)["catalog_rows"]
+
+    kept = _returned_rows(knn_main.get_k_similar_products(_Request(
+        {"device_type": device_type, "k": 5, "queries": queries})))
+    excluded = _returned_rows(knn_main.get_k_similar_products(_Request(
+        {"device_type": device_type, "k": 5, "queries": queries, "exclude_self": True})))
+
+    # Without exclude_self the product itself is among its neighbors (not necessarily
+    # first: laptop rows store a vendor-prefixed procesador_tipo, requests derive one).
+    assert sum(row in returned for row, returned in zip(rows, kept)) > len(rows) // 2
+    for row, query, returned in zip(rows, queries, excluded):
+        # Keyed like the handler's queries, with procesador_tipo derived from procesador.
+        own_rows = set(catalog_rows.find_rows({**query, "procesador_tipo": get_procesador_tipo(query["procesador"])}).tolist())
+        assert row in own_rows
+        assert len(returned) == 5
+        assert not own_rows & set(returned)
@@ -0,0 +1,73 @@
+# cloud/tests/test_micro_batching.py
+"""MicroBatcher coalesces concurrent submits and isolates per-row errors."""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from serving_common.micro_batching import MicroBatcher
+
+N_ITEMS = 8
+
+
+def _submit_concurrently(batcher, key, items):
+    """Submits every item from its own thread; returns (result or exception) per item."""
+    def submit(item):
+        try:
+            return batcher.submit(key, item, timeout=5)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(len(items)) as pool:
+        return list(pool.map(submit, items))
+
+
+def _batcher(run_batch):
+    # The batch fills up long before the window closes, so all items share one call.
+    return MicroBatcher("test", run_batch, max_batch_size=N_ITEMS, max_wait_ms=2000, idle_seconds=1)
+
+
+def test_concurrent_submits_share_one_call():
+    batches = []
+
+    def run_batch(key, items):
+        batches.append((key, list(items)))
+        return [item * 10 for item in items]
+
+    results = _submit_concurrently(_batcher(run_batch), "laptop", list(range(N_ITEMS)))
+    assert results == [item * 10 for item in range(N_ITEMS)]
+    assert len(batches) == 1
+    assert batches[0][0] == "laptop" and sorted(batches[0][1]) == list(range(N_ITEMS))
+
+
+def test_row_errors_stay_with_their_row():
+    def run_batch(key, items):
+        return [ValueError(f"bad row {item}") if item % 3 == 0 else item * 10 for item in items]
+
+    results = _submit_concurrently(_batcher(run_batch), "laptop", list(range(N_ITEMS)))
+    for item, result in enumerate(results):
+        if item % 3 == 0:
+            assert isinstance(result, ValueError) and str(result) == f"bad row {item}"
+        else:
+            assert result == item * 10
+
+
+@pytest.mark.parametrize("run_batch, error", [
+    (lambda key, items: 1 / 0, ZeroDivisionError),
+    (lambda key, items: list(items)[1:], RuntimeError),
+])
+def test_batch_failure_fails_every_item(run_batch, error):
+    results = _submit_concurrently(_batcher(run_batch), "laptop", list(range(N_ITEMS)))
+    assert all(isinstance(result, error) for result in results)
+
+
+def test_keys_are_batched_separately():
+    batches = []
+
+    def run_batch(key, items):
+        batches.append(key)
+        return [(key, item) for item in items]
+
+    batcher = MicroBatcher("test", run_batch, max_batch_size=4, max_wait_ms=0, idle_seconds=0.2)
+    assert batcher.submit("laptop", 1, timeout=5) == ("laptop", 1)
+    assert batcher.submit("desktop", 2, timeout=5) == ("desktop", 2)
+    assert batches == ["laptop", "desktop"]
@@ -0,0 +1,106 @@
+# cloud/tests/test_model_registry.py
+"""Single-flight loading and reload swaps of serving_common.model_registry under threads."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from serving_common.model_registry import ModelRegistry, Versioned
+
+N_THREADS = 16
+
+
+def _gated_loader(value):
+    """(loader, calls, release): the loader blocks until release is set and counts its calls."""
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(threading.get_ident())
+        assert release.wait(5)
+        if isinstance(value, BaseException):
+            raise value
+        return value
+
+    return loader, calls, release
+
+
+def _submit_all(pool, fn):
+    """Starts N_THREADS calls of fn and returns their futures once all are waiting on the load."""
+    started = threading.Barrier(N_THREADS + 1)
+
+    def call():
+        started.wait(5)
+        return fn()
+
+    futures = [pool.submit(call) for _ in range(N_THREADS)]
+    started.wait(5)
+    time.sleep(0.2)  # let every caller join the in-flight load
+    return futures
+
+
+def test_concurrent_gets_share_one_load():
+    registry = ModelRegistry()
+    value = object()
+    loader, calls, release = _gated_loader(Versioned(value, "gen-1"))
+    with ThreadPoolExecutor(N_THREADS) as pool:
+        futures = _submit_all(pool, lambda: registry.get("laptop", loader, timeout=5))
+        release.set()
+        results = [future.result(5) for future in futures]
+    assert len(calls) == 1
+    assert all(result is value for result in results)
+    assert registry.version("laptop") == "gen-1"
+    # Loaded: later calls never touch the loader.
+    assert registry.get("laptop", lambda: pytest.fail("loaded again")) is value
+
+
+def test_failed_load_reaches_every_waiter_and_is_retried():
+    registry = ModelRegistry()
+    loader, calls, release = _gated_loader(OSError("bucket unavailable"))
+    with ThreadPoolExecutor(N_THREADS) as pool:
+        futures = _submit_all(pool, lambda: registry.get("laptop", loader, timeout=5))
+        release.set()
+        for future in futures:
+            with pytest.raises(OSError, match="bucket unavailable"):
+                future.result(5)
+    assert len(calls) == 1
+    assert registry.peek("laptop") is None
+    assert registry.get("laptop", lambda: "recovered") == "recovered"
+
+
+def test_reload_serves_old_value_until_swap():
+    registry = ModelRegistry()
+    registry.swap("laptop", "old", version="gen-1")
+    swaps = []
+    registry.add_listener(lambda key, old, new: swaps.append((key, old, new)))
+    loader, calls, release = _gated_loader(Versioned("new", "gen-2"))
+    with ThreadPoolExecutor(N_THREADS) as pool, ThreadPoolExecutor(N_THREADS) as reader_pool:
+        futures = _submit_all(pool, lambda: registry.reload("laptop", loader, timeout=5))
+        # Readers keep getting the current value while the reload is in flight.
+        readers = [reader_pool.submit(registry.get, "laptop", lambda: pytest.fail("loaded again")) for _ in range(N_THREADS)]
+        assert [reader.result(5) for reader in readers] == ["old"] * N_THREADS
+        assert registry.peek("laptop") == "old" and registry.version("laptop") == "gen-1"
+        release.set()
+        assert [future.result(5) for future in futures] == ["new"] * N_THREADS
+    assert len(calls) == 1
+    assert registry.get("laptop", lambda: pytest.fail("loaded again")) == "new"
+    assert registry.snapshot() == {"laptop": "gen-2"}
+    assert swaps == [("laptop", "gen-1", "gen-2")]
+
+
+def test_failed_reload_keeps_old_value():
+    registry = ModelRegistry()
+    registry.swap("laptop", "old", version="gen-1")
+    with pytest.raises(ValueError):
+        registry.reload("laptop", lambda: (_ for _ in ()).throw(ValueError("corrupt artifact")))
+    assert registry.peek("laptop") == "old" and registry.version("laptop") == "gen-1"
+
+
+def test_swap_compare_and_set():
+    registry = ModelRegistry()
+    assert registry.swap("laptop", "a")
+    assert registry.version("laptop") == 1
+    assert not registry.swap("laptop", "b", expected_version=2)
+    assert registry.swap("laptop", "b", expected_version=1)
+    assert registry.peek("laptop") == "b" and registry.version("laptop") == 2
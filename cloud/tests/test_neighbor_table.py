@@ -0,0 +1,101 @@
+# cloud/tests/test_neighbor_table.py
+"""A neighbor-table hit returns the same neighbors as the live similarity-index search."""
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pytest
+
+_KNN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "get-k-similar-products")
+if _KNN_DIR not in sys.path:
+    sys.path.append(_KNN_DIR)
+
+joblib = pytest.importorskip("joblib")
+pd = pytest.importorskip("pandas")
+neighbors_module = pytest.importorskip("sklearn.neighbors")
+
+from serving_common.processor_family import fill_procesador_tipo, get_procesador_tipo  # noqa: E402
+from serving_common.request_decoder import RequestDecoder  # noqa: E402
+
+N_ROWS, K = 800, 10
+
+
+@pytest.fixture(scope="module", params=["laptop", "desktop"])
+def catalog(request, tmp_path_factory):
+    """(table, index, vectors, decoder, preprocessor, df) over the first N_ROWS catalog rows."""
+    from neighbor_table import build_neighbor_table
+    from similarity_index import build_index, transform_rows
+
+    device_type = request.param
+    os.environ.setdefault("WARMUP_ON_START", "false")
+    spec = importlib.util.spec_from_file_location("knn_main_under_test", os.path.join(_KNN_DIR, "main.py"))
+    knn_main = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(knn_main)
+
+    df = pd.read_csv(os.path.join(_KNN_DIR, f"X_train_original_for_knn_lookup_{device_type}.csv")).head(N_ROWS)
+    preprocessor = joblib.load(os.path.join(_KNN_DIR, f"preprocessor_{device_type}_knn.joblib"))
+    vectors = transform_rows(preprocessor, fill_procesador_tipo(df.copy()))
+    tmp = tmp_path_factory.mktemp(device_type)
+    index = build_index(vectors, str(tmp / "index"))
+    nn_model_path = str(tmp / "nn_model.joblib")
+    joblib.dump(neighbors_module.NearestNeighbors(n_neighbors=K).fit(vectors), nn_model_path)
+    key_columns = (knn_main.LAPTOP_PREPROCESSOR_INPUT_FEATURES if device_type == "laptop"
+                   else knn_main.DESKTOP_PREPROCESSOR_INPUT_FEATURES)
+    table = build_neighbor_table(df, preprocessor, nn_model_path, str(tmp / "neighbors"), key_columns,
+                                 k=3 * K, workers=1)
+    decoder = RequestDecoder.from_pipeline(preprocessor, key_columns)
+    return table, index, vectors, decoder, preprocessor, df
+
+
+def _requests(df):
+    """Catalog rows as the service receives them, procesador_tipo derived from procesador."""
+    rows = [{name: (None if pd.isna(value) else value) for name, value in df.iloc[row].items()}
+            for row in range(0, len(df), 37)]
+    return [{**row, "procesador_tipo": get_procesador_tipo(row["procesador"])} for row in rows]
+
+
+def _query_vector(decoder, preprocessor, feature_values):
+    from similarity_index import to_dense_float32
+
+    return to_dense_float32(preprocessor.transform(decoder.decode_many([feature_values])))
+
+
+def _assert_same_neighbors(hit, live, query, vectors):
+    distances, ids = hit
+    live_distances, live_ids = live
+    assert len(ids) == K
+    np.testing.assert_allclose(distances, live_distances, rtol=0, atol=1e-4)
+    # Each returned row sits at the distance reported for it ...
+    exact = np.linalg.norm(vectors[ids].astype(np.float64) - query.astype(np.float64), axis=1)
+    np.testing.assert_allclose(distances, exact, rtol=0, atol=1e-4)
+    # ... and the rows agree with the live search wherever the distance is not tied (the
+    # last rank may tie with the first row left out).
+    gaps = np.diff(live_distances) > 1e-4
+    untied = np.r_[True, gaps] & np.r_[gaps, False]
+    np.testing.assert_array_equal(ids[untied], live_ids[untied])
+
+
+@pytest.mark.parametrize("fraction", [None, 0.3])
+def test_hit_equals_live_search(catalog, fraction):
+    table, index, vectors, decoder, preprocessor, df = catalog
+    allowed = None if fraction is None else np.random.default_rng(1).random(len(df)) < fraction
+    hits = 0
+    for feature_values in _requests(df):
+        hit = table.lookup(feature_values, K, allowed=allowed)
+        if hit is None:
+            continue  # the filter left too few stored neighbors; the service searches live
+        hits += 1
+        if allowed is not None:
+            assert allowed[hit[1]].all()
+        query = _query_vector(decoder, preprocessor, feature_values)
+        distances, ids = index.search(query, K, n_probe=index.n_lists, allowed=allowed)
+        _assert_same_neighbors(hit, (distances[0], ids[0]), query[0], vectors)
+    assert hits > 0
+
+
+def test_unknown_configuration_misses(catalog):
+    table, _, _, _, _, df = catalog
+    feature_values = _requests(df)[0]
+    assert table.lookup({**feature_values, "ram_memoria_gb": 12345}, K) is None
+    assert table.lookup(feature_values, table.k + 1) is None
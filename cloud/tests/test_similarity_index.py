@@ -0,0 +1,108 @@
+# cloud/tests/test_similarity_index.py
+"""SimilarityIndex searches must agree with a float64 brute-force scan."""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+_KNN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "get-k-similar-products")
+if _KNN_DIR not in sys.path:
+    sys.path.append(_KNN_DIR)
+
+from similarity_index import SimilarityIndex, append_to_index, build_index  # noqa: E402
+
+N_BASE, N_DELTA, DIM, K = 1500, 200, 24, 10
+
+
+@pytest.fixture(scope="module")
+def catalog(tmp_path_factory):
+    """(index, vectors): base vectors plus an appended delta segment, with duplicated rows."""
+    rng = np.random.default_rng(7)
+    vectors = (rng.normal(size=(N_BASE + N_DELTA, DIM)) * 3 + 10).astype(np.float32)
+    vectors[100:105] = vectors[0]  # identical configurations in the base lists
+    vectors[N_BASE + 5] = vectors[1]  # and one in the delta segment
+    index_dir = str(tmp_path_factory.mktemp("index"))
+    build_index(vectors[:N_BASE], index_dir)
+    index = append_to_index(index_dir, vectors[N_BASE:], np.arange(N_BASE, N_BASE + N_DELTA))
+    return index, vectors
+
+
+def _brute_force(vectors, queries, k, allowed=None):
+    distances = np.linalg.norm(vectors[None].astype(np.float64) - queries[:, None].astype(np.float64), axis=2)
+    if allowed is not None:
+        distances[:, ~allowed] = np.inf
+    ids = np.broadcast_to(np.arange(len(vectors)), distances.shape)
+    order = np.lexsort((ids, distances), axis=1)[:, :k]
+    return np.take_along_axis(distances, order, axis=1), order
+
+
+def _queries(vectors):
+    rng = np.random.default_rng(11)
+    catalog_rows = vectors[[0, 1, 7, 500, N_BASE + 3, N_BASE + 150]]
+    novel = (rng.normal(size=(20, DIM)) * 3 + 10).astype(np.float32)
+    return np.concatenate([catalog_rows, novel])
+
+
+def test_exact_scan_matches_brute_force(catalog):
+    index, vectors = catalog
+    queries = _queries(vectors)
+    distances, ids = index.search(queries, K, n_probe=index.n_lists)
+    expected_distances, expected_ids = _brute_force(vectors, queries, K)
+    np.testing.assert_array_equal(ids, expected_ids)
+    np.testing.assert_allclose(distances, expected_distances, rtol=0, atol=1e-9)
+    # Catalog rows find themselves (and their duplicates) at exactly zero.
+    assert distances[0, :6].tolist() == [0.0] * 6
+    assert ids[0, :6].tolist() == [0, 100, 101, 102, 103, 104]
+    assert distances[1, :2].tolist() == [0.0, 0.0] and ids[1, :2].tolist() == [1, N_BASE + 5]
+
+
+@pytest.mark.parametrize("fraction", [None, 0.5])
+def test_probe_results_are_exact_distances(catalog, fraction):
+    index, vectors = catalog
+    queries = _queries(vectors)
+    allowed = None if fraction is None else np.random.default_rng(5).random(len(vectors)) < fraction
+    distances, ids = index.search(queries, K, n_probe=2, allowed=allowed)
+    assert (ids >= 0).all()
+    if allowed is not None:
+        assert allowed[ids].all()
+    exact = np.linalg.norm(vectors[ids].astype(np.float64) - queries[:, None].astype(np.float64), axis=2)
+    np.testing.assert_allclose(distances, exact, rtol=0, atol=1e-9)
+    assert (np.diff(distances, axis=1) >= 0).all()
+    # A probe never finds anything closer than the exact k nearest.
+    expected_distances, _ = _brute_force(vectors, queries, K, allowed)
+    assert (distances >= expected_distances - 1e-9).all()
+
+
+@pytest.mark.parametrize("fraction", [0.5, 0.02, 0.002])
+def test_filtered_search_matches_brute_force(catalog, fraction):
+    index, vectors = catalog
+    queries = _queries(vectors)
+    allowed = np.random.default_rng(3).random(len(vectors)) < fraction
+    distances, ids = index.search(queries, K, n_probe=index.n_lists, allowed=allowed)
+    expected_distances, expected_ids = _brute_force(vectors, queries, K, allowed)
+    n_allowed = int(allowed.sum())
+    if n_allowed < K:
+        # Padded with -1 / inf beyond the allowed items.
+        assert (ids[:, n_allowed:] == -1).all() and np.isinf(distances[:, n_allowed:]).all()
+        ids, distances = ids[:, :n_allowed], distances[:, :n_allowed]
+        expected_ids, expected_distances = expected_ids[:, :n_allowed], expected_distances[:, :n_allowed]
+    np.testing.assert_array_equal(ids, expected_ids)
+    np.testing.assert_allclose(distances, expected_distances, rtol=0, atol=1e-9)
+    assert allowed[ids].all()
+
+
+def test_load_round_trip(catalog):
+    index, vectors = catalog
+    reloaded = SimilarityIndex.load(index.index_dir, mmap=True)
+    assert len(reloaded) == N_BASE + N_DELTA
+    queries = _queries(vectors)
+    np.testing.assert_array_equal(reloaded.search(queries, K)[1], index.search(queries, K)[1])
+
+
+def test_non_finite_query_is_rejected(catalog):
+    index, vectors = catalog
+    query = vectors[:1].copy()
+    query[0, 3] = np.nan
+    with pytest.raises(ValueError):
+        index.search(query, K)
@@ -0,0 +1,264 @@
+# cloud/unified_server/app.py
+"""
+One ASGI app serving every Cloud Function of cloud/ from a single process.
+
+Self-hosted, the functions would each pay for an interpreter, the imports and their own
+copy of the resident models. Here the three main.py files are imported side by side and
+their handlers mounted unchanged, so requests and responses are exactly those of the
+deployed functions:
+
+    POST /get-price-prediction       get-price-prediction/main.py
+    POST /get-k-similar-products     get-k-similar-products/main.py
+    POST /get-catalog                get-catalog/main.py
+    GET  /<function>/metrics, /metrics
+                                     OpenMetrics text of the whole process
+    GET  /healthz                    200 once every model is loaded, else 503
+
+The services share everything that lives in serving_common: the model registry, the
+artifact cache (one storage client per bucket), the response cache, the micro-batchers'
+metrics and the metrics registry. All models are loaded at startup (SERVE_PRELOAD); with
+--wait-ready the server only starts accepting requests once they are in.
+
+Handlers are synchronous and CPU-bound, so each request is handed to a bounded thread
+pool (SERVE_WORKER_THREADS) and the event loop only does I/O. numpy, LightGBM and
+scikit-learn release the GIL in their heavy parts, and with MICRO_BATCH_ENABLED concurrent
+requests are scored together on top of that. A process pool would need a copy of every
+model per process, which is what this server is meant to avoid; for more cores, run
+more processes (--processes), each with its own registry.
+
+HTTP keep-alive is handled by uvicorn; --keep-alive sets how long idle connections stay
+open (a reverse proxy or load balancer in front should use a shorter idle timeout).
+
+Usage (from the repository root; needs starlette and uvicorn, see requirements.txt):
+    python cloud/unified_server/app.py --port 8080
+    python cloud/unified_server/app.py --port 8080 --wait-ready --worker-threads 8 --keep-alive 75
+    uvicorn app:app --app-dir cloud/unified_server --port 8080
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+
+_CLOUD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _CLOUD_DIR not in sys.path:
+    sys.path.append(_CLOUD_DIR)
+# The server decides when models load (SERVE_PRELOAD), not the import of each main.py.
+os.environ.setdefault("WARMUP_ON_START", "false")
+from serving_common.json_response import JSON_CONTENT_TYPE, dumps
+from serving_common.metrics import METRICS, OPENMETRICS_CONTENT_TYPE
+from serving_common.model_registry import REGISTRY
+from serving_common.structured_logging import get_logger
+
+logger = get_logger("unified_server")
+
+SERVE_WORKER_THREADS = int(os.environ.get("SERVE_WORKER_THREADS", str(min(32, (os.cpu_count() or 1) + 4))))
+SERVE_PRELOAD = os.environ.get("SERVE_PRELOAD", "true").lower() in ("1", "true", "yes")
+SERVE_WAIT_READY = os.environ.get("SERVE_WAIT_READY", "false").lower() in ("1", "true", "yes")
+SERVE_READY_TIMEOUT_SECONDS = float(os.environ.get("SERVE_READY_TIMEOUT_SECONDS", "300"))
+
+# route -> (function directory, module name, handler, dict of the models / datasets it loads)
+SERVICES = {
+    "get-price-prediction": ("get-price-prediction", "get_price_prediction_main", "get_price_prediction",
+                             "MODEL_CACHE"),
+    "get-k-similar-products": ("get-k-similar-products", "get_k_similar_products_main", "get_k_similar_products",
+                               "MODEL_CACHE"),
+    "get-catalog": ("get-catalog", "get_catalog_main", "get_catalog", "CATALOG_CACHE"),
+}
+HTTP_METHODS = ["GET", "POST", "OPTIONS", "PUT", "PATCH", "DELETE", "HEAD"]
+
+
+def load_service_module(directory, module_name):
+    """Imports a function's main.py under `module_name`, with its directory importable for its own modules."""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    service_dir = os.path.join(_CLOUD_DIR, directory)
+    if service_dir not in sys.path:
+        sys.path.append(service_dir)
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(service_dir, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def registry_keys(module, cache_attribute):
+    return [module.registry_key(name) for name in getattr(module, cache_attribute)]
+
+
+# --- ASGI <-> Cloud Functions (Flask) request and response ---
+
+def wsgi_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope, so the handlers get the flask.Request they are deployed with."""
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": "",
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for raw_name, raw_value in scope["headers"]:
+        name, value = raw_name.decode("latin-1"), raw_value.decode("latin-1")
+        if name == "content-length":
+            continue
+        key = "CONTENT_TYPE" if name == "content-type" else "HTTP_" + name.upper().replace("-", "_")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def to_response(result):
+    """Starlette Response for a handler's return value, following Flask's make_response rules."""
+    body, status, headers = result, 200, {}
+    if isinstance(result, tuple):
+        if len(result) == 3:
+            body, status, headers = result
+        elif isinstance(result[1], int):
+            body, status = result
+        else:
+            body, headers = result
+        headers = dict(headers or {})
+    content_type = next((value for name, value in headers.items() if name.lower() == "content-type"), None)
+    if isinstance(body, (dict, list)):
+        body = dumps(body)
+        content_type = content_type or JSON_CONTENT_TYPE
+    elif isinstance(body, str):
+        body = body.encode("utf-8")
+    headers = {name: value for name, value in headers.items() if name.lower() != "content-type"}
+    return Response(body, status_code=status, headers=headers,
+                    media_type=content_type or "text/html; charset=utf-8")
+
+
+class UnifiedServer:
+    """Owns the imported services and the inference thread pool."""
+
+    def __init__(self, worker_threads=SERVE_WORKER_THREADS, preload=SERVE_PRELOAD, wait_ready=SERVE_WAIT_READY):
+        from flask import Request
+
+        self._request_class = Request
+        self.preload = preload
+        self.wait_ready = wait_ready
+        self.worker_threads = worker_threads
+        self.executor = ThreadPoolExecutor(max_workers=worker_threads, thread_name_prefix="inference")
+        self.modules = {}
+        self.handlers = {}
+        for route, (directory, module_name, handler_name, _) in SERVICES.items():
+            module = load_service_module(directory, module_name)
+            self.modules[route] = module
+            self.handlers[route] = getattr(module, handler_name)
+
+    def all_registry_keys(self):
+        return [key for route, (_, _, _, cache_attribute) in SERVICES.items()
+                for key in registry_keys(self.modules[route], cache_attribute)]
+
+    def _call(self, route, environ):
+        return self.handlers[route](self._request_class(environ))
+
+    async def startup(self):
+        if self.preload:
+            for module in self.modules.values():
+                module.warm_up()
+        if self.wait_ready:
+            loop = asyncio.get_running_loop()
+            for key in self.all_registry_keys():
+                ready = await loop.run_in_executor(None, REGISTRY.wait_ready, key, SERVE_READY_TIMEOUT_SECONDS)
+                if not ready:
+                    logger.warning("%s did not load during startup; it will be loaded on first use.", key)
+        logger.info("Serving %s with %d inference threads", ", ".join(SERVICES), self.worker_threads)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(self, app):
+        await self.startup()
+        try:
+            yield
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def endpoint(self, route):
+        async def handle(request):
+            body = await request.body()
+            environ = wsgi_environ(request.scope, body)
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, self._call, route, environ)
+            return to_response(result)
+        return handle
+
+    async def metrics(self, request):
+        return Response(METRICS.render(), media_type=OPENMETRICS_CONTENT_TYPE)
+
+    async def healthz(self, request):
+        loaded = REGISTRY.snapshot()
+        missing = [key for key in self.all_registry_keys() if key not in loaded]
+        payload = {"status": "loading" if missing else "ok", "loaded": sorted(loaded), "loading": missing}
+        return Response(dumps(payload), status_code=503 if missing else 200, media_type=JSON_CONTENT_TYPE)
+
+    def routes(self):
+        routes = [Route("/metrics", self.metrics, methods=["GET"]), Route("/healthz", self.healthz, methods=["GET"])]
+        for route in SERVICES:
+            handle = self.endpoint(route)
+            routes.append(Route(f"/{route}", handle, methods=HTTP_METHODS))
+            routes.append(Route(f"/{route}/{{rest:path}}", handle, methods=HTTP_METHODS))
+        return routes
+
+
+def create_app(**server_options):
+    server = UnifiedServer(**server_options)
+    app = Starlette(routes=server.routes(), lifespan=server.lifespan)
+    app.state.server = server
+    return app
+
+
+def __getattr__(name):
+    # `uvicorn app:app` entry point, configured through the SERVE_* environment variables.
+    # Built on first access, so importing this module does not import the services.
+    if name == "app":
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve every Cloud Function of cloud/ from one ASGI process.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8080")))
+    parser.add_argument("--worker-threads", type=int, default=SERVE_WORKER_THREADS,
+                        help="Size of the inference thread pool.")
+    parser.add_argument("--keep-alive", type=float, default=75.0, help="Idle keep-alive timeout in seconds.")
+    parser.add_argument("--wait-ready", action="store_true", default=SERVE_WAIT_READY,
+                        help="Load every model before accepting requests.")
+    parser.add_argument("--processes", type=int, default=1, help="uvicorn worker processes (one registry each).")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    os.environ["SERVE_WORKER_THREADS"] = str(args.worker_threads)
+    os.environ["SERVE_WAIT_READY"] = "true" if args.wait_ready else "false"
+    server_options = {"host": args.host, "port": args.port, "timeout_keep_alive": args.keep_alive,
+                      "log_level": os.environ.get("LOG_LEVEL", "info").lower()}
+    if args.processes > 1:
+        uvicorn.run("app:app", app_dir=os.path.dirname(os.path.abspath(__file__)), workers=args.processes,
+                    **server_options)
+    else:
+        uvicorn.run(create_app(worker_threads=args.worker_threads, wait_ready=args.wait_ready), **server_options)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,6 @@
 import { useMemo, useState, useEffect } from "react";
 import { PieChart, Pie, Cell, Legend, Tooltip, ResponsiveContainer } from "recharts";
-import { 
-  getLaptopDataPromise,
-  Laptop 
-} from "@/services/laptopData";
+import { searchLaptops } from "@/services/laptopData";
 
 const BrandDistributionChart = () => {
   const [chartData, setChartData] = useState<any[]>([]);
@@ -13,20 +10,14 @@ const BrandDistributionChart = () => {
     const fetchData = async () => {
       setIsLoading(true);
       try {
-        const laptops = await getLaptopDataPromise();
-        if (laptops && laptops.length > 0) {
-          const brandCounts = laptops.reduce<Record<string, number>>((acc, laptop) => {
-            const brand = laptop.brand;
-            acc[brand] = (acc[brand] || 0) + 1;
-            return acc;
-          }, {});
-
-          let sortedBrands = Object.entries(brandCounts)
-            .map(([brand, value]) => ({
-              name: brand,
-              value
-            }))
-            .sort((a, b) => b.value - a.value);
+        const { facets } = await searchLaptops({ page_size: 0, facets: ['brand'] });
+        const brandCounts = facets?.brand ?? [];
+        if (brandCounts.length > 0) {
+          // Facet values come sorted by descending count.
+          let sortedBrands = brandCounts.map(({ value: brand, count }) => ({
+            name: brand,
+            value: count
+          }));
 
           if (sortedBrands.length > 10) {
             const top10Brands = sortedBrands.slice(0, 10);
@@ -1,9 +1,6 @@
 import { useMemo, useState, useEffect } from "react";
 import { BarChart, Bar, XAxis, YAxis, Tooltip, Legend, ResponsiveContainer, CartesianGrid } from "recharts";
-import { 
-  getLaptopDataPromise,
-  Laptop
-} from "@/services/laptopData";
+import { searchLaptops } from "@/services/laptopData";
 
 const OfferComparisonChart = () => {
   const [chartData, setChartData] = useState<any[]>([]);
@@ -13,21 +10,14 @@ const OfferComparisonChart = () => {
     const fetchData = async () => {
       setIsLoading(true);
       try {
-        const laptops = await getLaptopDataPromise();
-        if (laptops && laptops.length > 0) {
-          const titleCounts = laptops.reduce((acc, laptop) => {
-            const title = laptop.title;
-            acc[title] = (acc[title] || 0) + 1;
-            return acc;
-          }, {} as Record<string, number>);
-
-          const dataForChart = Object.entries(titleCounts)
-            .map(([title, count]) => ({
-              name: title.length > 30 ? title.substring(0, 27) + "..." : title,
-              frequency: count
-            }))
-            .sort((a, b) => b.frequency - a.frequency)
-            .slice(0, 10);
+        const { facets } = await searchLaptops({ page_size: 0, facets: ['title'], facet_limit: 10 });
+        const titleCounts = facets?.title ?? [];
+        if (titleCounts.length > 0) {
+          // The 10 most frequent titles, by descending count.
+          const dataForChart = titleCounts.map(({ value: title, count }) => ({
+            name: title.length > 30 ? title.substring(0, 27) + "..." : title,
+            frequency: count
+          }));
           setChartData(dataForChart);
         } else {
           setChartData([]);
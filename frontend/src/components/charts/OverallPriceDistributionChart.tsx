@@ -10,7 +10,7 @@ import {
   ResponsiveContainer,
   Label,
 } from 'recharts';
-import { getLaptopDataPromise, Laptop } from '@/services/laptopData';
+import { searchLaptops } from '@/services/laptopData';
 
 interface PriceDistributionDataPoint {
   priceRange: string; // e.g., "$0-$499"
@@ -30,8 +30,13 @@ const OverallPriceDistributionChart: React.FC = () => {
       setIsLoading(true);
       setError(null);
       try {
-        const laptops = await getLaptopDataPromise();
-        if (!laptops || laptops.length === 0) {
+        // One request: the catalog counts the prices per BIN_SIZE bucket.
+        const { total, histograms } = await searchLaptops({
+          page_size: 0,
+          facets: false,
+          histograms: { price: BIN_SIZE },
+        });
+        if (total === 0) {
           setError("No laptop data available.");
           setChartData([]);
           setIsLoading(false);
@@ -39,32 +44,18 @@ const OverallPriceDistributionChart: React.FC = () => {
         }
 
         const priceBins: Record<string, number> = {};
-        const numBins = Math.ceil(MAX_PRICE_FOR_BINS / BIN_SIZE);
-
-        for (let i = 0; i < numBins; i++) {
-          const lowerBound = i * BIN_SIZE;
-          const upperBound = (i + 1) * BIN_SIZE -1;
-          priceBins[`$${lowerBound}-$${upperBound}`] = 0;
+        for (let lowerBound = 0; lowerBound < MAX_PRICE_FOR_BINS; lowerBound += BIN_SIZE) {
+          priceBins[`$${lowerBound}-$${lowerBound + BIN_SIZE - 1}`] = 0;
         }
         priceBins[`$${MAX_PRICE_FOR_BINS}+`] = 0;
 
-
-        laptops.forEach((laptop) => {
-          const price = laptop.price;
-          if (typeof price === 'number') {
-            if (price >= MAX_PRICE_FOR_BINS) {
-              priceBins[`$${MAX_PRICE_FOR_BINS}+`] += 1;
-            } else {
-              const binIndex = Math.floor(price / BIN_SIZE);
-              const lowerBound = binIndex * BIN_SIZE;
-              const upperBound = (binIndex + 1) * BIN_SIZE - 1;
-              const binName = `$${lowerBound}-$${upperBound}`;
-              if (priceBins[binName] !== undefined) {
-                priceBins[binName] += 1;
-              }
-            }
-          }
-        });
+        for (const bucket of histograms?.price ?? []) {
+          if (bucket.min < 0) continue;
+          const priceRange = bucket.min >= MAX_PRICE_FOR_BINS
+            ? `$${MAX_PRICE_FOR_BINS}+`
+            : `$${bucket.min}-$${bucket.max - 1}`;
+          priceBins[priceRange] += bucket.count;
+        }
 
         const processedData: PriceDistributionDataPoint[] = Object.entries(priceBins)
           .map(([priceRange, count]) => ({
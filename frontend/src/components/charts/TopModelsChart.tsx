@@ -8,7 +8,7 @@ import {
   Tooltip,
   ResponsiveContainer,
 } from 'recharts';
-import { getLaptopDataPromise, Laptop } from '@/services/laptopData';
+import { searchLaptops } from '@/services/laptopData';
 
 interface ModelFrequency {
   name: string;
@@ -25,25 +25,18 @@ const TopModelsChart: React.FC = () => {
       setIsLoading(true);
       setError(null);
       try {
-        const laptops = await getLaptopDataPromise();
-        if (!laptops || laptops.length === 0) {
+        const { total, facets } = await searchLaptops({ page_size: 0, facets: ['title'], facet_limit: 20 });
+        if (total === 0) {
           setError("No laptop data available.");
           setModelData([]);
           setIsLoading(false);
           return;
         }
 
-        const frequencyMap = new Map<string, number>();
-        laptops.forEach((laptop) => {
-          const title = laptop.title || "Unknown Model";
-          frequencyMap.set(title, (frequencyMap.get(title) || 0) + 1);
-        });
+        // The 20 most frequent titles, by descending count.
+        const sortedModels = (facets?.title ?? []).map(({ value: name, count: frequency }) => ({ name, frequency }));
 
-        const sortedModels = Array.from(frequencyMap.entries())
-          .map(([name, frequency]) => ({ name, frequency }))
-          .sort((a, b) => b.frequency - a.frequency);
-
-        setModelData(sortedModels.slice(0, 20));
+        setModelData(sortedModels);
       } catch (err) {
         console.error("Failed to process model data:", err);
         setError("Failed to load model data.");
@@ -4,6 +4,7 @@ import {
   getLaptopDataPromise,
   Laptop 
 } from "@/services/laptopData";
+import { fetchCatalogDataset } from "@/services/catalog";
 import { ScatterChart, Scatter, XAxis, YAxis, ZAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from "recharts";
 import { Badge } from "@/components/ui/badge";
 import { Label } from "@/components/ui/label";
@@ -132,13 +133,8 @@ const Segmentation = () => {
       setError(null);
       try {
         const laptopsPromise = getLaptopDataPromise();
-        const engineeredSizesPromise = fetch('/engineered_laptop_details.json')
-          .then(res => {
-            if (!res.ok) {
-              throw new Error(`HTTP error! status: ${res.status} for engineered_laptop_details.json`);
-            }
-            return res.json();
-          })
+        const engineeredSizesPromise = fetchCatalogDataset<EngineeredScreenDetail>(
+          'engineered_laptop_details', '/engineered_laptop_details.json')
           .catch(err => {
             console.error("Failed to fetch engineered screen sizes:", err);
             return []; // Return empty array on error so app can continue
@@ -0,0 +1,65 @@
+// Loader for the sharded catalog written by temp_helper_funcs/export_catalog.py.
+//
+// /catalog/<dataset>.manifest.json lists content-hashed JSON shards (served precompressed
+// and cached as immutable); the manifest itself is the only file that needs revalidation.
+// When no manifest is published, the dataset is read from its single-file JSON instead.
+
+const CATALOG_BASE_URL = '/catalog';
+
+export interface CatalogShard {
+  file: string;
+  rows: number;
+  bytes: number;
+}
+
+export interface CatalogManifest {
+  format_version: number;
+  dataset: string;
+  row_count: number;
+  shards: CatalogShard[];
+}
+
+const fetchJson = async (url: string): Promise<any> => {
+  const response = await fetch(url);
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status} for ${url}`);
+  }
+  return response.json();
+};
+
+// The manifest of a dataset, or null if it is not published (the dev server answers
+// unknown paths with index.html, so anything that is not a manifest counts as missing).
+export const fetchCatalogManifest = async (dataset: string): Promise<CatalogManifest | null> => {
+  try {
+    const manifest = await fetchJson(`${CATALOG_BASE_URL}/${dataset}.manifest.json`);
+    return manifest && Array.isArray(manifest.shards) ? manifest : null;
+  } catch {
+    return null;
+  }
+};
+
+// Records of one shard (a page of manifest.shards[page].rows records).
+export const fetchCatalogPage = async <T>(manifest: CatalogManifest, page: number): Promise<T[]> =>
+  fetchJson(`${CATALOG_BASE_URL}/${manifest.shards[page].file}`);
+
+// All records of a dataset. Shards are requested in parallel; onPage is called in shard
+// order with the records received so far, so a view can render before the last shard lands.
+export const fetchCatalogDataset = async <T>(
+  dataset: string,
+  fallbackUrl: string,
+  onPage?: (records: T[]) => void,
+): Promise<T[]> => {
+  const manifest = await fetchCatalogManifest(dataset);
+  if (!manifest) {
+    const records: T[] = await fetchJson(fallbackUrl);
+    onPage?.(records);
+    return records;
+  }
+  const pages = manifest.shards.map((_, page) => fetchCatalogPage<T>(manifest, page));
+  const records: T[] = [];
+  for (const page of pages) {
+    records.push(...(await page));
+    onPage?.(records);
+  }
+  return records;
+};
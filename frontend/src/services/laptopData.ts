@@ -1,3 +1,6 @@
+import { fetchCatalogDataset } from './catalog';
+import { isCatalogServiceConfigured, searchCatalog } from '@/util/cloud_function';
+
 export interface Laptop {
   id: number;
   title: string;
@@ -15,14 +18,10 @@ export interface Laptop {
   os: string;
 }
 
-// Fetch laptop data from the JSON file
+// Fetch laptop data from the sharded catalog (falls back to the single laptop_data.json)
 export const fetchLaptopData = async (): Promise<Laptop[]> => {
   try {
-    const response = await fetch('/laptop_data.json');
-    if (!response.ok) {
-      throw new Error(`HTTP error! status: ${response.status}`);
-    }
-    const data = await response.json();
+    const data = await fetchCatalogDataset<any>('laptops', '/laptop_data.json');
     // Add offerCount to each laptop object
     return data.map((laptop: any) => ({
       ...laptop,
@@ -34,34 +33,195 @@ export const fetchLaptopData = async (): Promise<Laptop[]> => {
   }
 };
 
-// Store the promise of fetched data to avoid multiple fetches
-const laptopDataPromise: Promise<Laptop[]> = fetchLaptopData();
+// Store the promise of fetched data to avoid multiple fetches. With the catalog service
+// deployed, the full dataset is only downloaded by the views that need every row
+// (clustering, scatter plots, price quartiles and the nearest-offer search).
+let laptopDataPromise: Promise<Laptop[]> | null = null;
 
 // Export a direct way to get the promise if needed, or for components to await
-export const getLaptopDataPromise = (): Promise<Laptop[]> => laptopDataPromise;
+export const getLaptopDataPromise = (): Promise<Laptop[]> => {
+  if (!laptopDataPromise) {
+    laptopDataPromise = fetchLaptopData();
+  }
+  return laptopDataPromise;
+};
 
-// Helper functions for data processing, now asynchronous
-export const getBrands = async (): Promise<string[]> => {
-  const data = await laptopDataPromise;
-  return Array.from(new Set(data.map(laptop => laptop.brand)));
+// --- Catalog queries (cloud/get-catalog) ---
+
+export type LaptopField = Exclude<keyof Laptop, 'offerCount'>;
+
+const FACET_FIELDS = ['brand', 'productType', 'cpu', 'gpu', 'os'] as const;
+const RANGE_FIELDS = ['price', 'ram', 'storage', 'screenSize'] as const;
+const DEFAULT_PAGE_SIZE = 24;
+const MAX_PAGE_SIZE = 100;
+
+export type FacetField = typeof FACET_FIELDS[number];
+export type RangeField = typeof RANGE_FIELDS[number];
+
+export interface CatalogQuery {
+  // String fields: one value or a list of values; numeric fields: a value or inclusive min / max.
+  filters?: Partial<Record<LaptopField, string | string[] | number | { min?: number; max?: number }>>;
+  sort?: LaptopField | `-${LaptopField}`;
+  page?: number; // 1-based
+  page_size?: number; // up to 100; 0 returns only counts and facets
+  facets?: boolean | LaptopField[]; // true: the FACET_FIELDS; a list: those string fields
+  facet_limit?: number; // most frequent values per facet
+  histograms?: Partial<Record<LaptopField, number>>; // numeric field -> bucket width
+}
+
+export interface FacetValue {
+  value: string;
+  count: number;
+}
+
+export interface HistogramBucket {
+  min: number; // inclusive
+  max: number; // exclusive
+  count: number;
+}
+
+export interface CatalogPage {
+  items: Laptop[];
+  total: number;
+  page: number;
+  page_size: number;
+  pages: number;
+  facets?: Partial<Record<LaptopField, FacetValue[]>>;
+  ranges?: Record<RangeField, { min: number | null; max: number | null }>;
+  histograms?: Partial<Record<LaptopField, HistogramBucket[]>>;
+}
+
+const NUMERIC_FIELDS = new Set<string>(['screenSize', 'price', 'ram', 'storage', 'clockSpeed']);
+
+const compareValues = (a: string | number, b: string | number): number => (a < b ? -1 : a > b ? 1 : 0);
+
+const matchesFilter = (laptop: Laptop, field: string, spec: any): boolean => {
+  const value = (laptop as any)[field];
+  if (NUMERIC_FIELDS.has(field)) {
+    if (typeof spec === 'number') return value === spec;
+    return (spec.min === undefined || spec.min === null || value >= spec.min)
+      && (spec.max === undefined || spec.max === null || value <= spec.max);
+  }
+  return Array.isArray(spec) ? spec.includes(value) : value === spec;
 };
 
-export const getProductTypes = async (): Promise<string[]> => {
-  const data = await laptopDataPromise;
-  return Array.from(new Set(data.map(laptop => laptop.productType)));
+// Counts of the values in [min, max) buckets of the given width, aligned to multiples of it
+// and spanning the smallest to the largest value.
+const histogram = (values: number[], width: number): HistogramBucket[] => {
+  if (!values.length) return [];
+  const first = Math.floor(Math.min(...values) / width);
+  const last = Math.floor(Math.max(...values) / width);
+  const buckets = Array.from({ length: last - first + 1 }, (_, i) => ({
+    min: (first + i) * width,
+    max: (first + i + 1) * width,
+    count: 0,
+  }));
+  for (const value of values) {
+    buckets[Math.floor(value / width) - first].count += 1;
+  }
+  return buckets;
 };
 
-export const getCPUs = async (): Promise<string[]> => {
-  const data = await laptopDataPromise;
-  return Array.from(new Set(data.map(laptop => laptop.cpu)));
+// The same query evaluated over the local dataset, with the service's semantics (see
+// cloud/get-catalog/catalog_index.py): each facet and range covers the rows passing every
+// other filter, facet values are ordered by descending count, ties alphabetically, and
+// histograms cover the matching rows.
+const queryLaptops = (laptops: Laptop[], query: CatalogQuery): CatalogPage => {
+  const filters = Object.entries(query.filters ?? {});
+  for (const [field] of filters) {
+    if (laptops.length && !(field in laptops[0])) {
+      throw new Error(`Cannot filter on unknown field "${field}".`);
+    }
+  }
+  // For each row, the filters it fails: a row counts for a field's facet if it fails none but that one.
+  const failed = laptops.map((laptop) => filters.filter(([field, spec]) => !matchesFilter(laptop, field, spec)).map(([field]) => field));
+  const passesOthers = (row: number, field: string) => failed[row].length === 0 || (failed[row].length === 1 && failed[row][0] === field);
+
+  let matching = laptops.filter((_, row) => failed[row].length === 0);
+  if (query.sort) {
+    const descending = query.sort.startsWith('-');
+    const field = (descending ? query.sort.slice(1) : query.sort) as LaptopField;
+    matching = [...matching].sort((a, b) => (descending ? -1 : 1) * compareValues(a[field], b[field]));
+  }
+  const page = query.page ?? 1;
+  const pageSize = Math.min(query.page_size ?? DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE);
+  const result: CatalogPage = {
+    items: matching.slice((page - 1) * pageSize, page * pageSize),
+    total: matching.length,
+    page,
+    page_size: pageSize,
+    pages: pageSize ? Math.ceil(matching.length / pageSize) : 0,
+  };
+  if (query.histograms) {
+    result.histograms = {};
+    for (const [field, width] of Object.entries(query.histograms)) {
+      if (!NUMERIC_FIELDS.has(field) || !(typeof width === 'number' && Number.isFinite(width) && width > 0)) {
+        throw new Error(`Cannot build a histogram of "${field}" with bucket width ${width}.`);
+      }
+      result.histograms[field as LaptopField] = histogram(matching.map((laptop) => (laptop as any)[field]), width);
+    }
+  }
+  if (query.facets === false) {
+    return result;
+  }
+  const facetFields: readonly LaptopField[] = Array.isArray(query.facets) ? query.facets : FACET_FIELDS;
+  result.facets = {};
+  for (const field of facetFields) {
+    const counts = new Map<string, number>();
+    laptops.forEach((laptop, row) => {
+      const value = String(laptop[field]);
+      if (value && passesOthers(row, field)) counts.set(value, (counts.get(value) ?? 0) + 1);
+    });
+    result.facets[field] = Array.from(counts, ([value, count]) => ({ value, count }))
+      .sort((a, b) => b.count - a.count || compareValues(a.value, b.value))
+      .slice(0, query.facet_limit);
+  }
+  result.ranges = {} as CatalogPage['ranges'];
+  for (const field of RANGE_FIELDS) {
+    const values = laptops.filter((_, row) => passesOthers(row, field)).map((laptop) => laptop[field]);
+    result.ranges![field] = values.length
+      ? { min: Math.min(...values), max: Math.max(...values) }
+      : { min: null, max: null };
+  }
+  return result;
 };
 
-export const getGPUs = async (): Promise<string[]> => {
-  const data = await laptopDataPromise;
-  return Array.from(new Set(data.map(laptop => laptop.gpu)));
+// One filtered, sorted page of laptops with facet counts. Computed by the catalog service
+// where it is deployed (VITE_CATALOG_FUNCTION_URL), otherwise over the local dataset, so
+// items and facets always come from the same data.
+export const searchLaptops = async (query: CatalogQuery = {}): Promise<CatalogPage> => {
+  if (!isCatalogServiceConfigured()) {
+    return queryLaptops(await getLaptopDataPromise(), query);
+  }
+  const page: CatalogPage = await searchCatalog(query);
+  return {
+    ...page,
+    items: page.items.map((laptop) => ({ ...laptop, offerCount: laptop.offerCount ?? 0 })),
+  };
 };
 
-export const getOSes = async (): Promise<string[]> => {
-  const data = await laptopDataPromise;
-  return Array.from(new Set(data.map(laptop => laptop.os)));
+// Facet values of the whole catalog, fetched once (no items) and shared by the helpers below.
+let facetsPromise: Promise<CatalogPage['facets']> | null = null;
+
+// The distinct values of a field, in alphabetical order (for option lists).
+const getFacetValues = async (field: FacetField): Promise<string[]> => {
+  if (!facetsPromise) {
+    facetsPromise = searchLaptops({ page_size: 0 }).then((page) => page.facets);
+    facetsPromise.catch(() => {
+      facetsPromise = null;
+    });
+  }
+  const facets = await facetsPromise;
+  return (facets?.[field] ?? []).map((facet) => facet.value).sort(compareValues);
 };
+
+// Helper functions for data processing, now asynchronous
+export const getBrands = async (): Promise<string[]> => getFacetValues('brand');
+
+export const getProductTypes = async (): Promise<string[]> => getFacetValues('productType');
+
+export const getCPUs = async (): Promise<string[]> => getFacetValues('cpu');
+
+export const getGPUs = async (): Promise<string[]> => getFacetValues('gpu');
+
+export const getOSes = async (): Promise<string[]> => getFacetValues('os');
@@ -72,4 +72,39 @@ const getKSimilarProducts = async (data) => {
   }
 }
 
-export { getPricePrediction, getKSimilarProducts };
\ No newline at end of file
+// URL of the get-catalog function (cloud/get-catalog), set where it is deployed. Without it
+// the frontend answers catalog queries from its own copy of the data (services/laptopData.ts).
+const CATALOG_FUNCTION_URL = import.meta.env.VITE_CATALOG_FUNCTION_URL;
+
+const isCatalogServiceConfigured = () => Boolean(CATALOG_FUNCTION_URL);
+
+const searchCatalog = async (query) => {
+  const url = CATALOG_FUNCTION_URL;
+  if (!url) {
+    throw new Error('VITE_CATALOG_FUNCTION_URL is not set.');
+  }
+  try {
+
+    const requestConfig = {
+      method: 'POST',
+      url: url,
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      data: query
+    };
+
+    const response = await axios(requestConfig);
+    return response.data;
+  } catch (error) {
+    console.error('Error searching the catalog:', {
+      isAxiosError: error.isAxiosError,
+      message: error.message,
+      response: error.response?.data,
+      status: error.response?.status
+    });
+    throw error;
+  }
+}
+
+export { getPricePrediction, getKSimilarProducts, searchCatalog, isCatalogServiceConfigured };
\ No newline at end of file
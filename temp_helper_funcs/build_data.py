@@ -0,0 +1,262 @@
+"""
+One-pass, incremental build of the derived data files.
+
+Replaces running modify_csv.py, convert_csv_to_json.py and generate_screen_size_json.py
+in sequence (which parse df_engineered.csv, then df_modified.csv, then
+df_engineered_laptop.csv, and always rebuild everything). Each source CSV is read once,
+in chunks of --chunk-rows rows, and every chunk is handed to all outputs derived from it:
+
+    df_engineered.csv         -> df_modified.csv (modify_csv.py's column selection + brand)
+                              -> laptops catalog shards + laptop_data.json (from those rows)
+    df_engineered_laptop.csv  -> engineered_laptop_details shards + engineered_laptop_details.json
+
+The state file records, per output, the SHA-256 of its inputs and of its recipe (these
+scripts and the output's settings). On the next run an output is skipped when both match
+and its files still exist; a source nobody needs is not read at all. Input hashes are
+reused while a file's size and mtime are unchanged.
+
+Usage (from the repository root):
+    python temp_helper_funcs/build_data.py                  # rebuild what changed
+    python temp_helper_funcs/build_data.py --force          # rebuild everything
+    python temp_helper_funcs/build_data.py --only laptops --chunk-rows 2000
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from export_catalog import (DEFAULT_OUT_DIR, DEFAULT_SHARD_ROWS, JsonArrayWriter, ShardedJsonWriter,
+                            laptop_records, screen_size_records)
+
+STATE_FORMAT_VERSION = 1
+DEFAULT_CHUNK_ROWS = 5000
+
+# modify_csv.py's columns_to_keep_config, in output order; 'brand' is inserted after 'titulo'.
+MODIFIED_COLUMNS = [
+    'titulo', 'pantalla_tamano_pulgadas', 'precio_mean', 'serie', 'tipo_de_producto', 'ram_memoria_gb',
+    'disco_duro_capacidad_de_memoria_ssd_gb', 'procesador', 'procesador_frecuencia_turbo_max_ghz',
+    'grafica_tarjeta', 'sistema_operativo_sistema_operativo', 'precio_min', 'precio_max',
+]
+
+
+def _write_json_atomic(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def modified_row(row):
+    """df_modified.csv row for one df_engineered.csv row (values passed through as text)."""
+    title = row.get('titulo') or ''
+    modified = {'titulo': title, 'brand': title.split(' ', 1)[0] if title.strip() else ''}
+    for column in MODIFIED_COLUMNS[1:]:
+        if column in row:
+            modified[column] = row[column]
+    return modified
+
+
+# --- Outputs: each receives the parsed rows of its source chunk by chunk ---
+
+class CsvOutput:
+    """df_modified.csv, written to a temporary file and moved into place when complete."""
+
+    def __init__(self, path):
+        self.path = path
+        self._tmp_path = f"{path}.tmp"
+        self._file = None
+        self._writer = None
+
+    def files(self):
+        return [self.path]
+
+    def write(self, rows):
+        if self._writer is None:
+            self._file = open(self._tmp_path, 'w', encoding='utf-8', newline='')
+            self._writer = csv.DictWriter(self._file, fieldnames=list(rows[0]), lineterminator='\n')
+            self._writer.writeheader()
+        self._writer.writerows(rows)
+
+    def close(self):
+        if self._file is None:  # the source had a header but no rows
+            self._file = open(self._tmp_path, 'w', encoding='utf-8', newline='')
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+
+class CatalogOutput:
+    """Sharded catalog dataset plus its single-file JSON (see export_catalog.py)."""
+
+    def __init__(self, dataset, make_records, out_dir, legacy_file, shard_rows=DEFAULT_SHARD_ROWS):
+        self.dataset = dataset
+        self.make_records = make_records
+        self.out_dir = out_dir
+        self.legacy_file = legacy_file
+        self.shard_rows = shard_rows
+        self.rows_seen = 0
+        self._writers = None
+
+    def files(self):
+        return [os.path.join(self.out_dir, f"{self.dataset}.manifest.json"), self.legacy_file]
+
+    def write(self, rows):
+        if self._writers is None:
+            os.makedirs(self.out_dir, exist_ok=True)
+            self._writers = [ShardedJsonWriter(self.out_dir, self.dataset, self.shard_rows),
+                             JsonArrayWriter(self.legacy_file)]
+        for record in self.make_records(rows, self.rows_seen):
+            for writer in self._writers:
+                writer.write(record)
+        self.rows_seen += len(rows)
+
+    def close(self):
+        if self._writers is None:
+            self.write([])
+        for writer in self._writers:
+            writer.close()
+
+
+def define_outputs(data_dir, public_dir, catalog_dir):
+    """{output name: (source CSV path, row transform, output)} in build order."""
+    return {
+        'df_modified': (os.path.join(data_dir, 'df_engineered.csv'), modified_row,
+                        CsvOutput(os.path.join(data_dir, 'df_modified.csv'))),
+        'laptops': (os.path.join(data_dir, 'df_engineered.csv'), modified_row,
+                    CatalogOutput('laptops', lambda rows, offset: laptop_records(rows, start_id=offset + 1),
+                                  catalog_dir, os.path.join(public_dir, 'laptop_data.json'))),
+        'engineered_laptop_details': (os.path.join(data_dir, 'df_engineered_laptop.csv'), None,
+                                      CatalogOutput('engineered_laptop_details',
+                                                    lambda rows, offset: screen_size_records(rows), catalog_dir,
+                                                    os.path.join(public_dir, 'engineered_laptop_details.json'),
+                                                    shard_rows=2000)),
+    }
+
+
+def read_chunks(path, chunk_rows):
+    """Lists of up to chunk_rows row dicts, parsed once from the CSV at `path`."""
+    with open(path, mode='r', encoding='utf-8', newline='') as csv_file:
+        csv_reader = csv.DictReader(csv_file)
+        if not csv_reader.fieldnames:
+            raise ValueError(f"CSV file {path} is empty or has no header.")
+        while True:
+            chunk = list(itertools.islice(csv_reader, chunk_rows))
+            if not chunk:
+                return
+            yield chunk
+
+
+# --- Incremental state ---
+
+class BuildState:
+    def __init__(self, path):
+        self.path = path
+        self.data = {'format_version': STATE_FORMAT_VERSION, 'inputs': {}, 'outputs': {}}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('format_version') == STATE_FORMAT_VERSION:
+                self.data = data
+
+    def input_hash(self, path):
+        """SHA-256 of a file, recomputed only when its size or mtime changed."""
+        stat = os.stat(path)
+        cached = self.data['inputs'].get(path)
+        if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['sha256']
+        digest = _sha256_file(path)
+        self.data['inputs'][path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}
+        return digest
+
+    def is_current(self, name, fingerprint, files):
+        return self.data['outputs'].get(name) == fingerprint and all(os.path.exists(path) for path in files)
+
+    def record(self, name, fingerprint):
+        self.data['outputs'][name] = fingerprint
+        self.save()
+
+    def save(self):
+        _write_json_atomic(self.path, self.data)
+
+
+def recipe_hash(name, output):
+    """Hash of the code and settings that produce an output; changing either rebuilds it."""
+    digest = hashlib.sha256(name.encode('utf-8'))
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    for script in ('build_data.py', 'export_catalog.py'):
+        with open(os.path.join(script_dir, script), 'rb') as f:
+            digest.update(f.read())
+    settings = {key: value for key, value in vars(output).items()
+                if isinstance(value, (str, int, float)) and key != 'rows_seen'}
+    digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def build(data_dir='local_work', public_dir=os.path.join('frontend', 'public'), catalog_dir=DEFAULT_OUT_DIR,
+          state_path=None, chunk_rows=DEFAULT_CHUNK_ROWS, only=None, force=False):
+    """Rebuilds the stale outputs with one pass per source; returns {output name: "built" | "skipped"}."""
+    state = BuildState(state_path or os.path.join(data_dir, '.data_build_state.json'))
+    outputs = define_outputs(data_dir, public_dir, catalog_dir)
+    results = {}
+    stale_by_source = {}
+    for name, (source, transform, output) in outputs.items():
+        if only and name not in only:
+            continue
+        fingerprint = {'inputs': {source: state.input_hash(source)}, 'recipe': recipe_hash(name, output)}
+        if not force and state.is_current(name, fingerprint, output.files()):
+            results[name] = 'skipped'
+            continue
+        stale_by_source.setdefault(source, []).append((name, transform, output, fingerprint))
+
+    for source, stale in stale_by_source.items():
+        start = time.perf_counter()
+        n_rows = 0
+        for chunk in read_chunks(source, chunk_rows):
+            n_rows += len(chunk)
+            # Outputs sharing a row transform share its result.
+            transformed = {}
+            for _, transform, output, _ in stale:
+                if transform not in transformed:
+                    transformed[transform] = chunk if transform is None else [transform(row) for row in chunk]
+                output.write(transformed[transform])
+        for name, _, output, fingerprint in stale:
+            output.close()
+            state.record(name, fingerprint)
+            results[name] = 'built'
+        print(f"Read {source} once ({n_rows} rows, {time.perf_counter() - start:.2f}s) for: "
+              f"{', '.join(name for name, _, _, _ in stale)}")
+    state.save()  # keeps input hashes refreshed by touched-but-unchanged files
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Single-pass, incremental build of the derived data files.")
+    parser.add_argument('--data-dir', default='local_work', help="Holds the source CSVs and df_modified.csv.")
+    parser.add_argument('--public-dir', default=os.path.join('frontend', 'public'))
+    parser.add_argument('--catalog-dir', default=DEFAULT_OUT_DIR)
+    parser.add_argument('--state', help="Build state file (default: <data-dir>/.data_build_state.json).")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--only', nargs='+', choices=['df_modified', 'laptops', 'engineered_laptop_details'])
+    parser.add_argument('--force', action='store_true', help="Rebuild every output.")
+    args = parser.parse_args(argv)
+
+    results = build(args.data_dir, args.public_dir, args.catalog_dir, args.state, args.chunk_rows,
+                    only=args.only, force=args.force)
+    for name, status in results.items():
+        print(f"{name}: {status}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""
+Streaming export of the frontend's static catalog data.
+
+Reads a CSV row by row and writes the converted records as compact JSON shards of
+--shard-rows records each, so memory stays at one shard however large the catalog gets:
+
+    frontend/public/catalog/
+        laptops.manifest.json                  (fetched first; short cache)
+        laptops.0000.3f9c2a7b1e04.json         shard 0, named by the hash of its content
+        laptops.0000.3f9c2a7b1e04.json.gz      precompressed variants for the CDN / static
+        laptops.0000.3f9c2a7b1e04.json.br      server (.br only if `brotli` is installed)
+        ...
+
+Shard names change whenever their content does, so they can be served with an immutable
+cache policy; only the manifest has to be revalidated. The manifest lists the shards in
+order with their row counts and sizes:
+
+    {"format_version": 1, "dataset": "laptops", "row_count": 401, "shard_rows": 200,
+     "fields": [...], "shards": [{"file": "...", "rows": 200, "bytes": ..., "sha256": "...",
+     "encodings": {"gzip": ..., "br": ...}}, ...]}
+
+The manifest is written last, and the shards of the previous export are kept (clients may
+still hold the old manifest); anything older is removed.
+
+With --legacy-file the records are also streamed into one compact JSON array (the old
+single-file format, e.g. frontend/public/laptop_data.json), which the frontend falls back
+to when no manifest is published.
+
+Usage:
+    python temp_helper_funcs/export_catalog.py laptops --source local_work/df_modified.csv
+    python temp_helper_funcs/export_catalog.py engineered_laptop_details \
+        --source local_work/df_engineered_laptop.csv --shard-rows 2000
+"""
+import argparse
+import csv
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:  # optional: .br variants are skipped without it
+    brotli = None
+
+MANIFEST_FORMAT_VERSION = 1
+DEFAULT_OUT_DIR = os.path.join('frontend', 'public', 'catalog')
+DEFAULT_SHARD_ROWS = 200
+
+# Mapping from CSV columns to JSON keys (which should match the frontend's Laptop interface)
+LAPTOP_COLUMNS = {
+    'titulo': 'title',
+    'brand': 'brand',
+    'serie': 'series',
+    'pantalla_tamano_pulgadas': 'screenSize',
+    'precio_mean': 'price',
+    'tipo_de_producto': 'productType',
+    'ram_memoria_gb': 'ram',
+    'disco_duro_capacidad_de_memoria_ssd_gb': 'storage',
+    'procesador': 'cpu',
+    'procesador_frecuencia_turbo_max_ghz': 'clockSpeed',
+    'grafica_tarjeta': 'gpu',
+    'sistema_operativo_sistema_operativo': 'os'
+}
+LAPTOP_NUMERIC_FIELDS = ['screenSize', 'price', 'ram', 'storage', 'clockSpeed']
+
+CM_PER_INCH = 2.54
+
+
+def _laptop_default(json_key):
+    if json_key in LAPTOP_NUMERIC_FIELDS:
+        return 0.0 if json_key == 'clockSpeed' else 0
+    return ""
+
+
+def laptop_records(csv_reader, start_id=1):
+    """Laptop objects for laptop_data.json; missing or unparsable values get type defaults."""
+    for id_counter, row in enumerate(csv_reader, start_id):
+        laptop_obj = {'id': id_counter}
+        for csv_col, json_key in LAPTOP_COLUMNS.items():
+            value = row.get(csv_col)
+            if not value:
+                laptop_obj[json_key] = _laptop_default(json_key)
+            elif json_key in LAPTOP_NUMERIC_FIELDS:
+                try:
+                    laptop_obj[json_key] = float(value)
+                except ValueError:
+                    laptop_obj[json_key] = _laptop_default(json_key)
+            else:
+                laptop_obj[json_key] = value
+        yield laptop_obj
+
+
+def screen_size_records(csv_reader):
+    """{"title", "engineered_screen_size_inches"} for rows with a title and a positive diagonal."""
+    for row in csv_reader:
+        title_value = (row.get('titulo') or "").strip()
+        raw_value_cm = (row.get('pantalla_diagonal_cm') or "").replace(',', '.').strip()
+        if not title_value or not raw_value_cm:
+            continue
+        try:
+            screen_size_inch = round(float(raw_value_cm) / CM_PER_INCH, 1)
+        except ValueError:
+            continue
+        if screen_size_inch > 0:
+            yield {"title": title_value, "engineered_screen_size_inches": screen_size_inch}
+
+
+# dataset name -> (record generator, CSV columns it needs)
+DATASETS = {
+    'laptops': (laptop_records, ['titulo']),
+    'engineered_laptop_details': (screen_size_records, ['titulo', 'pantalla_diagonal_cm']),
+}
+
+
+def _write_atomic(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+class ShardedJsonWriter:
+    """Buffers one shard of encoded records at a time and writes it with its compressed variants."""
+
+    def __init__(self, out_dir, dataset, shard_rows=DEFAULT_SHARD_ROWS):
+        self.out_dir = out_dir
+        self.dataset = dataset
+        self.shard_rows = shard_rows
+        self.shards = []
+        self.row_count = 0
+        self.fields = []
+        self._buffer = []
+
+    def write(self, record):
+        for key in record:
+            if key not in self.fields:
+                self.fields.append(key)
+        self._buffer.append(json.dumps(record, separators=(',', ':'), ensure_ascii=False))
+        self.row_count += 1
+        if len(self._buffer) >= self.shard_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        payload = ('[' + ','.join(self._buffer) + ']').encode('utf-8')
+        digest = hashlib.sha256(payload).hexdigest()
+        file_name = f"{self.dataset}.{len(self.shards):04d}.{digest[:12]}.json"
+        path = os.path.join(self.out_dir, file_name)
+        _write_atomic(path, payload)
+        # mtime=0 keeps the .gz bytes a pure function of the content.
+        encodings = {'gzip': gzip.compress(payload, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            encodings['br'] = brotli.compress(payload, quality=11)
+        for encoding, compressed in encodings.items():
+            _write_atomic(path + ('.gz' if encoding == 'gzip' else '.br'), compressed)
+        self.shards.append({
+            'file': file_name,
+            'rows': len(self._buffer),
+            'bytes': len(payload),
+            'sha256': digest,
+            'encodings': {encoding: len(compressed) for encoding, compressed in encodings.items()},
+        })
+        self._buffer = []
+
+    def close(self):
+        """Writes the last shard and then the manifest; returns the manifest."""
+        self._flush()
+        manifest_path = os.path.join(self.out_dir, f"{self.dataset}.manifest.json")
+        previous_files = set()
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                previous_files = {shard['file'] for shard in json.load(f).get('shards', [])}
+        manifest = {
+            'format_version': MANIFEST_FORMAT_VERSION,
+            'dataset': self.dataset,
+            'row_count': self.row_count,
+            'shard_rows': self.shard_rows,
+            'fields': self.fields,
+            'shards': self.shards,
+        }
+        _write_atomic(manifest_path, json.dumps(manifest, indent=2, ensure_ascii=False).encode('utf-8'))
+        self._prune(previous_files | {shard['file'] for shard in self.shards})
+        return manifest
+
+    def _prune(self, keep_files):
+        prefix = f"{self.dataset}."
+        for entry in os.scandir(self.out_dir):
+            base_name = entry.name
+            for suffix in ('.gz', '.br'):
+                if base_name.endswith(suffix):
+                    base_name = base_name[:-len(suffix)]
+            if (entry.name.startswith(prefix) and base_name.endswith('.json')
+                    and base_name != f"{self.dataset}.manifest.json" and base_name not in keep_files):
+                os.remove(entry.path)
+
+
+class JsonArrayWriter:
+    """Streams records into a single compact JSON array file (the pre-manifest format)."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._tmp_path = f"{path}.tmp"
+        self._file = open(self._tmp_path, 'w', encoding='utf-8')
+        self._file.write('[')
+        self._first = True
+
+    def write(self, record):
+        if not self._first:
+            self._file.write(',\n')
+        self._file.write(json.dumps(record, separators=(',', ':'), ensure_ascii=False))
+        self._first = False
+
+    def close(self):
+        self._file.write(']\n')
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+
+def export_catalog(dataset, source, out_dir=DEFAULT_OUT_DIR, shard_rows=DEFAULT_SHARD_ROWS, legacy_file=None):
+    """Streams `source` (CSV) through the dataset's converter into shards; returns the manifest."""
+    make_records, required_columns = DATASETS[dataset]
+    os.makedirs(out_dir, exist_ok=True)
+    with open(source, mode='r', encoding='utf-8', newline='') as csv_file:
+        csv_reader = csv.DictReader(csv_file)
+        if not csv_reader.fieldnames:
+            raise ValueError(f"CSV file {source} is empty or has no header.")
+        missing = [column for column in required_columns if column not in csv_reader.fieldnames]
+        if missing:
+            raise ValueError(f"Columns {missing} not found in {source}. Available columns are: {csv_reader.fieldnames}")
+
+        writers = [ShardedJsonWriter(out_dir, dataset, shard_rows)]
+        if legacy_file:
+            writers.append(JsonArrayWriter(legacy_file))
+        for record in make_records(csv_reader):
+            for writer in writers:
+                writer.write(record)
+    manifest = writers[0].close()
+    for writer in writers[1:]:
+        writer.close()
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export catalog CSV data as sharded, precompressed JSON.")
+    parser.add_argument('dataset', choices=sorted(DATASETS))
+    parser.add_argument('--source', required=True, help="Input CSV, e.g. local_work/df_modified.csv")
+    parser.add_argument('--out-dir', default=DEFAULT_OUT_DIR)
+    parser.add_argument('--shard-rows', type=int, default=DEFAULT_SHARD_ROWS)
+    parser.add_argument('--legacy-file', help="Also write every record into this single JSON array file.")
+    args = parser.parse_args(argv)
+
+    manifest = export_catalog(args.dataset, args.source, out_dir=args.out_dir, shard_rows=args.shard_rows,
+                              legacy_file=args.legacy_file)
+    raw_bytes = sum(shard['bytes'] for shard in manifest['shards'])
+    gzip_bytes = sum(shard['encodings']['gzip'] for shard in manifest['shards'])
+    print(f"Exported {manifest['row_count']} {args.dataset} records into {len(manifest['shards'])} shards "
+          f"in {args.out_dir} ({raw_bytes} bytes, {gzip_bytes} gzipped"
+          f"{'' if brotli is not None else '; brotli not installed, no .br files'}).")
+    if args.legacy_file:
+        print(f"Single-file copy written to {args.legacy_file}")
+
+
+if __name__ == '__main__':
+    main()